@@ -0,0 +1,338 @@
+"""
+End-to-end load test of the chat server.
+
+    python -m benchmarks.load_test --clients 50 --senders 5 --rate 2 --duration 10 --output load_test.json
+
+Starts `src.server` in a child process against a throwaway SQLite database
+(or --database-url, e.g. a temporary PostgreSQL), seeds --clients users and:
+
+  1. logs every user in through POST /auth/login,
+  2. opens one Socket.IO connection per user (websocket transport),
+  3. has --senders of them send --rate messages per second for --duration
+     seconds to the lobby, which every client receives,
+  4. replays GET /message/messages and GET /user/users --requests times.
+
+It reports connect time, fan-out latency percentiles (send to receive, per
+recipient), sent and delivered messages per second, server memory per
+connection (RSS, Linux only) and REST latency, and writes everything to JSON
+so runs can be compared across changes. Rate limits are disabled on the
+server under test unless --rate-limits is given.
+
+Needs `requests` and `websocket-client` (pip install -r benchmarks/requirements.txt).
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PASSWORD = "benchmark-password"
+
+
+def serve(port, users):
+    """
+    Entry point of the server process (--serve): seed the users, then run the app.
+    """
+    import eventlet
+    eventlet.monkey_patch()
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    from src.database import db
+    from src.server import create_app, start_background_tasks
+    from src.helpers.passwords import password_hasher
+    from src.models.user import User
+
+    app = create_app()
+    socketio = app.extensions['socket_service'].socketio
+    with app.app_context():
+        app.extensions['database'].ensure_schema(app)
+        existing = {username for (username,) in db.session.query(User.username)}
+        password_hash = password_hasher.hash(PASSWORD)  # One hash shared by every seeded user
+        db.session.add_all(
+            User(username=f"bench{i}", email=f"bench{i}@example.com", password_hash=password_hash)
+            for i in range(users)
+            if f"bench{i}" not in existing
+        )
+        db.session.commit()
+    start_background_tasks(app)
+    socketio.run(app, host="127.0.0.1", port=port, log_output=False)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_bytes(pid):
+    """
+    Resident memory of a process, read from /proc (None where unavailable).
+    """
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def summarize(samples):
+    """
+    Latency percentiles in milliseconds for a list of durations in seconds.
+    """
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.mean(ordered) * 1000, 3),
+        "p50_ms": percentile(0.50),
+        "p90_ms": percentile(0.90),
+        "p99_ms": percentile(0.99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def start_server(args, port, database_url):
+    env = dict(
+        os.environ,
+        FLASK_DEBUG="0",
+        DATABASE_URL=database_url,
+        SECRET_KEY="load-test-secret",
+        JWT_SECRET_KEY="load-test-jwt-secret-key-long-enough",
+        MAIL_SERVER=os.environ.get("MAIL_SERVER", "127.0.0.1"),
+        # Cheap hashes: the test measures the chat path, not argon2
+        PASSWORD_HASH_TIME_COST="1",
+        PASSWORD_HASH_MEMORY_COST="8192",
+        MESSAGE_WRITE_BEHIND="True" if args.write_behind else "False",
+    )
+    if not args.rate_limits:
+        env.update(SOCKET_RATE_LIMIT_SID_RATE="0", SOCKET_RATE_LIMIT_USER_RATE="0")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.load_test", "--serve", str(port), "--clients", str(args.clients)],
+        env=env,
+    )
+    import requests
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Server did not start in time")
+
+
+def timed_requests(call, count, concurrency):
+    """
+    Run `call(i)` `count` times over `concurrency` threads and return (latencies, errors, elapsed).
+    """
+    latencies, errors = [], []
+
+    def one(i):
+        started = time.perf_counter()
+        try:
+            call(i)
+            latencies.append(time.perf_counter() - started)
+        except Exception as e:
+            errors.append(str(e))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(count)))
+    return latencies, errors, time.perf_counter() - started
+
+
+def rest_result(latencies, errors, elapsed):
+    result = summarize(latencies)
+    result["errors"] = len(errors)
+    result["requests_per_second"] = round(len(latencies) / elapsed, 1) if elapsed else None
+    return result
+
+
+def run(args):
+    import requests
+    import socketio
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    workdir = tempfile.mkdtemp(prefix="chat-load-")
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'load_test.db')}"
+    server = start_server(args, port, database_url)
+    clients = []
+    try:
+        http = requests.Session()
+        http.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency))
+
+        # 1. Log every user in
+        tokens = [None] * args.clients
+
+        def login(i):
+            response = http.post(f"{base_url}/auth/login", json={"username": f"bench{i}", "password": PASSWORD}, timeout=30)
+            response.raise_for_status()
+            tokens[i] = response.json()["access_token"]
+
+        login_result = rest_result(*timed_requests(login, args.clients, args.concurrency))
+
+        # 2. Open one socket per user
+        rss_before = rss_bytes(server.pid)
+        received = []  # (latency seconds) for every delivery
+        received_lock = threading.Lock()
+        connect_times = []
+
+        def on_message(data):
+            now = time.time()
+            try:
+                sent_at = json.loads(data["message"])["sent_at"]
+            except (KeyError, TypeError, ValueError):
+                return
+            with received_lock:
+                received.append(now - sent_at)
+
+        def connect(i):
+            client = socketio.Client(reconnection=False, websocket_extra_options={"suppress_origin": True})
+            client.on("receive_message", on_message)
+            started = time.perf_counter()
+            client.connect(f"{base_url}?token={tokens[i]}", transports=["websocket"], wait_timeout=30)
+            connect_times.append(time.perf_counter() - started)
+            clients.append(client)
+
+        _, connect_errors, _ = timed_requests(connect, args.clients, args.concurrency)
+        time.sleep(0.5)  # Let the server settle before measuring memory
+        rss_after = rss_bytes(server.pid)
+
+        # 3. Drive the message load
+        sent = []
+
+        def sender(client):
+            interval = 1.0 / args.rate
+            next_send = time.monotonic()
+            end = next_send + args.duration
+            while next_send < end:
+                client.emit("send_message", {"message": json.dumps({"sent_at": time.time()})})
+                sent.append(1)
+                next_send += interval
+                time.sleep(max(0.0, next_send - time.monotonic()))
+
+        started = time.perf_counter()
+        senders = [threading.Thread(target=sender, args=(client,)) for client in clients[:args.senders]]
+        for thread in senders:
+            thread.start()
+        for thread in senders:
+            thread.join()
+        send_elapsed = time.perf_counter() - started
+        expected = len(sent) * len(clients)
+        drain_deadline = time.monotonic() + args.drain_timeout
+        while len(received) < expected and time.monotonic() < drain_deadline:
+            time.sleep(0.05)
+        delivery_elapsed = time.perf_counter() - started
+
+        # 4. REST endpoints
+        headers = [{"Authorization": f"Bearer {token}"} for token in tokens]
+        messages_result = rest_result(*timed_requests(
+            lambda i: http.get(f"{base_url}/message/messages", headers=headers[i % len(headers)], timeout=30).raise_for_status(),
+            args.requests, args.concurrency))
+        users_result = rest_result(*timed_requests(
+            lambda i: http.get(f"{base_url}/user/users", headers=headers[i % len(headers)], timeout=30).raise_for_status(),
+            args.requests, args.concurrency))
+
+        connected = len(clients)
+        return {
+            "config": {
+                "clients": args.clients,
+                "senders": args.senders,
+                "rate_per_sender": args.rate,
+                "duration_s": args.duration,
+                "write_behind": args.write_behind,
+                "rate_limits": args.rate_limits,
+                "database": "sqlite" if database_url.startswith("sqlite") else database_url.split(":", 1)[0],
+                "python": platform.python_version(),
+                "commit": git_commit(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            },
+            "connect": {**summarize(connect_times), "errors": len(connect_errors)},
+            "fanout_latency": summarize(received),
+            "throughput": {
+                "sent": len(sent),
+                "delivered": len(received),
+                "expected_deliveries": expected,
+                "sent_per_second": round(len(sent) / send_elapsed, 1) if send_elapsed else None,
+                "delivered_per_second": round(len(received) / delivery_elapsed, 1) if delivery_elapsed else None,
+            },
+            "memory": {
+                "rss_before_connect_bytes": rss_before,
+                "rss_after_connect_bytes": rss_after,
+                "bytes_per_connection": (
+                    round((rss_after - rss_before) / connected) if rss_before and rss_after and connected else None
+                ),
+            },
+            "rest": {
+                "POST /auth/login": login_result,
+                "GET /message/messages": messages_result,
+                "GET /user/users": users_result,
+            },
+        }
+    finally:
+        for client in clients:
+            try:
+                client.disconnect()
+            except Exception:
+                pass
+        server.terminate()
+        server.wait(10)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=50, help="simulated users, one socket each")
+    parser.add_argument("--senders", type=int, default=5, help="clients that send messages")
+    parser.add_argument("--rate", type=float, default=2.0, help="messages per second per sender")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of message load")
+    parser.add_argument("--requests", type=int, default=200, help="requests per REST endpoint")
+    parser.add_argument("--concurrency", type=int, default=10, help="parallel logins, connects and REST requests")
+    parser.add_argument("--database-url", help="database of the server under test (default: a temporary SQLite file)")
+    parser.add_argument("--write-behind", action="store_true", help="enable MESSAGE_WRITE_BEHIND on the server")
+    parser.add_argument("--rate-limits", action="store_true", help="keep the server's socket rate limits")
+    parser.add_argument("--drain-timeout", type=float, default=10.0, help="seconds to wait for the last deliveries")
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument("--output", default="load_test.json", help="where to write the JSON results")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.clients)
+        return
+
+    results = run(args)
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
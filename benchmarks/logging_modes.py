@@ -0,0 +1,149 @@
+"""
+Throughput of the Socket.IO hot path under each logging mode.
+
+    python -m benchmarks.logging_modes --messages 20000 --recipients 20 --sink-delay-ms 0.05 --output logging_modes.json
+
+Each message replays the log calls that one `send_message` packet makes in the server, through
+the real `log_pipeline` configuration: engine.io logs the packet it receives and each packet it
+sends (one per recipient), Socket.IO logs the event it received and the event it emits, and
+every 50th message a connect is logged by the socket events logger. Records are written to a
+file; --sink-delay-ms adds a delay per write to stand in for a slow disk or a full stdout pipe.
+
+Modes (each runs in its own process):
+
+  verbose-sync   what the server did before: Socket.IO and engine.io at INFO, written inline
+  sync           production levels (Socket.IO and engine.io at WARNING), written inline
+  queue          production levels and sampling, written by the background thread
+  verbose-queue  INFO everywhere, but 1% of engine.io / Socket.IO records sampled, queued
+
+The report gives messages per second on the calling thread, the p99 time spent logging per
+message, and how many records were written, sampled out or dropped because the queue was full.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = {
+    "verbose-sync": {"LOG_ASYNC": False, "LOG_LEVELS": "socketio=INFO,engineio=INFO", "LOG_SAMPLE_RATES": ""},
+    "sync": {"LOG_ASYNC": False, "LOG_LEVELS": "socketio=WARNING,engineio=WARNING", "LOG_SAMPLE_RATES": ""},
+    "queue": {
+        "LOG_ASYNC": True, "LOG_LEVELS": "socketio=WARNING,engineio=WARNING", "LOG_SAMPLE_RATES": "socket_events=0.1",
+    },
+    "verbose-queue": {
+        "LOG_ASYNC": True,
+        "LOG_LEVELS": "socketio=INFO,engineio=INFO",
+        "LOG_SAMPLE_RATES": "socketio=0.01,engineio=0.01,socket_events=0.1",
+    },
+}
+
+
+def child(mode, messages, recipients, sink_delay, path):
+    """
+    Entry point of a measured process (--child): print the results of one mode as JSON.
+    """
+    import logging
+    from flask import Flask
+    from src.helpers.logs import LOG_FORMAT, log_pipeline
+    from src.helpers.metrics import registry
+
+    class SlowFileHandler(logging.FileHandler):
+        def emit(self, record):
+            super().emit(record)
+            if sink_delay:
+                time.sleep(sink_delay)
+
+    sink = SlowFileHandler(path)
+    sink.setFormatter(logging.Formatter(LOG_FORMAT))
+    logging.getLogger().addHandler(sink)
+
+    app = Flask(__name__)
+    app.config.update(MODES[mode], LOG_LEVEL="INFO", LOG_QUEUE_SIZE=10000)
+    log_pipeline.init_app(app)
+    engineio = logging.getLogger("engineio.server")
+    socketio = logging.getLogger("socketio.server")
+    events = log_pipeline.events_logger(app)
+
+    sid = "Xk2Y8wq1bXyM4VtUAAAB"
+    payload = '2["send_message",{"content":"sounds good, let me check the logs again","conversation_id":null}]'
+    durations = []
+    start = time.perf_counter()
+    for i in range(messages):
+        started = time.perf_counter()
+        engineio.info("%s: Received packet MESSAGE data %s", sid, payload)
+        socketio.info('received event "%s" from %s [%s]', "send_message", sid, "/")
+        socketio.info('emitting event "%s" to %s [%s]', "receive_message", "lobby", "/")
+        for recipient in range(recipients):
+            engineio.info("%s: Sending packet MESSAGE data %s", f"{sid[:-3]}{recipient:03d}", payload)
+        if i % 50 == 0:
+            events.info(f"User bench{i} connected with session ID {sid}")
+        durations.append(time.perf_counter() - started)
+    elapsed = time.perf_counter() - start
+    log_pipeline.close()
+    sink.close()
+
+    with open(path) as output:
+        written = sum(1 for line in output if line.startswith("["))
+    dropped = {
+        sample["labels"]["reason"]: sample["value"]
+        for sample in registry.snapshot().get("chat_log_records_dropped_total", {}).get("samples", [])
+    }
+    durations.sort()
+    print(json.dumps({
+        "messages_per_second": messages / elapsed,
+        "p50_us": statistics.median(durations) * 1e6,
+        "p99_us": durations[int(len(durations) * 0.99) - 1] * 1e6,
+        "max_us": durations[-1] * 1e6,
+        "records_written": written,
+        "records_sampled": dropped.get("sampled", 0),
+        "records_dropped_queue_full": dropped.get("queue_full", 0),
+        "drain_seconds": time.perf_counter() - start - elapsed,
+    }))
+
+
+def run_mode(mode, args):
+    with tempfile.TemporaryDirectory() as directory:
+        output = subprocess.run(
+            [
+                sys.executable, "-m", "benchmarks.logging_modes", "--child", mode,
+                "--messages", str(args.messages), "--recipients", str(args.recipients),
+                "--sink-delay-ms", str(args.sink_delay_ms), "--sink", os.path.join(directory, "sink.log"),
+            ],
+            capture_output=True, text=True, timeout=600,
+        )
+    if output.returncode != 0:
+        raise RuntimeError(f"Mode {mode} failed:\n{output.stderr}")
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--sink", help=argparse.SUPPRESS)
+    parser.add_argument("--messages", type=int, default=20000, help="send_message packets replayed per mode")
+    parser.add_argument("--recipients", type=int, default=20, help="sockets each message is fanned out to")
+    parser.add_argument("--sink-delay-ms", type=float, default=0.0, help="extra time per record written")
+    parser.add_argument("--modes", default=",".join(MODES), help="comma-separated modes to run")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.messages, args.recipients, args.sink_delay_ms / 1000, args.sink)
+        return
+
+    results = {mode: run_mode(mode, args) for mode in args.modes.split(",")}
+    columns = ("messages_per_second", "p99_us", "records_written", "records_sampled", "records_dropped_queue_full")
+    print(f"{'mode':<15}" + "".join(f"{column:>{len(column) + 2}}" for column in columns))
+    for mode, result in results.items():
+        print(f"{mode:<15}" + "".join(f"{result[column]:>{len(column) + 2}.1f}" for column in columns))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({"parameters": vars(args), "results": results}, output, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark of a login storm against message delivery on an eventlet worker.
+
+    python -m benchmarks.login_storm --logins 32
+
+A "delivery" greenlet wakes up every --tick milliseconds, the way the socket
+server hands out messages, and records how late each wake-up was while
+--logins greenlets verify a password at the same time:
+
+  inline pbkdf2    the previous code path (werkzeug pbkdf2 on the event loop)
+  inline argon2    argon2id on the event loop, for reference
+  offloaded argon2 the current path (argon2id in the bounded thread pool)
+
+With hashing on the event loop every wake-up waits for the running hashes;
+offloaded, the delivery lag stays close to zero.
+"""
+import argparse
+import statistics
+import time
+
+import eventlet
+from flask import Flask
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from src.helpers.passwords import PasswordHasher
+
+
+def storm(verify, password_hash, logins, tick):
+    """
+    Run `logins` concurrent verifications and return (elapsed seconds, delivery lags in ms).
+    """
+    lags = []
+    done = []
+
+    def deliver():
+        while not done:
+            expected = time.perf_counter() + tick
+            eventlet.sleep(tick)
+            lags.append(max(0.0, time.perf_counter() - expected) * 1000)
+
+    ticker = eventlet.spawn(deliver)
+    eventlet.sleep(tick * 3)
+    start = time.perf_counter()
+    pool = eventlet.GreenPool(logins)
+    results = list(pool.imap(lambda _: verify(password_hash, "correct horse"), range(logins)))
+    elapsed = time.perf_counter() - start
+    done.append(True)
+    ticker.wait()
+    assert all(results)
+    return elapsed, lags
+
+
+def report(name, logins, elapsed, lags):
+    lags = sorted(lags)
+    p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))]
+    print(f"{name:17} {logins / elapsed:7.1f} logins/s   delivery lag mean {statistics.mean(lags):7.1f} ms"
+          f"   p99 {p99:7.1f} ms   max {lags[-1]:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--tick", type=float, default=5.0, help="delivery interval in milliseconds")
+    parser.add_argument("--workers", type=int, default=4, help="PASSWORD_HASH_WORKERS")
+    args = parser.parse_args()
+    tick = args.tick / 1000
+
+    app = Flask(__name__)
+    app.config["PASSWORD_HASH_WORKERS"] = args.workers
+    offloaded = PasswordHasher()
+    offloaded.init_app(app, async_mode="eventlet")
+    inline = PasswordHasher()
+
+    legacy_hash = generate_password_hash("correct horse", method="pbkdf2:sha256", salt_length=16)
+    argon2_hash = inline.hash("correct horse")
+
+    report("inline pbkdf2", args.logins, *storm(check_password_hash, legacy_hash, args.logins, tick))
+    report("inline argon2", args.logins, *storm(inline.verify, argon2_hash, args.logins, tick))
+    report("offloaded argon2", args.logins, *storm(offloaded.verify, argon2_hash, args.logins, tick))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Micro-benchmark for socket session bookkeeping under connect/disconnect churn.
+
+    python -m benchmarks.session_churn --sessions 100000
+
+Compares the indexed `SessionManager` with the previous linear user->sid scan.
+The legacy scan is O(online users) per disconnect, so it is only measured on a
+sample of disconnects and extrapolated.
+"""
+import argparse
+import random
+import time
+import uuid
+
+from src.helpers.session_manager import SessionManager
+
+
+class LegacySessionManager:
+    """
+    The previous implementation: one sid per user, linear lookup by sid.
+    """
+    def __init__(self):
+        self.sessions = {}
+
+    def add_session(self, user_id, sid):
+        self.sessions[user_id] = sid
+
+    def remove_session(self, sid):
+        for user_id, session_id in self.sessions.items():
+            if session_id == sid:
+                del self.sessions[user_id]
+                return user_id
+        return None
+
+
+def churn(manager, pairs, disconnects):
+    start = time.perf_counter()
+    for user_id, sid in pairs:
+        manager.add_session(user_id, sid)
+    connected = time.perf_counter()
+    for user_id, sid in disconnects:
+        manager.remove_session(sid)
+        manager.add_session(user_id, sid)  # Reconnect storm: the same session comes back
+    finished = time.perf_counter()
+    return connected - start, finished - connected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument("--churn", type=int, default=100_000, help="disconnect/reconnect cycles")
+    parser.add_argument("--legacy-sample", type=int, default=200, help="cycles measured on the legacy scan")
+    args = parser.parse_args()
+
+    pairs = [(f"user{i}", uuid.uuid4().hex) for i in range(args.sessions)]
+    disconnects = random.choices(pairs, k=args.churn)
+
+    connect, cycles = churn(SessionManager(), pairs, disconnects)
+    print(f"indexed: {args.sessions} connects in {connect * 1000:.1f} ms, "
+          f"{args.churn} disconnect+reconnect cycles in {cycles * 1000:.1f} ms "
+          f"({cycles / args.churn * 1e6:.2f} us/cycle)")
+
+    sample = disconnects[:args.legacy_sample]
+    connect, cycles = churn(LegacySessionManager(), pairs, sample)
+    per_cycle = cycles / len(sample)
+    print(f"legacy:  {args.sessions} connects in {connect * 1000:.1f} ms, "
+          f"{len(sample)} disconnect+reconnect cycles in {cycles * 1000:.1f} ms "
+          f"({per_cycle * 1e6:.2f} us/cycle, ~{per_cycle * args.churn:.1f} s for {args.churn})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark of the per-message authentication cost on the socket send path.
+
+    python -m benchmarks.socket_auth --messages 5000
+
+"per-message" replays what handle_send_message used to do for every message:
+push an app context, decode and verify the JWT, log the payload and look the
+sender up by username. "bound" is the current path: the identity verified at
+connect time is read from the session index and its expiry compared to now.
+"""
+import argparse
+import logging
+import time
+
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token, decode_token
+
+from src.database import db
+from src.helpers.session_manager import SessionManager, SocketIdentity
+# Every model is imported so the mappers and their relationships can be configured
+from src.models.conversation import Conversation  # noqa: F401
+from src.models.message import Message  # noqa: F401
+from src.models.token import Token  # noqa: F401
+from src.models.user import User
+
+
+def build_app():
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI="sqlite://",
+        JWT_SECRET_KEY="benchmark-secret-key-that-is-long-enough",
+    )
+    app.logger.setLevel(logging.INFO)
+    app.logger.handlers = [logging.NullHandler()]
+    app.logger.propagate = False
+    db.init_app(app)
+    JWTManager(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username="bench", email="bench@example.com", password_hash="x"))
+        db.session.commit()
+    return app
+
+
+def per_message(app, token, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        with app.app_context():
+            decoded = decode_token(token.encode("utf-8"))
+            app.logger.info(f"Decoded token: {decoded}")
+            user = User.query.filter_by(username=decoded["sub"]).first()
+            assert user is not None
+            db.session.remove()
+    return time.perf_counter() - start
+
+
+def bound(sessions, sid, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        identity = sessions.get_identity(sid)
+        assert identity is not None and time.time() < identity.expires_at
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=5000)
+    args = parser.parse_args()
+
+    app = build_app()
+    with app.app_context():
+        token = create_access_token(identity="bench")
+        decoded = decode_token(token)
+        user = User.query.filter_by(username="bench").first()
+        sessions = SessionManager()
+        sessions.add_session("bench", "sid", SocketIdentity("bench", user.id, decoded["exp"], set()))
+
+    legacy = per_message(app, token, args.messages)
+    current = bound(sessions, "sid", args.messages)
+    print(f"per-message auth: {args.messages / legacy:,.0f} msg/s ({legacy / args.messages * 1e6:.1f} us/msg)")
+    print(f"bound identity:   {args.messages / current:,.0f} msg/s ({current / args.messages * 1e6:.2f} us/msg)")
+    print(f"auth overhead removed per message: {(legacy - current) / args.messages * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
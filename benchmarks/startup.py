@@ -0,0 +1,133 @@
+"""
+Startup time of one server worker.
+
+    python -m benchmarks.startup --runs 5 --output startup.json
+
+Each run starts a fresh Python process against a new SQLite database and times:
+
+  1. import: `import src.server` (the modules of every controller and service),
+  2. create_app: building the Flask app and its Socket.IO server,
+  3. ready: the first GET /ready, which connects to the database and creates the schema,
+  4. process: the whole child process, interpreter start and exit included.
+
+Boot (import + create_app) is what a worker pays before it can accept a connection,
+and must stay under --budget seconds; the script exits with status 1 otherwise.
+SMTP points at a local socket that accepts connections but never answers, so
+talking to the mail server during boot shows up as a stall instead of going unnoticed.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PHASES = ("import", "create_app", "boot", "ready", "process")
+
+
+def child():
+    """
+    Entry point of a measured process (--child): print the phase timings as JSON.
+    """
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    start = time.perf_counter()
+    import src.server
+    imported = time.perf_counter()
+    app = src.server.create_app()
+    created = time.perf_counter()
+    response = app.test_client().get("/ready")
+    ready = time.perf_counter()
+    print(json.dumps({
+        "import": imported - start,
+        "create_app": created - imported,
+        "boot": created - start,
+        "ready": ready - created,
+        "ready_status": response.status_code,
+    }))
+
+
+def blackhole():
+    """
+    A listening socket that is never read: connecting succeeds, then every request hangs.
+    """
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(128)
+    return sock
+
+
+def run_once(port):
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(
+            os.environ,
+            FLASK_DEBUG="0",
+            DATABASE_URL=f"sqlite:///{os.path.join(directory, 'startup.db')}",
+            SECRET_KEY="startup-secret",
+            JWT_SECRET_KEY="startup-jwt-secret-key-long-enough",
+            MAIL_SERVER="127.0.0.1",
+            MAIL_PORT=str(port),
+            MINIO_ENDPOINT="",
+            # The archiver and sweeper would wake up much later; keep the run about boot only
+            MESSAGE_ARCHIVE_INTERVAL="0",
+            TOKEN_SWEEP_INTERVAL="0",
+        )
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.startup", "--child"],
+            env=env, capture_output=True, text=True, timeout=120,
+        )
+        elapsed = time.perf_counter() - start
+    if output.returncode != 0:
+        raise RuntimeError(f"Startup run failed:\n{output.stderr}")
+    result = json.loads(output.stdout.strip().splitlines()[-1])
+    result["process"] = elapsed
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes to start")
+    parser.add_argument("--budget", type=float, default=1.0, help="maximum median boot time in seconds")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return
+
+    sock = blackhole()
+    try:
+        runs = [run_once(sock.getsockname()[1]) for _ in range(args.runs)]
+    finally:
+        sock.close()
+
+    summary = {
+        phase: {
+            "median_ms": statistics.median(run[phase] for run in runs) * 1000,
+            "max_ms": max(run[phase] for run in runs) * 1000,
+        }
+        for phase in PHASES
+    }
+    print(f"{'phase':<12}{'median_ms':>12}{'max_ms':>12}")
+    for phase, values in summary.items():
+        print(f"{phase:<12}{values['median_ms']:>12.1f}{values['max_ms']:>12.1f}")
+    statuses = sorted({run["ready_status"] for run in runs})
+    print(f"\n/ready status: {', '.join(map(str, statuses))}")
+
+    within_budget = summary["boot"]["median_ms"] <= args.budget * 1000
+    print(f"Boot {'within' if within_budget else 'OVER'} the {args.budget:.2f} s budget")
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({"runs": runs, "summary": summary, "budget_s": args.budget}, output, indent=2)
+        print(f"Results written to {args.output}")
+    if not within_budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Benchmark of bytes on the wire and encode CPU for each payload format.
+
+    python -m benchmarks.wire_formats --repeat 200 --output wire_formats.json
+
+Socket.IO: a single `receive_message` event and a `sync_messages` batch are
+encoded as python-socketio packets with the JSON (default) and MessagePack
+serializers. REST: a history page (GET /message/messages) and a user
+directory page (GET /user/users) are serialized like Flask's jsonify, then
+sent as is, gzipped and brotli-compressed at a few levels.
+
+Payloads are synthetic but shaped like the real ones: chat-length sentences,
+ISO timestamps and presigned avatar URLs, whose signatures don't compress.
+Formats whose package (msgpack, brotli) is not installed are skipped.
+"""
+import argparse
+import gzip
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+from socketio import packet
+
+try:
+    import msgpack  # noqa: F401
+    from socketio import msgpack_packet
+except ImportError:
+    msgpack_packet = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+WORDS = (
+    "hey what about the meeting tomorrow I think we should ship it before lunch "
+    "sounds good let me check the logs again did you see the new design thanks "
+    "sure no worries the build is green now can you review my branch later"
+).split()
+
+
+def sentence(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 20)))
+
+
+def random_hex(rng):
+    return f"{rng.getrandbits(256):064x}"
+
+
+def avatar_url(rng):
+    return (
+        f"http://minio:9000/chat-app/avatars/{random_hex(rng)}/256.webp"
+        "?X-Amz-Algorithm=AWS4-HMAC-SHA256"
+        f"&X-Amz-Credential=minioadmin%2F20240101%2Fus-east-1%2Fs3%2Faws4_request"
+        f"&X-Amz-Date=20240101T000000Z&X-Amz-Expires=3600&X-Amz-SignedHeaders=host"
+        f"&X-Amz-Signature={random_hex(rng)}"
+    )
+
+
+def messages(rng, count):
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    return [
+        {
+            "id": 100000 + i,
+            "username": f"user{rng.randint(1, 40)}",
+            "message": sentence(rng),
+            "timestamp": (start + timedelta(seconds=i * 7, microseconds=rng.randint(0, 999999))).isoformat(),
+            "conversation_id": None,
+        }
+        for i in range(count)
+    ]
+
+
+def payloads(rng, page_size, users_page_size, sync_size):
+    history = messages(rng, page_size)
+    users = [
+        {"id": i, "username": f"user{i:05d}", "image_url": avatar_url(rng) if rng.random() < 0.7 else None}
+        for i in range(users_page_size)
+    ]
+    return {
+        "socketio": {
+            "receive_message": ["receive_message", messages(rng, 1)[0]],
+            "sync_messages": ["sync_messages", {"messages": messages(rng, sync_size), "last_message_id": 100000 + sync_size}],
+        },
+        "rest": {
+            "GET /message/messages": {"messages": history, "before": "MTcwNDExMDQwMHwxMDAwMDA", "after": "MTcwNDExMDc0OXwxMDAwNDk", "has_more": True},
+            "GET /user/users": {"users": users, "after": "dXNlcjAwMTk5", "has_more": True},
+        },
+    }
+
+
+def timed(function, repeat):
+    """
+    Return (result, mean microseconds per call).
+    """
+    result = function()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return result, round((time.perf_counter() - start) / repeat * 1e6, 2)
+
+
+def socketio_results(events, repeat):
+    serializers = {"json": packet.Packet}
+    if msgpack_packet is not None:
+        serializers["msgpack"] = msgpack_packet.MsgPackPacket
+    results = {}
+    for name, data in events.items():
+        results[name] = {}
+        for serializer, packet_class in serializers.items():
+            encoded, micros = timed(lambda: packet_class(packet.EVENT, data=data, namespace="/").encode(), repeat)
+            size = len(encoded.encode("utf-8") if isinstance(encoded, str) else encoded)
+            results[name][serializer] = {"bytes": size, "encode_us": micros}
+    return results
+
+
+def rest_results(bodies, repeat):
+    app = Flask(__name__)
+    encoders = {"identity": lambda data: data}
+    for level in (1, 6, 9):
+        encoders[f"gzip-{level}"] = lambda data, level=level: gzip.compress(data, compresslevel=level, mtime=0)
+    if brotli is not None:
+        for quality in (1, 4, 11):
+            encoders[f"br-{quality}"] = lambda data, quality=quality: brotli.compress(data, quality=quality)
+    results = {}
+    with app.app_context():
+        for name, body in bodies.items():
+            data, serialize_us = timed(lambda: app.json.dumps(body).encode("utf-8"), repeat)
+            results[name] = {"serialize_us": serialize_us}
+            for encoding, encoder in encoders.items():
+                encoded, micros = timed(lambda: encoder(data), repeat)
+                results[name][encoding] = {
+                    "bytes": len(encoded),
+                    "ratio": round(len(encoded) / len(data), 3),
+                    "encode_us": micros,
+                }
+    return results
+
+
+def print_table(title, results):
+    print(f"\n{title}")
+    for name, formats in results.items():
+        print(f"  {name}")
+        for encoding, result in formats.items():
+            if isinstance(result, dict):
+                ratio = f"  ratio {result['ratio']:.3f}" if "ratio" in result else ""
+                print(f"    {encoding:<10} {result['bytes']:>9,} B  {result['encode_us']:>10.2f} us{ratio}")
+            else:
+                print(f"    {encoding:<10} {result:>10.2f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200, help="encodings timed per format")
+    parser.add_argument("--page-size", type=int, default=50, help="messages in the history page")
+    parser.add_argument("--users", type=int, default=200, help="users in the directory page")
+    parser.add_argument("--sync-size", type=int, default=200, help="messages in the sync_messages batch")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    data = payloads(rng, args.page_size, args.users, args.sync_size)
+    results = {
+        "socketio": socketio_results(data["socketio"], args.repeat),
+        "rest": rest_results(data["rest"], args.repeat),
+        "skipped": [name for name, module in (("msgpack", msgpack_packet), ("brotli", brotli)) if module is None],
+    }
+    print_table("Socket.IO packets", results["socketio"])
+    print_table("REST bodies (serialize_us is the JSON encoding)", results["rest"])
+    if results["skipped"]:
+        print(f"\nSkipped (not installed): {', '.join(results['skipped'])}")
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 "use client";
-import { useEffect, useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import io, { Socket } from "socket.io-client";
+import axios from "axios";
 import Cookie from "js-cookie";
 import { ProfileService } from "@/services/profile.services";
 import { Avatar, AvatarFallback, AvatarImage } from "./ui/avatar";
@@ -9,17 +10,39 @@ import { Button } from "./ui/button";
 import { Send, Smile } from "lucide-react";
 import EmojiPicker from "emoji-picker-react";
 import { MessageService } from "@/services/message.services";
+import * as msgpackParser from "@/lib/msgpack-parser";
+
+const SOCKET_URL = "http://127.0.0.1:5000";
+
+// Order of the history: by timestamp, then id (ids alone don't follow commit order)
+const compareMessages = (a: Message, b: Message) =>
+  (a.timestamp ?? "").localeCompare(b.timestamp ?? "") || (a.id ?? 0) - (b.id ?? 0);
 
 const Chat = () => {
   const [socket, setSocket] = useState<typeof Socket | null>(null);
   const [messages, setMessages] = useState<Message[]>([]);
   const [users, setUsers] = useState<any[]>([]);
+  const [onlineUsers, setOnlineUsers] = useState<Set<string>>(new Set());
   const [message, setMessage] = useState("");
   const [username, setUsername] = useState("");
   const [userlogo, setUserlogo] = useState("");
   const [showEmojiPicker, setShowEmojiPicker] = useState(false); // State to toggle emoji picker
 
   const token = Cookie.get("access_token");
+  const lastMessageId = useRef<number | null>(null); // Newest message received, sent back when reconnecting
+
+  // Merge messages in (timestamp, id) order, skipping those already shown: a reconnect may deliver one
+  // both live and in the catch-up, and the catch-up re-sends a window before the last message seen
+  const appendMessages = (incoming: Message[]) => {
+    setMessages((prevMessages) => {
+      const known = new Set(prevMessages.map((m) => m.id));
+      const merged = [...prevMessages, ...incoming.filter((m) => m.id === undefined || !known.has(m.id))];
+      merged.sort(compareMessages);
+      const newest = merged[merged.length - 1];
+      if (newest?.id !== undefined) lastMessageId.current = newest.id;
+      return merged;
+    });
+  };
 
   // Fetch profile data on component mount
   useEffect(() => {
@@ -49,11 +72,26 @@ const Chat = () => {
     fetchUsers();
   }, []);
 
+  // The snapshot only covers the user's contacts: the online users of the sidebar's page come from the directory
+  const fetchOnlineUsers = async () => {
+    try {
+      const { users } = await ProfileService.getUsers({ online: true });
+      setOnlineUsers((prevOnline) => {
+        const online = new Set(prevOnline);
+        users.forEach((user) => online.add(user.username));
+        return online;
+      });
+    } catch (error) {
+      console.error("Error fetching online users:", error);
+    }
+  };
+
   useEffect(() => {
     const fetchMessages = async () => {
       try {
         const { messages } = await MessageService.getMessages();
         setMessages(messages)
+        if (messages.length) lastMessageId.current = messages[messages.length - 1].id ?? null;
       } catch (error) {
         console.error("Error fetching messages:", error);
       }
@@ -63,28 +101,78 @@ const Chat = () => {
 
   // Connect to Socket.IO server on component mount
   useEffect(() => {
-    const socketConnection = io("http://127.0.0.1:5000", {
-      query: { token: token },
-    });
+    let connection: typeof Socket | null = null;
+    let cancelled = false;
 
-    // Listen for server message when connected
-    socketConnection.on("server_message", (data: any) => {
-      console.log(data.message); // Log server's message to the console
-    });
+    const connect = async () => {
+      // The server may be set to MessagePack packets (SOCKETIO_SERIALIZER): load the matching parser
+      const options: any = { query: { token: token } };
+      try {
+        const { data } = await axios.get(`${SOCKET_URL}/`);
+        if (data.socketio_serializer === "msgpack") {
+          options.parser = msgpackParser;
+        }
+      } catch (error) {
+        console.error("Error fetching the server's socket settings:", error);
+      }
+      if (cancelled) return;
 
-    // Listen for received messages
-    socketConnection.on("receive_message", (data: any) => {
-      setMessages((prevMessages) => [
-        ...prevMessages,
-        { username: data.username, message: data.message },
-      ]);
-    });
+      const socketConnection = io(SOCKET_URL, options);
+      connection = socketConnection;
+
+      // Listen for server message when connected
+      socketConnection.on("server_message", (data: any) => {
+        console.log(data.message); // Log server's message to the console
+      });
+
+      // Listen for received messages
+      socketConnection.on("receive_message", (data: Message) => {
+        appendMessages([data]);
+      });
+
+      // Ask for the messages missed while disconnected
+      socketConnection.io.on("reconnect_attempt", () => {
+        socketConnection.io.opts.query = lastMessageId.current === null
+          ? { token }
+          : { token, last_message_id: lastMessageId.current };
+      });
+
+      // Online contacts on connect, then the users who came online or went offline, batched by the server
+      socketConnection.on("presence", (data: PresenceChange) => {
+        setOnlineUsers((prevOnline) => {
+          const online = new Set(data.snapshot ? [] : prevOnline);
+          data.online.forEach((name) => online.add(name));
+          data.offline.forEach((name) => online.delete(name));
+          return online;
+        });
+        if (data.snapshot) fetchOnlineUsers();
+      });
+
+      // Messages missed while disconnected, in one batch
+      socketConnection.on("sync_messages", (data: SyncBatch) => {
+        appendMessages(data.messages);
+      });
+
+      // Too many messages were missed: reload the history instead
+      socketConnection.on("resync_required", async () => {
+        try {
+          const { messages } = await MessageService.getMessages();
+          setMessages(messages);
+          if (messages.length) lastMessageId.current = messages[messages.length - 1].id ?? null;
+        } catch (error) {
+          console.error("Error fetching messages:", error);
+        }
+      });
+
+      setSocket(socketConnection); // Save the socket connection
+    };
 
-    setSocket(socketConnection); // Save the socket connection
+    connect();
 
     // Cleanup on unmount
     return () => {
-      socketConnection.disconnect();
+      cancelled = true;
+      connection?.disconnect();
     };
   }, [token]);
 
@@ -129,6 +217,9 @@ const Chat = () => {
               </Avatar>
               {/* Display the username */}
               <span className="ml-2">{contact.username}</span>{" "}
+              {onlineUsers.has(contact.username) && (
+                <span className="ml-auto h-2 w-2 rounded-full bg-green-500" title="Online" />
+              )}
             </div>
           ))}
         </div>
@@ -1,7 +1,38 @@
 
 interface Message {
+  id?: number;
   username: string;
   message: string;
+  timestamp?: string;
+  conversation_id?: number | null;
+}
+
+interface MessagePage {
+  messages: Message[];
+  before: string | null;
+  after: string | null;
+  has_more: boolean;
+}
+
+interface SyncBatch {
+  messages: Message[];
+  last_message_id: number;
+}
+
+interface PresenceChange {
+  online: string[];
+  offline: string[];
+  snapshot?: boolean; // Sent once on connect: the online state of the user's contacts
+}
+
+interface SearchResult extends Message {
+  rank: number;
+}
+
+interface SearchPage {
+  results: SearchResult[];
+  after: string | null;
+  has_more: boolean;
 }
 
 interface UserProfile {
@@ -0,0 +1,277 @@
+// Socket.IO parser exchanging MessagePack packets, for servers started with SOCKETIO_SERIALIZER=msgpack.
+// Each packet is one binary frame holding the map {type, data, nsp, id}, as python-socketio's msgpack packets.
+// Integers beyond 2^53 lose precision, as in JSON.
+
+type Listener = (...args: any[]) => void;
+
+interface Packet {
+  type: number;
+  nsp: string;
+  data?: any;
+  id?: number;
+}
+
+const utf8Encoder = new TextEncoder();
+const utf8Decoder = new TextDecoder();
+
+class Writer {
+  private buffer = new Uint8Array(256);
+  private view = new DataView(this.buffer.buffer);
+  private length = 0;
+
+  private reserve(size: number) {
+    if (this.length + size <= this.buffer.length) return;
+    let capacity = this.buffer.length * 2;
+    while (capacity < this.length + size) capacity *= 2;
+    const buffer = new Uint8Array(capacity);
+    buffer.set(this.buffer.subarray(0, this.length));
+    this.buffer = buffer;
+    this.view = new DataView(buffer.buffer);
+  }
+
+  private header(byte: number, size: number, setter: "setUint8" | "setUint16" | "setUint32", value: number) {
+    this.reserve(1 + size);
+    this.view.setUint8(this.length, byte);
+    this.view[setter](this.length + 1, value);
+    this.length += 1 + size;
+  }
+
+  private byte(value: number) {
+    this.reserve(1);
+    this.view.setUint8(this.length++, value);
+  }
+
+  private bytes(value: Uint8Array) {
+    this.reserve(value.length);
+    this.buffer.set(value, this.length);
+    this.length += value.length;
+  }
+
+  private sized(size: number, fix: number | null, fixMax: number, codes: [number, number, number]) {
+    if (fix !== null && size <= fixMax) this.byte(fix | size);
+    else if (codes[0] && size < 0x100) this.header(codes[0], 1, "setUint8", size);
+    else if (size < 0x10000) this.header(codes[1], 2, "setUint16", size);
+    else this.header(codes[2], 4, "setUint32", size);
+  }
+
+  private number(value: number) {
+    if (!Number.isInteger(value) || !Number.isSafeInteger(value)) {
+      this.reserve(9);
+      this.view.setUint8(this.length, 0xcb);
+      this.view.setFloat64(this.length + 1, value);
+      this.length += 9;
+    } else if (value >= 0) {
+      if (value < 0x80) this.byte(value);
+      else if (value < 0x100) this.header(0xcc, 1, "setUint8", value);
+      else if (value < 0x10000) this.header(0xcd, 2, "setUint16", value);
+      else if (value < 0x100000000) this.header(0xce, 4, "setUint32", value);
+      else this.int64(0xcf, value);
+    } else {
+      if (value >= -0x20) this.byte(value & 0xff);
+      else if (value >= -0x80) this.header(0xd0, 1, "setUint8", value & 0xff);
+      else if (value >= -0x8000) this.header(0xd1, 2, "setUint16", value & 0xffff);
+      else if (value >= -0x80000000) this.header(0xd2, 4, "setUint32", value >>> 0);
+      else this.int64(0xd3, value);
+    }
+  }
+
+  private int64(code: number, value: number) {
+    const high = Math.floor(value / 0x100000000);
+    this.reserve(9);
+    this.view.setUint8(this.length, code);
+    this.view.setInt32(this.length + 1, high);
+    this.view.setUint32(this.length + 5, value - high * 0x100000000);
+    this.length += 9;
+  }
+
+  write(value: any) {
+    if (value === null || value === undefined) {
+      this.byte(0xc0);
+    } else if (typeof value === "boolean") {
+      this.byte(value ? 0xc3 : 0xc2);
+    } else if (typeof value === "number") {
+      this.number(value);
+    } else if (typeof value === "string") {
+      const encoded = utf8Encoder.encode(value);
+      this.sized(encoded.length, 0xa0, 31, [0xd9, 0xda, 0xdb]);
+      this.bytes(encoded);
+    } else if (value instanceof ArrayBuffer || ArrayBuffer.isView(value)) {
+      const bytes = value instanceof ArrayBuffer
+        ? new Uint8Array(value)
+        : new Uint8Array(value.buffer, value.byteOffset, value.byteLength);
+      this.sized(bytes.length, null, 0, [0xc4, 0xc5, 0xc6]);
+      this.bytes(bytes);
+    } else if (Array.isArray(value)) {
+      this.sized(value.length, 0x90, 15, [0, 0xdc, 0xdd]);
+      value.forEach((item) => this.write(item));
+    } else if (value instanceof Date) {
+      this.write(value.toISOString());
+    } else if (typeof value === "object") {
+      // Like JSON, undefined properties are left out
+      const entries = Object.entries(value).filter(([, item]) => item !== undefined);
+      this.sized(entries.length, 0x80, 15, [0, 0xde, 0xdf]);
+      entries.forEach(([key, item]) => {
+        this.write(key);
+        this.write(item);
+      });
+    } else {
+      throw new Error(`Cannot encode a ${typeof value} with MessagePack`);
+    }
+  }
+
+  result() {
+    return this.buffer.slice(0, this.length);
+  }
+}
+
+class Reader {
+  private view: DataView;
+  private offset = 0;
+
+  constructor(private bytes: Uint8Array) {
+    this.view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+  }
+
+  private take(size: number) {
+    if (this.offset + size > this.bytes.length) throw new Error("Truncated MessagePack data");
+    const offset = this.offset;
+    this.offset += size;
+    return offset;
+  }
+
+  private uint(size: number) {
+    const offset = this.take(size);
+    if (size === 1) return this.view.getUint8(offset);
+    if (size === 2) return this.view.getUint16(offset);
+    if (size === 4) return this.view.getUint32(offset);
+    return this.view.getUint32(offset) * 0x100000000 + this.view.getUint32(offset + 4);
+  }
+
+  private int(size: number) {
+    const offset = this.take(size);
+    if (size === 1) return this.view.getInt8(offset);
+    if (size === 2) return this.view.getInt16(offset);
+    if (size === 4) return this.view.getInt32(offset);
+    return this.view.getInt32(offset) * 0x100000000 + this.view.getUint32(offset + 4);
+  }
+
+  private string(size: number) {
+    const offset = this.take(size);
+    return utf8Decoder.decode(this.bytes.subarray(offset, offset + size));
+  }
+
+  private binary(size: number) {
+    const offset = this.take(size);
+    return this.bytes.slice(offset, offset + size).buffer;
+  }
+
+  private array(size: number) {
+    const items = [];
+    for (let i = 0; i < size; i++) items.push(this.read());
+    return items;
+  }
+
+  private map(size: number) {
+    const result: Record<string, any> = {};
+    for (let i = 0; i < size; i++) {
+      const key = this.read();
+      result[String(key)] = this.read();
+    }
+    return result;
+  }
+
+  read(): any {
+    const code = this.uint(1);
+    if (code < 0x80) return code;
+    if (code < 0x90) return this.map(code & 0x0f);
+    if (code < 0xa0) return this.array(code & 0x0f);
+    if (code < 0xc0) return this.string(code & 0x1f);
+    if (code >= 0xe0) return code - 0x100;
+    switch (code) {
+      case 0xc0: return null;
+      case 0xc2: return false;
+      case 0xc3: return true;
+      case 0xc4: return this.binary(this.uint(1));
+      case 0xc5: return this.binary(this.uint(2));
+      case 0xc6: return this.binary(this.uint(4));
+      case 0xca: return this.view.getFloat32(this.take(4));
+      case 0xcb: return this.view.getFloat64(this.take(8));
+      case 0xcc: return this.uint(1);
+      case 0xcd: return this.uint(2);
+      case 0xce: return this.uint(4);
+      case 0xcf: return this.uint(8);
+      case 0xd0: return this.int(1);
+      case 0xd1: return this.int(2);
+      case 0xd2: return this.int(4);
+      case 0xd3: return this.int(8);
+      case 0xd9: return this.string(this.uint(1));
+      case 0xda: return this.string(this.uint(2));
+      case 0xdb: return this.string(this.uint(4));
+      case 0xdc: return this.array(this.uint(2));
+      case 0xdd: return this.array(this.uint(4));
+      case 0xde: return this.map(this.uint(2));
+      case 0xdf: return this.map(this.uint(4));
+    }
+    throw new Error(`Unsupported MessagePack type 0x${code.toString(16)}`);
+  }
+
+  done() {
+    return this.offset === this.bytes.length;
+  }
+}
+
+export function encode(value: any): Uint8Array {
+  const writer = new Writer();
+  writer.write(value);
+  return writer.result();
+}
+
+export function decode(data: ArrayBuffer | Uint8Array): any {
+  const reader = new Reader(data instanceof Uint8Array ? data : new Uint8Array(data));
+  const value = reader.read();
+  if (!reader.done()) throw new Error("Trailing bytes after MessagePack data");
+  return value;
+}
+
+export class Encoder {
+  encode(packet: Packet) {
+    const { type, nsp, data, id } = packet;
+    return [encode({ type, nsp, data, id })];
+  }
+}
+
+export class Decoder {
+  private listeners: Record<string, Listener[]> = {};
+
+  on(event: string, listener: Listener) {
+    (this.listeners[event] = this.listeners[event] || []).push(listener);
+    return this;
+  }
+
+  off(event?: string, listener?: Listener) {
+    if (event === undefined) this.listeners = {};
+    else if (listener === undefined) delete this.listeners[event];
+    else this.listeners[event] = (this.listeners[event] || []).filter((item) => item !== listener);
+    return this;
+  }
+
+  emit(event: string, ...args: any[]) {
+    (this.listeners[event] || []).slice().forEach((listener) => listener(...args));
+    return this;
+  }
+
+  add(chunk: ArrayBuffer | Uint8Array | string) {
+    if (typeof chunk === "string") throw new Error("Expected a binary MessagePack packet");
+    const packet = decode(chunk);
+    if (!packet || typeof packet.type !== "number" || typeof packet.nsp !== "string") {
+      throw new Error("Invalid Socket.IO packet");
+    }
+    if (packet.id === null) delete packet.id;
+    if (packet.data === null) delete packet.data;
+    this.emit("decoded", packet);
+  }
+
+  destroy() {
+    this.off();
+  }
+}
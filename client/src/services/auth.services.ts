@@ -25,6 +25,17 @@ export class AuthService {
     }
   }
 
+  // Exchange the refresh token for new tokens; the old refresh token can't be used again
+  static async refresh(refreshToken: string): Promise<Tokens> {
+    try {
+      const response = await axios.post(`${API_BASE_URL}/auth/refresh`, { refresh_token: refreshToken });
+      return response.data; // Includes the new access and refresh tokens
+    } catch (error: any) {
+      console.error('Token refresh failed:', error.response?.data?.message || error.message);
+      throw new Error(error.response?.data?.message || 'Token refresh failed');
+    }
+  }
+
   // User Logout
   static async logout(refreshToken: string): Promise<{ message: string }> {
     try {
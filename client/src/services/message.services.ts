@@ -5,11 +5,12 @@ const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL;
 
 export class MessageService {
   // Get Messages
-  static async getMessages(): Promise<{ messages: [{message: string, username: string}]}> {
+  static async getMessages(params: { conversation_id?: number; before?: string; after?: string; limit?: number } = {}): Promise<MessagePage> {
     try {
         const accessToken = Cookies.get('access_token');
 
         const response = await axios.get(`${API_BASE_URL}/message/messages`, {
+            params,
             withCredentials: true,
             headers: {
                 Authorization: `Bearer ${accessToken}`,
@@ -21,4 +22,23 @@ export class MessageService {
         throw new Error(error.response?.data?.error || 'Failed to fetch messages'); 
     }
   }
+
+  // Search the message history, best matches first; `after` is the cursor of the previous page
+  static async searchMessages(params: { q: string; conversation_id?: number; sort?: 'relevance' | 'recent'; after?: string; limit?: number }): Promise<SearchPage> {
+    try {
+        const accessToken = Cookies.get('access_token');
+
+        const response = await axios.get(`${API_BASE_URL}/message/search`, {
+            params,
+            withCredentials: true,
+            headers: {
+                Authorization: `Bearer ${accessToken}`,
+            },
+        })
+        return response.data;
+    } catch (error: any) {
+        console.error('Failed to search messages:', error.response?.data?.error || error.message);
+        throw new Error(error.response?.data?.error || 'Failed to search messages');
+    }
+  }
 }
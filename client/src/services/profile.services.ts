@@ -3,6 +3,26 @@ import Cookies from 'js-cookie';  // Import js-cookie
 
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL;
 
+export interface DirectoryUser {
+  id: number;
+  username: string;
+  image_url: string | null;
+}
+
+export interface UserPage {
+  users: DirectoryUser[];
+  after: string | null;
+  has_more: boolean;
+}
+
+// Profile picture processed in the background after an upload
+export interface ImageJob {
+  id: string;
+  status: 'pending' | 'processing' | 'done' | 'failed';
+  variants: { [size: string]: string };
+  error: string | null;
+}
+
 export class ProfileService {
   // Get Profile
   static async getProfile(): Promise<{ success: boolean; profile: any; message: string }> {
@@ -22,11 +42,12 @@ export class ProfileService {
     }
   }
 
-  // Get users
-  static async getUsers(): Promise<{users: any}> {
+  // Get a page of users; `after` is the cursor returned by the previous page
+  static async getUsers(params: { search?: string; online?: boolean; after?: string; limit?: number } = {}): Promise<UserPage> {
     try {
       const accessToken = Cookies.get('access_token');
       const response = await axios.get(`${API_BASE_URL}/user/users`, {
+        params,
         withCredentials: true, // Ensures cookies are included in the request
         headers: {
           Authorization: `Bearer ${accessToken}`, // Add the token to the Authorization header
@@ -40,7 +61,7 @@ export class ProfileService {
   }
 
   // Update Profile
-  static async updateProfile(data: { [key: string]: any }, file?: File): Promise<{ success: boolean; message: string }> {
+  static async updateProfile(data: { [key: string]: any }, file?: File): Promise<{ success: boolean; message: string; image_job?: ImageJob }> {
     try {
       const accessToken = Cookies.get('access_token'); // Retrieve the access token from cookies
 
@@ -58,10 +79,27 @@ export class ProfileService {
         withCredentials: true, // Ensures cookies are included in the request
       });
 
-      return response.data; // Includes success status and message
+      return response.data; // Includes success status, message and the image job when a file was sent
     } catch (error: any) {
       console.error('Failed to update profile:', error.response?.data?.error || error.message);
       throw new Error(error.response?.data?.error || 'Failed to update profile');
     }
   }
+
+  // Poll the processing status of an uploaded profile picture
+  static async getImageJob(jobId: string): Promise<{ success: boolean; image_job: ImageJob; image_url: string }> {
+    try {
+      const accessToken = Cookies.get('access_token');
+      const response = await axios.get(`${API_BASE_URL}/user/profile/image/${jobId}`, {
+        withCredentials: true,
+        headers: {
+          Authorization: `Bearer ${accessToken}`,
+        },
+      });
+      return response.data;
+    } catch (error: any) {
+      console.error('Failed to fetch image status:', error.response?.data?.error || error.message);
+      throw new Error(error.response?.data?.error || 'Failed to fetch image status');
+    }
+  }
 }
@@ -15,7 +15,13 @@ class Config:
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
     #SQLALCHEMY_DATABASE_URI = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ECHO = True  # Optional: logs SQL queries
+    SQLALCHEMY_ECHO = os.getenv("SQLALCHEMY_ECHO", "False").lower() in ["true", "1"]  # Optional: logs SQL queries
+    # Connection pool, sized against the number of concurrent greenlets per worker
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))  # seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))  # seconds before a connection is replaced
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "True").lower() in ["true", "1"]
     # Flask-Mail configuration
     MAIL_SERVER = os.getenv("MAIL_SERVER")
     MAIL_PORT = int(os.getenv("MAIL_PORT", 587))
@@ -24,6 +30,85 @@ class Config:
     MAIL_USERNAME = os.getenv("MAIL_USERNAME")
     MAIL_PASSWORD = os.getenv("MAIL_PASSWORD")
     MAIL_DEFAULT_SENDER = os.getenv("MAIL_DEFAULT_SENDER")
+    # Background delivery queue; workers keep their SMTP connection open between messages
+    MAIL_ASYNC = os.getenv("MAIL_ASYNC", "True").lower() in ["true", "1"]
+    MAIL_QUEUE_WORKERS = int(os.getenv("MAIL_QUEUE_WORKERS", 2))
+    MAIL_MAX_RETRIES = int(os.getenv("MAIL_MAX_RETRIES", 3))
+    MAIL_RETRY_BACKOFF = float(os.getenv("MAIL_RETRY_BACKOFF", 1.0))  # seconds, doubled on each retry
+    MAIL_IDLE_TIMEOUT = float(os.getenv("MAIL_IDLE_TIMEOUT", 30))  # seconds before an idle SMTP connection is closed
+    # Socket.IO message bus shared by workers (redis://, local://host:port, memory://); unset for a single worker
+    SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE")
+    # Shared presence registry; defaults to the message bus
+    PRESENCE_URL = os.getenv("PRESENCE_URL")
+    # Presence: last_seen is written every LAST_SEEN_FLUSH_INTERVAL seconds, and online/offline
+    # changes are announced once stable for PRESENCE_DEBOUNCE seconds
+    LAST_SEEN_FLUSH_INTERVAL = float(os.getenv("LAST_SEEN_FLUSH_INTERVAL", 30))
+    PRESENCE_DEBOUNCE = float(os.getenv("PRESENCE_DEBOUNCE", 2))
+    # Workers renew their sessions in the presence registry every PRESENCE_HEARTBEAT_INTERVAL seconds;
+    # after three missed heartbeats another worker takes their users offline
+    PRESENCE_HEARTBEAT_INTERVAL = float(os.getenv("PRESENCE_HEARTBEAT_INTERVAL", 10))
+    # The presence snapshot sent on connect covers at most PRESENCE_SNAPSHOT_MAX of the user's contacts
+    PRESENCE_SNAPSHOT_MAX = int(os.getenv("PRESENCE_SNAPSHOT_MAX", 500))
+    # Socket.IO packet format: "json" (default) or "msgpack" (needs the msgpack package and a msgpack client parser)
+    SOCKETIO_SERIALIZER = os.getenv("SOCKETIO_SERIALIZER", "json").lower()
+    # JSON responses of at least COMPRESS_MIN_SIZE bytes are sent with brotli or gzip (0 disables compression)
+    COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+    COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", 6))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", 4))
+    # Write-behind persistence for chat messages (broadcast first, insert in batches)
+    MESSAGE_WRITE_BEHIND = os.getenv("MESSAGE_WRITE_BEHIND", "False").lower() in ["true", "1"]
+    MESSAGE_BATCH_SIZE = int(os.getenv("MESSAGE_BATCH_SIZE", 100))
+    MESSAGE_FLUSH_INTERVAL = float(os.getenv("MESSAGE_FLUSH_INTERVAL", 0.05))  # seconds
+    MESSAGE_MAX_PENDING = int(os.getenv("MESSAGE_MAX_PENDING", 10000))
+    MESSAGE_MAX_RETRIES = int(os.getenv("MESSAGE_MAX_RETRIES", 20))  # flushes before a message is dead-lettered
+    # Most messages replayed to a reconnecting socket before it is told to resync over REST
+    SYNC_MAX_MESSAGES = int(os.getenv("SYNC_MAX_MESSAGES", 500))
+    # Seconds of messages re-sent before the last one a client saw, for rows committed out of id order
+    SYNC_OVERLAP_SECONDS = float(os.getenv("SYNC_OVERLAP_SECONDS", 30))
+    # send_message rate limits: RATE events per second with bursts of BURST (a rate of 0 disables a limit)
+    SOCKET_RATE_LIMIT_SID_RATE = float(os.getenv("SOCKET_RATE_LIMIT_SID_RATE", 5))
+    SOCKET_RATE_LIMIT_SID_BURST = float(os.getenv("SOCKET_RATE_LIMIT_SID_BURST", 10))
+    SOCKET_RATE_LIMIT_USER_RATE = float(os.getenv("SOCKET_RATE_LIMIT_USER_RATE", 10))
+    SOCKET_RATE_LIMIT_USER_BURST = float(os.getenv("SOCKET_RATE_LIMIT_USER_BURST", 20))
+    # Message search: text search configuration (PostgreSQL) and how many recent matches are ranked
+    SEARCH_LANGUAGE = os.getenv("SEARCH_LANGUAGE", "english")
+    SEARCH_RANK_WINDOW = int(os.getenv("SEARCH_RANK_WINDOW", 1000))
+    # Cache of user projections used by the authenticated hot paths
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+    USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 60))  # seconds
+    # MinIO endpoint (the client itself reads it from the environment); archiving and archive reads need it
+    MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT")
+    # Tiered storage: messages older than MESSAGE_ARCHIVE_AFTER_DAYS move to compressed MinIO segments
+    MESSAGE_ARCHIVE_INTERVAL = float(os.getenv("MESSAGE_ARCHIVE_INTERVAL", 3600))  # seconds between runs, 0 disables it
+    MESSAGE_ARCHIVE_AFTER_DAYS = float(os.getenv("MESSAGE_ARCHIVE_AFTER_DAYS", 90))
+    MESSAGE_ARCHIVE_SEGMENT_HOURS = float(os.getenv("MESSAGE_ARCHIVE_SEGMENT_HOURS", 24))  # time bucket of a segment
+    MESSAGE_ARCHIVE_SEGMENT_MAX = int(os.getenv("MESSAGE_ARCHIVE_SEGMENT_MAX", 5000))  # messages per segment
+    MESSAGE_ARCHIVE_CACHE_SIZE = int(os.getenv("MESSAGE_ARCHIVE_CACHE_SIZE", 32))  # decoded segments kept in memory
+    # Background deletion of expired refresh tokens (0 disables it)
+    TOKEN_SWEEP_INTERVAL = float(os.getenv("TOKEN_SWEEP_INTERVAL", 3600))  # seconds between sweeps
+    TOKEN_SWEEP_BATCH_SIZE = int(os.getenv("TOKEN_SWEEP_BATCH_SIZE", 1000))  # rows deleted per transaction
+    # argon2id password hashing, run in a bounded pool of threads off the event loop
+    PASSWORD_HASH_TIME_COST = int(os.getenv("PASSWORD_HASH_TIME_COST", 3))
+    PASSWORD_HASH_MEMORY_COST = int(os.getenv("PASSWORD_HASH_MEMORY_COST", 65536))  # KiB per hash
+    PASSWORD_HASH_PARALLELISM = int(os.getenv("PASSWORD_HASH_PARALLELISM", 4))
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 4))  # hashes running at once per worker
+    # Avatar image pipeline (resizing runs in worker processes)
+    IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+    IMAGE_SIZES = [int(size) for size in os.getenv("IMAGE_SIZES", "64,256,1024").split(",")]
+    IMAGE_AVATAR_SIZE = int(os.getenv("IMAGE_AVATAR_SIZE", 256))  # variant used as the profile image_url
+    IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", 10 * 1024 * 1024))
+    # Larger request bodies are refused with 413 before they are read (an upload plus its form fields)
+    MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", IMAGE_MAX_BYTES + 64 * 1024))
+    # Logging: levels and sample rates per subsystem (app, socket_events, socketio, engineio, sql),
+    # as "name=value,..."; a sample rate keeps that fraction of the records below WARNING
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_LEVELS = os.getenv("LOG_LEVELS", "socketio=INFO,engineio=INFO")
+    LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+    # Write logs from a background thread through a bounded queue (records are dropped when it is full)
+    LOG_ASYNC = os.getenv("LOG_ASYNC", "False").lower() in ["true", "1"]
+    LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+    # Bearer token of the /logging route that changes levels at runtime; unset disables the route
+    LOG_ADMIN_TOKEN = os.getenv("LOG_ADMIN_TOKEN")
     # db = db
     
     
@@ -41,7 +126,7 @@ class DevelopmentConfig(Config):
         f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ECHO = True
+    SQLALCHEMY_ECHO = os.getenv("SQLALCHEMY_ECHO", "False").lower() in ["true", "1"]
     
 class ProductionConfig(Config):
     """Configuration for production."""
@@ -57,6 +142,14 @@ class ProductionConfig(Config):
     MAIL_USERNAME = os.getenv("MAIL_USERNAME")
     MAIL_PASSWORD = os.getenv("MAIL_PASSWORD")
     MAIL_DEFAULT_SENDER = os.getenv("MAIL_DEFAULT_SENDER")
+    MAIL_ASYNC = os.getenv("MAIL_ASYNC", "True").lower() in ["true", "1"]
+    SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE")
+    PRESENCE_URL = os.getenv("PRESENCE_URL")
+    MESSAGE_WRITE_BEHIND = os.getenv("MESSAGE_WRITE_BEHIND", "False").lower() in ["true", "1"]
+    # No per-packet Socket.IO logs, a tenth of the per-event ones, and none of it written on the request path
+    LOG_ASYNC = os.getenv("LOG_ASYNC", "True").lower() in ["true", "1"]
+    LOG_LEVELS = os.getenv("LOG_LEVELS", "socketio=WARNING,engineio=WARNING,sql=WARNING")
+    LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "socket_events=0.1")
     
 # Environment mapping
 CONFIG_MAPPING = {
@@ -40,6 +40,23 @@ def login():
     return jsonify({"message": refresh_token}), 401
 
 
+@auth_controller.route('/refresh', methods=['POST'])
+def refresh():
+    data = request.get_json() or {}
+    refresh_token = data.get('refresh_token')
+
+    if not refresh_token:
+        return jsonify({"message": "Refresh token is required"}), 400
+    auth_service = AuthService(db,current_app)
+    access_token, new_refresh_token = auth_service.refresh(refresh_token)
+    if access_token:
+        # The old refresh token is spent; the client must keep the new one
+        response = jsonify({"access_token": access_token, "refresh_token": new_refresh_token})
+        set_access_cookies(response, access_token)
+        return response, 200
+    return jsonify({"message": new_refresh_token}), 401
+
+
 @auth_controller.route('/logout', methods=['POST'])
 def logout():
     data = request.get_json()
@@ -0,0 +1,81 @@
+from flask import Blueprint, current_app, request, jsonify
+from flask_jwt_extended import get_jwt_identity, jwt_required
+from src.services.user_cache import user_cache
+from src.services.conversation_service import ConversationService
+from src.database import db
+
+conversation_controller = Blueprint('conversation', __name__)
+
+
+@conversation_controller.route("/conversations", methods=["GET"])
+@jwt_required()
+def get_conversations():
+    """
+    Endpoint to list the conversations of the authenticated user.
+    """
+    current_user = get_jwt_identity()
+    try:
+        user = user_cache.get_by_username(current_user)
+        if not user:
+            return jsonify({"error": "User not found."}), 404
+        conversation_service = ConversationService(db=db, app=current_app)
+        conversations = conversation_service.get_conversations(user.id)
+        return jsonify({"conversations": conversations}), 200
+    except Exception as e:
+        current_app.logger.error(f"Error in get_conversations: {str(e)}")
+        return jsonify({"error": "Internal Server Error"}), 500
+
+
+@conversation_controller.route("/direct", methods=["POST"])
+@jwt_required()
+def create_direct():
+    """
+    Endpoint to open (or reuse) a direct conversation with another user.
+    """
+    current_user = get_jwt_identity()
+    data = request.get_json() or {}
+    try:
+        user = user_cache.get_by_username(current_user)
+        if not user:
+            return jsonify({"error": "User not found."}), 404
+        conversation_service = ConversationService(db=db, app=current_app)
+        conversation, message = conversation_service.create_direct(user.id, data.get("username"))
+        if not conversation:
+            return jsonify({"error": message}), 400
+        _join_online_members(conversation)
+        return jsonify({"conversation": conversation.to_dict(), "message": message}), 201
+    except Exception as e:
+        current_app.logger.error(f"Error in create_direct: {str(e)}")
+        return jsonify({"error": "Internal Server Error"}), 500
+
+
+@conversation_controller.route("/group", methods=["POST"])
+@jwt_required()
+def create_group():
+    """
+    Endpoint to create a group conversation.
+    """
+    current_user = get_jwt_identity()
+    data = request.get_json() or {}
+    try:
+        user = user_cache.get_by_username(current_user)
+        if not user:
+            return jsonify({"error": "User not found."}), 404
+        conversation_service = ConversationService(db=db, app=current_app)
+        conversation, message = conversation_service.create_group(user.id, data.get("name"), data.get("members"))
+        if not conversation:
+            return jsonify({"error": message}), 400
+        _join_online_members(conversation)
+        return jsonify({"conversation": conversation.to_dict(), "message": message}), 201
+    except Exception as e:
+        current_app.logger.error(f"Error in create_group: {str(e)}")
+        return jsonify({"error": "Internal Server Error"}), 500
+
+
+def _join_online_members(conversation):
+    """
+    Subscribe the already-connected sockets of the members to the new conversation room.
+    """
+    socket_service = current_app.extensions.get('socket_service')
+    if socket_service:
+        socket_service.join_conversation(conversation.id, [member.username for member in conversation.members])
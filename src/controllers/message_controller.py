@@ -1,23 +1,103 @@
-from flask import Blueprint, current_app, jsonify
-from flask_jwt_extended import jwt_required
+from flask import Blueprint, current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity, jwt_required
+from src.helpers.conditional import add_validators, make_etag, not_modified, request_params
+from src.helpers.pagination import InvalidCursor, parse_limit
+from src.services.conversation_service import ConversationService
+from src.services.message_archive import ArchiveUnavailable
 from src.services.message_service import MessageService
+from src.services.search_service import SearchService
+from src.services.user_cache import user_cache
 from src.database import db
 
 message_controller = Blueprint('message', __name__)
 
-    
+
 @message_controller.route("/messages", methods=["GET"])
 @jwt_required()
 def get_messages():
     """
-    Endpoint to retrieve the messages of the authenticated user
+    Endpoint to retrieve a page of messages from a conversation.
+    Query parameters: `conversation_id` (defaults to the lobby), `before` / `after` cursors and `limit`.
+    Answers 304 when the conversation has no new message since the client's copy.
     """
+    current_user = get_jwt_identity()
     try:
+        conversation_id = request.args.get("conversation_id", type=int)
+        if conversation_id is not None:
+            user = user_cache.get_by_username(current_user)
+            conversation_service = ConversationService(db=db, app=current_app)
+            if not user or not conversation_service.is_member(conversation_id, user.id):
+                return jsonify({"error": "Conversation not found."}), 404
+
         message_service = MessageService(db=db,app=current_app)
-        messages = message_service.get_messages()
-        return jsonify({"messages": messages}), 200
+        latest_key = message_service.get_latest_key(conversation_id)
+        etag = make_etag("messages", conversation_id, latest_key, request_params())
+        last_modified = latest_key[0] if latest_key else None
+        unchanged = not_modified(etag, last_modified)
+        if unchanged is not None:
+            return unchanged
+
+        limit = parse_limit(request.args.get("limit"), MessageService.DEFAULT_PAGE_SIZE, MessageService.MAX_PAGE_SIZE)
+        page = message_service.get_messages(
+            conversation_id=conversation_id,
+            before=request.args.get("before"),
+            after=request.args.get("after"),
+            limit=limit,
+        )
+        return add_validators(jsonify(page), etag, last_modified), 200
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+    except ArchiveUnavailable as e:
+        current_app.logger.error(f"Error in get_messages: {str(e)}")
+        return jsonify({"error": "Older messages are temporarily unavailable."}), 503
     except Exception as e:
         current_app.logger.error(f"Error in get_messages: {str(e)}")
         return jsonify({"error": "Internal Server Error"}), 500
 
-    
+
+
+
+@message_controller.route("/search", methods=["GET"])
+@jwt_required()
+def search_messages():
+    """
+    Endpoint to search the message history.
+    Query parameters: `q`, `conversation_id` (defaults to the lobby and every conversation of the user),
+    `sort` (`relevance`, the default, or `recent`), `after` cursor and `limit`.
+    """
+    current_user = get_jwt_identity()
+    query = (request.args.get("q") or "").strip()
+    if not query:
+        return jsonify({"error": "Query parameter 'q' is required."}), 400
+    sort = request.args.get("sort", "relevance")
+    if sort not in SearchService.SORTS:
+        return jsonify({"error": "Query parameter 'sort' must be 'relevance' or 'recent'."}), 400
+    try:
+        user = user_cache.get_by_username(current_user)
+        if not user:
+            return jsonify({"error": "User not found."}), 404
+        conversation_service = ConversationService(db=db, app=current_app)
+        conversation_id = request.args.get("conversation_id", type=int)
+        if conversation_id is not None:
+            if not conversation_service.is_member(conversation_id, user.id):
+                return jsonify({"error": "Conversation not found."}), 404
+            conversation_ids, include_lobby = [conversation_id], False
+        else:
+            conversation_ids, include_lobby = conversation_service.get_conversation_ids(user.id), True
+
+        search_service = SearchService(db=db, app=current_app)
+        limit = parse_limit(request.args.get("limit"), SearchService.DEFAULT_PAGE_SIZE, SearchService.MAX_PAGE_SIZE)
+        page = search_service.search(
+            query,
+            conversation_ids,
+            include_lobby=include_lobby,
+            after=request.args.get("after"),
+            limit=limit,
+            sort=sort,
+        )
+        return jsonify(page), 200
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error in search_messages: {str(e)}")
+        return jsonify({"error": "Internal Server Error"}), 500
@@ -1,7 +1,12 @@
 from flask import Blueprint, current_app, request, jsonify
 from flask_jwt_extended import get_jwt_identity, jwt_required
+from werkzeug.exceptions import RequestEntityTooLarge
+from src.helpers.conditional import add_validators, latest, make_etag, not_modified, request_params
+from src.helpers.pagination import InvalidCursor, parse_limit
 from src.models.user import User
+from src.services.bucket_service import BucketService
 from src.services.user_service import UserService
+from src.services.user_cache import user_cache
 from src.database import db
 
 user_controller = Blueprint('user', __name__)
@@ -11,15 +16,28 @@ user_controller = Blueprint('user', __name__)
 @jwt_required()
 def get_profile():
     """
-    Endpoint to retrieve the profile of the authenticated user
+    Endpoint to retrieve the profile of the authenticated user.
+    Answers 304 while the user row and the signing window of its picture URL are unchanged.
     """
     current_user = get_jwt_identity()  # Retrieve the current user's username (or ID)
     try:
         user_service = UserService(db=db,app=current_app)
+        version = user_service.get_profile_version(current_user)
+        if not version:
+            return jsonify({"success": False, "error": "User not found."}), 404
+        user_id, updated_at = version
+        url_window = BucketService().url_window_start()
+        etag = make_etag("profile", user_id, updated_at, url_window)
+        last_modified = latest(updated_at, url_window)
+        unchanged = not_modified(etag, last_modified)
+        if unchanged is not None:
+            return unchanged
+
         profile, message = user_service.get_profile(username=current_user)
         if not profile:
             return jsonify({"success": False, "error": message}), 404
-        return jsonify({"success": True, "profile": profile, "message": message}), 200
+        response = jsonify({"success": True, "profile": profile, "message": message})
+        return add_validators(response, etag, last_modified), 200
     except Exception as e:
         current_app.logger.error(f"Error in get_profile: {str(e)}")
         return jsonify({"success": False, "error": "An unexpected error occurred."}), 500
@@ -32,31 +50,90 @@ def update_profile():
     Endpoint to update the profile of the authenticated user.
     """
     current_user = get_jwt_identity()  # Retrieve the current user's username (or ID)
-    data = request.form.to_dict()
-    file = request.files.get("file")
-    
+    try:
+        # Parsing the form enforces MAX_CONTENT_LENGTH
+        data = request.form.to_dict()
+        file = request.files.get("file")
+    except RequestEntityTooLarge:
+        return jsonify({"success": False, "error": "The uploaded file is too large."}), 413
+
     try:
         user_service = UserService(db=db,app=current_app)
-        success, message = user_service.update_profile(username=current_user, data=data, file=file)
+        success, message, image_job = user_service.update_profile(username=current_user, data=data, file=file)
         if not success:
             return jsonify({"success": False, "error": message}), 400
+        if image_job:
+            # The picture is processed in the background; poll /profile/image/<id> for its status
+            return jsonify({"success": True, "message": message, "image_job": image_job.to_dict()}), 202
         return jsonify({"success": True, "message": message}), 200
     except Exception as e:
         current_app.logger.error(f"Error in update_profile: {str(e)}")
         return jsonify({"success": False, "error": "An unexpected error occurred."}), 500
 
+@user_controller.route("/profile/image/<job_id>", methods=["GET"])
+@jwt_required()
+def get_image_job(job_id):
+    """
+    Endpoint to poll the processing status of a profile picture upload.
+    """
+    current_user = get_jwt_identity()
+    try:
+        user = user_cache.get_by_username(current_user)
+        if not user:
+            return jsonify({"success": False, "error": "User not found."}), 404
+        image_job = current_app.extensions['image_pipeline'].get_job(job_id, user.id)
+        if not image_job:
+            return jsonify({"success": False, "error": "Image job not found."}), 404
+        return jsonify({"success": True, "image_job": image_job.to_dict(), "image_url": BucketService().avatar_url(user.image_url)}), 200
+    except Exception as e:
+        current_app.logger.error(f"Error in get_image_job: {str(e)}")
+        return jsonify({"success": False, "error": "An unexpected error occurred."}), 500
+
 @user_controller.route("/users", methods=["GET"])
 @jwt_required()
 def get_users():
     """
-    Endpoint to get connected users.
+    Endpoint to get a page of the user directory.
+    Query parameters: `search` (username prefix), `online=true` (connected users only), `after` cursor and `limit`.
+    Answers 304 while no user changed (and, with `online=true`, while the page holds the same online users).
     """
     current_user = get_jwt_identity()  # Retrieve the current user's username (or ID)
     try:
         user_service = UserService(db=db,app=current_app)
-        users = user_service.get_users(current_user=current_user)  # Pass the current_user to filter
-        return jsonify({"users": users}), 200
+        online = request.args.get("online", "").lower() in ["true", "1"]
+        presence = current_app.extensions['socket_service'].presence if online else None
+        limit = parse_limit(request.args.get("limit"), UserService.DEFAULT_PAGE_SIZE, UserService.MAX_PAGE_SIZE)
+
+        def query_page():
+            return user_service.get_users(
+                current_user=current_user,  # Pass the current_user to filter
+                search=request.args.get("search"),
+                presence=presence,
+                after=request.args.get("after"),
+                limit=limit,
+            )
+
+        version = user_service.get_directory_version()
+        url_window = BucketService().url_window_start()
+        page = None
+        if online:
+            # Presence changes carry no version: online pages are queried, then validated by the users they hold
+            page = query_page()
+            page_usernames = [user["username"] for user in page["users"]]
+            etag = make_etag("users", current_user, version, url_window, page_usernames, page["after"], request_params())
+            last_modified = None
+        else:
+            etag = make_etag("users", current_user, version, url_window, None, request_params())
+            last_modified = latest(version, url_window)
+        unchanged = not_modified(etag, last_modified)
+        if unchanged is not None:
+            return unchanged
+
+        if page is None:
+            page = query_page()
+        return add_validators(jsonify(page), etag, last_modified), 200
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         current_app.logger.error(f"Error in get_users: {str(e)}")
         return jsonify({"error": "Internal Server Error"}), 500
-    
@@ -1,32 +1,163 @@
+import threading
+import time
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import create_engine, exc
+from sqlalchemy import exc, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
 from src.config import Config
+from src.helpers.instrumentation import instrument_sql
+from src.helpers.metrics import registry
 
 # Create an instance of SQLAlchemy
 db = SQLAlchemy()
 
+POOL_WAIT_SECONDS = registry.histogram(
+    'chat_db_pool_wait_seconds', 'Time spent waiting to check a connection out of the pool')
+POOL_TIMEOUTS = registry.counter(
+    'chat_db_pool_timeouts_total', 'Checkouts that gave up after DB_POOL_TIMEOUT')
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that records how long each checkout waited for a free connection.
+    """
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            POOL_WAIT_SECONDS.observe(time.perf_counter() - start)
+
+
 class DatabaseService:
+    """
+    Process-wide database setup. `init_app` only configures the engine; nothing connects until
+    the first query, and the schema is checked on first use by `ensure_schema` (or `flask init-db`).
+    """
     _instance = None
+    _schema_lock = threading.Lock()
 
     def __new__(cls, app=None):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
-            if app is not None:
-                cls._instance.init_app(app)
+        if app is not None:
+            cls._instance.init_app(app)
         return cls._instance
 
     def init_app(self, app):
-        """Initialize the app with the database configuration."""
-        app.config.from_object(Config)
+        """Initialize the app with the database configuration (no connection is opened)."""
+        # Fill in defaults without overriding the environment-specific config already loaded
+        for key in dir(Config):
+            if key.isupper():
+                app.config.setdefault(key, getattr(Config, key))
+        app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", self._engine_options(app.config))
         db.init_app(app)
         self._app = app
-        self._check_connection()
+        self._register_pool_metrics()
+        instrument_sql()
+        app.extensions['database'] = self
+
+    @staticmethod
+    def _engine_options(config):
+        """Build the pool settings from the DB_POOL_* configuration."""
+        uri = config.get("SQLALCHEMY_DATABASE_URI")
+        if not uri or make_url(uri).get_backend_name() == "sqlite":
+            # SQLite (local runs) keeps SQLAlchemy's default pool
+            return {}
+        return {
+            "poolclass": InstrumentedQueuePool,
+            "pool_size": config.get("DB_POOL_SIZE"),
+            "max_overflow": config.get("DB_MAX_OVERFLOW"),
+            "pool_timeout": config.get("DB_POOL_TIMEOUT"),
+            "pool_recycle": config.get("DB_POOL_RECYCLE"),
+            "pool_pre_ping": config.get("DB_POOL_PRE_PING"),
+        }
+
+    def _register_pool_metrics(self):
+        """Expose live pool statistics as gauges, read when metrics are collected."""
+        with self._app.app_context():
+            pool = db.engine.pool
+        stats = {
+            'chat_db_pool_size': ('Configured number of pooled connections', 'size'),
+            'chat_db_pool_checked_out': ('Connections currently checked out', 'checkedout'),
+            'chat_db_pool_checked_in': ('Idle connections in the pool', 'checkedin'),
+            'chat_db_pool_overflow': ('Connections open beyond the pool size (negative until the pool fills)', 'overflow'),
+        }
+        for name, (documentation, method) in stats.items():
+            if hasattr(pool, method):
+                registry.gauge(name, documentation).set_function(getattr(pool, method))
+
+    def pool_status(self):
+        """Return the pool statistics as a dict (empty for pools without them)."""
+        with self._app.app_context():
+            pool = db.engine.pool
+        return {
+            method: getattr(pool, method)()
+            for method in ("size", "checkedout", "checkedin", "overflow")
+            if hasattr(pool, method)
+        }
+
+    def ensure_schema(self, app=None):
+        """
+        Create the missing tables, columns and search structures, once per app and process.
+        Runs on the first request or socket connection instead of at import, so booting a worker
+        doesn't wait on the database. Returns False (and retries next time) if it fails.
+        """
+        app = app or self._app
+        if app.extensions.get('schema_ready'):
+            return True
+        with self._schema_lock:
+            if app.extensions.get('schema_ready'):
+                return True
+            # Imported here: the search service is only needed for this one-off setup
+            from src.services.search_service import SearchService
+            try:
+                with app.app_context():
+                    db.create_all()
+                    self.add_missing_columns(app)
+                    # Full-text search structures are created outside of the models (dialect specific)
+                    SearchService(db, app).ensure_index()
+            except exc.SQLAlchemyError as e:
+                app.logger.error(f"Error creating database tables: {e}")
+                return False
+            app.extensions['schema_ready'] = True
+            return True
+
+    def add_missing_columns(self, app=None):
+        """
+        Add the nullable model columns missing from existing tables, with their indexes.
+        `create_all` only creates whole tables, so this lets a new column reach an existing database.
+        """
+        app = app or self._app
+        with app.app_context():
+            with db.engine.begin() as connection:
+                inspector = inspect(connection)
+                existing_tables = set(inspector.get_table_names())
+                for table in db.metadata.sorted_tables:
+                    if table.name not in existing_tables:
+                        continue
+                    existing = {column["name"] for column in inspector.get_columns(table.name)}
+                    for column in table.columns:
+                        if column.name in existing or not column.nullable:
+                            continue
+                        column_type = column.type.compile(dialect=connection.dialect)
+                        connection.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+                        for index in table.indexes:
+                            if column in index.columns.values():
+                                index.create(connection, checkfirst=True)
+                        app.logger.info(f"Added column {table.name}.{column.name}")
 
-    def _check_connection(self):
-        """Check if the database connection is successful."""
+    def check_connection(self, app=None):
+        """Return whether the database answers, using the app's own engine (for readiness checks)."""
+        app = app or self._app
         try:
-            engine = create_engine(self._app.config["SQLALCHEMY_DATABASE_URI"])
-            with engine.connect() as connection:
-                print("Database connected successfully!")
+            with app.app_context():
+                with db.engine.connect() as connection:
+                    connection.execute(text("SELECT 1"))
+            return True
         except exc.SQLAlchemyError as e:
-            print(f"Database connection failed: {e}")
+            app.logger.error(f"Database connection failed: {e}")
+            return False
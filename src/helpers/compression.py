@@ -0,0 +1,69 @@
+"""
+Compression of JSON responses: brotli when the client accepts it and the package is installed,
+gzip otherwise. Bodies under COMPRESS_MIN_SIZE bytes are sent as they are, since small
+payloads gain little and the compressor's framing can even make them larger.
+"""
+import gzip
+from flask import request
+from src.helpers.metrics import registry
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+RESPONSE_BYTES = registry.counter(
+    'chat_http_response_bytes_total', 'JSON response bytes before and after compression, by encoding',
+    ('encoding', 'stage'))
+
+
+def choose_encoding(accept_encodings):
+    """
+    Pick the best encoding the client accepts (a werkzeug Accept object), or None.
+    """
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding, gzip_level=6, brotli_quality=4):
+    """
+    Compress a body with the given encoding ('br' or 'gzip').
+    """
+    if encoding == 'br':
+        return brotli.compress(data, quality=brotli_quality)
+    return gzip.compress(data, compresslevel=gzip_level, mtime=0)
+
+
+def init_compression(app):
+    """
+    Compress the JSON responses of the app (a COMPRESS_MIN_SIZE of 0 disables it).
+    """
+    min_size = app.config.get('COMPRESS_MIN_SIZE', 1024)
+    if not min_size:
+        return
+    gzip_level = app.config.get('COMPRESS_GZIP_LEVEL', 6)
+    brotli_quality = app.config.get('COMPRESS_BROTLI_QUALITY', 4)
+
+    @app.after_request
+    def _compress_response(response):
+        if (
+            response.mimetype != 'application/json'
+            or response.direct_passthrough
+            or response.status_code < 200 or response.status_code == 204 or response.status_code >= 300
+            or 'Content-Encoding' in response.headers
+        ):
+            return response
+        response.vary.add('Accept-Encoding')
+        data = response.get_data()
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None or len(data) < min_size:
+            return response
+        compressed = compress(data, encoding, gzip_level, brotli_quality)
+        RESPONSE_BYTES.labels(encoding, 'raw').inc(len(data))
+        RESPONSE_BYTES.labels(encoding, 'sent').inc(len(compressed))
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,62 @@
+"""
+Conditional GET: weak ETags built from cheap validators (newest row, version timestamps)
+instead of the payload, so a matching `If-None-Match` / `If-Modified-Since` is answered
+with 304 before the page query and its serialization run.
+"""
+import hashlib
+from datetime import timezone
+from flask import make_response, request
+
+
+def make_etag(*parts):
+    """
+    Hash the validators of a response into an opaque ETag value.
+    """
+    return hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+
+
+def request_params():
+    """
+    The query parameters of the request in a stable order, for ETags of paginated endpoints.
+    """
+    return sorted(request.args.items(multi=True))
+
+
+def not_modified(etag, last_modified=None):
+    """
+    Return a 304 response when the request's validators still match, else None.
+    `If-None-Match` takes precedence over `If-Modified-Since`, as in RFC 9110.
+    """
+    if request.if_none_match:
+        matched = request.if_none_match.contains_weak(etag)
+    elif last_modified is not None and request.if_modified_since is not None:
+        matched = _utc(last_modified).replace(microsecond=0) <= request.if_modified_since
+    else:
+        matched = False
+    if not matched:
+        return None
+    return add_validators(make_response("", 304), etag, last_modified)
+
+
+def add_validators(response, etag, last_modified=None):
+    """
+    Set the ETag and Last-Modified headers and ask clients to revalidate before reusing the response.
+    """
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = _utc(last_modified)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def latest(*timestamps):
+    """
+    The most recent of the given timestamps (None entries are ignored), for Last-Modified.
+    """
+    values = [_utc(value) for value in timestamps if value is not None]
+    return max(values) if values else None
+
+
+def _utc(value):
+    # Timestamps are stored as naive UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
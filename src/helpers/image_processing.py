@@ -0,0 +1,43 @@
+"""
+CPU-bound image work for avatar uploads.
+It runs in the worker processes of the image pipeline, so it only depends on Pillow
+and never touches the app, the database or MinIO.
+"""
+import hashlib
+from io import BytesIO
+from PIL import Image, ImageOps
+
+# Formats kept as uploaded; anything else (GIF, BMP, TIFF, ...) is re-encoded as PNG
+KEPT_FORMATS = {"JPEG", "PNG", "WEBP"}
+
+
+def content_hash(data):
+    """
+    Return the hex SHA-256 of the uploaded bytes, used to name (and deduplicate) the variants.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def render_variants(data, sizes):
+    """
+    Decode the image once and encode one thumbnail per size (bounding box, aspect ratio kept).
+    Returns the output format and a dict {size: encoded bytes}.
+    """
+    with Image.open(BytesIO(data)) as img:
+        img_format = img.format if img.format in KEPT_FORMATS else "PNG"
+        # Apply the EXIF orientation so phone photos are not rotated
+        img = ImageOps.exif_transpose(img)
+        if img_format == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        elif img.mode == "P":
+            img = img.convert("RGBA")
+
+        variants = {}
+        # Largest first, so each smaller thumbnail is resampled from the previous one
+        for size in sorted(sizes, reverse=True):
+            img = img.copy()
+            img.thumbnail((size, size))
+            output = BytesIO()
+            img.save(output, format=img_format)
+            variants[size] = output.getvalue()
+    return img_format, variants
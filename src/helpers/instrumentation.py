@@ -0,0 +1,96 @@
+"""
+Latency instrumentation for HTTP routes, Socket.IO handlers and SQL statements.
+Every hook records into the shared metrics registry with one perf_counter pair and
+one histogram observation, which is cheap enough to leave on in production.
+"""
+import functools
+import time
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from src.helpers.metrics import registry
+
+HTTP_SECONDS = registry.histogram(
+    'chat_http_request_duration_seconds', 'HTTP request latency by blueprint, route, method and status',
+    ('blueprint', 'route', 'method', 'status'))
+SOCKETIO_SECONDS = registry.histogram(
+    'chat_socketio_event_duration_seconds', 'Socket.IO handler latency by event', ('event',))
+SOCKETIO_ERRORS = registry.counter(
+    'chat_socketio_event_errors_total', 'Socket.IO handlers that raised, by event', ('event',))
+SQL_SECONDS = registry.histogram(
+    'chat_db_query_duration_seconds', 'SQL statement latency by operation', ('operation',),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+
+_SQL_OPERATIONS = {'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH'}
+
+
+def instrument_flask(app):
+    """
+    Time every request of the app. Routes are labelled by their URL rule (not the raw path)
+    so the number of series stays bounded.
+    """
+    @app.before_request
+    def _start_timer():
+        g._request_started = time.perf_counter()
+
+    @app.after_request
+    def _record_latency(response):
+        started = g.pop('_request_started', None)
+        if started is not None:
+            rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            HTTP_SECONDS.labels(
+                request.blueprint or 'app', rule, request.method, response.status_code,
+            ).observe(time.perf_counter() - started)
+        return response
+
+
+def timed_event(name, handler):
+    """
+    Wrap a Socket.IO handler so each call is timed under `name`.
+    """
+    histogram = SOCKETIO_SECONDS.labels(name)
+
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return handler(*args, **kwargs)
+        except Exception:
+            SOCKETIO_ERRORS.labels(name).inc()
+            raise
+        finally:
+            histogram.observe(time.perf_counter() - started)
+    return wrapper
+
+
+def instrument_sql():
+    """
+    Time every statement executed by any SQLAlchemy engine, labelled by its leading keyword.
+    """
+    if event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'handle_error', _handle_error)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    SQL_SECONDS.labels(_operation(statement)).observe(time.perf_counter() - started)
+
+
+def _handle_error(context):
+    # The statement failed: drop its start time so the stack stays balanced
+    started = context.connection.info.get('query_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def _operation(statement):
+    words = statement[:32].split(None, 1)
+    keyword = words[0].upper() if words else ''
+    return keyword if keyword in _SQL_OPERATIONS else 'OTHER'
@@ -0,0 +1,242 @@
+"""
+Logging setup: per-subsystem levels, sampling of high-volume event logs and, with LOG_ASYNC,
+a queue between the code that logs and the handlers that write.
+In queue mode a log call only copies the record into a bounded in-memory queue; a background
+thread formats and writes it, so a slow stdout pipe or disk never stalls a request or a socket
+event. When the queue is full, records are dropped and counted instead of blocking.
+"""
+import atexit
+import copy
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+from src.helpers.metrics import registry
+
+LOG_RECORDS_DROPPED = registry.counter(
+    'chat_log_records_dropped_total', 'Log records not written, by reason (sampled, queue_full)', ('reason',))
+
+# Subsystems whose level and sampling can be set, and their loggers
+# ('app' and 'socket_events' are resolved from the app logger in `init_app`)
+SUBSYSTEMS = {
+    'engineio': 'engineio.server',
+    'socketio': 'socketio.server',
+    # The engine logs on this logger itself, so filters set here apply (they don't on a parent)
+    'sql': 'sqlalchemy.engine.Engine',
+}
+
+LOG_FORMAT = '[%(asctime)s] %(levelname)s in %(module)s: %(message)s'
+
+
+def parse_settings(value, convert):
+    """
+    Parse a "name=value,name=value" setting (LOG_LEVELS, LOG_SAMPLE_RATES) into a dict.
+    """
+    settings = {}
+    for item in (value or '').split(','):
+        if not item.strip():
+            continue
+        name, _, setting = item.partition('=')
+        settings[name.strip()] = convert(setting.strip())
+    return settings
+
+
+def parse_level(value):
+    """
+    Return the numeric level of a name ("INFO") or number ("20").
+    """
+    level = int(value) if str(value).isdigit() else logging.getLevelName(str(value).upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Invalid log level: {value}")
+    return level
+
+
+def parse_rate(value):
+    rate = float(value)
+    if not 0.0 <= rate <= 1.0:
+        raise ValueError(f"Invalid sample rate: {value} (expected 0 to 1)")
+    return rate
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep a `rate` fraction of the records below WARNING; warnings and errors always pass.
+    Attached to a logger, it drops records before any handler formats them.
+    """
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate >= 1.0 or random.random() < self.rate:
+            return True
+        LOG_RECORDS_DROPPED.labels('sampled').inc()
+        return False
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that never blocks: records that don't fit are dropped and counted.
+    Only the message is rendered on the calling side; timestamps, formatting and I/O
+    happen in the writer thread.
+    """
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Tracebacks hold frames that must not outlive the call
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.labels('queue_full').inc()
+
+
+class LogPipeline:
+    """
+    Process-wide logging configuration, set from the app config and adjustable at runtime
+    (see `configure` and the `/logging` route).
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self):
+        self.subsystems = dict(SUBSYSTEMS)
+        self._filters = {}
+        self._queue = None
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """
+        Configure logging for the app. Must run before anything logs through `app.logger`,
+        so Flask doesn't attach its own synchronous handler.
+        """
+        self.subsystems['app'] = app.logger.name
+        self.subsystems['socket_events'] = self.events_logger(app).name
+        root = logging.getLogger()
+        root.setLevel(parse_level(app.config.get('LOG_LEVEL', 'INFO')))
+        if not root.handlers:
+            handler = logging.StreamHandler(sys.stderr)
+            handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            root.addHandler(handler)
+        # Records propagate to the root handlers, queued or not
+        from flask.logging import default_handler
+        app.logger.removeHandler(default_handler)
+        if app.config.get('LOG_ASYNC'):
+            self._start_queue(root, app.config.get('LOG_QUEUE_SIZE', 10000))
+        self.configure(
+            levels=parse_settings(app.config.get('LOG_LEVELS'), parse_level),
+            sample_rates=parse_settings(app.config.get('LOG_SAMPLE_RATES'), parse_rate),
+        )
+        app.extensions['log_pipeline'] = self
+
+    @staticmethod
+    def events_logger(app):
+        """
+        Logger of the per-event Socket.IO logs (connects, disconnects, token checks).
+        """
+        return app.logger.getChild('socket')
+
+    def _start_queue(self, root, maxsize):
+        with self._lock:
+            if self._listener is not None:
+                return
+            threading_module, queue_module = _os_threading()
+            self._queue = queue_module.Queue(maxsize)
+            handlers = list(root.handlers)
+            for handler in handlers:
+                root.removeHandler(handler)
+            root.addHandler(DroppingQueueHandler(self._queue))
+            self._listener = _Listener(threading_module, self._queue, *handlers, respect_handler_level=True)
+            self._listener.start()
+            registry.gauge('chat_log_queue_depth', 'Log records waiting for the writer thread').set_function(
+                self._queue.qsize)
+            atexit.register(self.close)
+
+    def configure(self, levels=None, sample_rates=None):
+        """
+        Set the level and sample rate of subsystems; takes effect immediately.
+        Raises ValueError for an unknown subsystem or invalid value, before changing anything.
+        """
+        levels = {name: parse_level(level) for name, level in (levels or {}).items()}
+        sample_rates = {name: parse_rate(rate) for name, rate in (sample_rates or {}).items()}
+        unknown = (set(levels) | set(sample_rates)) - set(self.subsystems)
+        if unknown:
+            raise ValueError(f"Unknown log subsystem: {', '.join(sorted(unknown))}")
+        with self._lock:
+            for name, level in levels.items():
+                logging.getLogger(self.subsystems[name]).setLevel(level)
+            for name, rate in sample_rates.items():
+                logger = logging.getLogger(self.subsystems[name])
+                if name not in self._filters:
+                    self._filters[name] = SamplingFilter()
+                    logger.addFilter(self._filters[name])
+                self._filters[name].rate = rate
+
+    def settings(self):
+        """
+        Current mode, levels and sample rates, by subsystem.
+        """
+        return {
+            'async': self._listener is not None,
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+            'levels': {
+                name: logging.getLevelName(logging.getLogger(logger).getEffectiveLevel())
+                for name, logger in self.subsystems.items()
+            },
+            'sample_rates': {
+                name: self._filters[name].rate if name in self._filters else 1.0
+                for name in self.subsystems
+            },
+        }
+
+    def close(self):
+        """
+        Write the queued records and stop the writer thread.
+        """
+        with self._lock:
+            listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.stop()
+
+
+class _Listener(logging.handlers.QueueListener):
+    """
+    QueueListener whose writer is an OS thread even when the threading module is monkey patched.
+    """
+    def __init__(self, threading_module, records, *handlers, respect_handler_level=False):
+        super().__init__(records, *handlers, respect_handler_level=respect_handler_level)
+        self._threading = threading_module
+
+    def start(self):
+        self._thread = self._threading.Thread(target=self._monitor, name='log-writer', daemon=True)
+        self._thread.start()
+
+
+def _os_threading():
+    """
+    Return the threading and queue modules backed by OS threads. Under eventlet monkey patching
+    a green writer would do its blocking writes on the event loop, which is what the queue avoids.
+    """
+    eventlet = sys.modules.get('eventlet')
+    if eventlet is not None:
+        from eventlet import patcher
+        if patcher.is_monkey_patched('thread'):
+            return patcher.original('threading'), patcher.original('queue')
+    return threading, queue
+
+
+log_pipeline = LogPipeline()
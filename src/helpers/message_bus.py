@@ -0,0 +1,369 @@
+"""
+Pluggable pub/sub backends that let several Socket.IO workers share emits and presence.
+
+The backend is chosen from a URL (`SOCKETIO_MESSAGE_QUEUE`):
+
+- ``redis://...``, ``kafka://...``, ``zmq+tcp://...``, ``amqp://...``: handled by python-socketio's own managers.
+- ``local://host:port``: the bundled local-socket hub, for running N workers on one machine without Redis.
+  Start it with ``python -m src.helpers.message_bus --host 127.0.0.1 --port 6380``.
+- ``memory://name``: an in-process bus, for several servers living in the same process (tests, benchmarks).
+
+Frames are JSON, so emitted payloads must be JSON serializable; a peer can never make the hub or a
+worker run code, as unpickling would.
+"""
+import argparse
+import json
+import logging
+import queue
+import select
+import socket
+import socketserver
+import struct
+import threading
+import time
+from urllib.parse import urlparse
+
+from socketio import PubSubManager
+
+from src.helpers.presence import MemoryPresenceRegistry, PresenceRegistry, RedisPresenceRegistry
+
+_HEADER = struct.Struct('!I')
+MAX_FRAME_SIZE = 16 * 1024 * 1024  # Larger frames close the connection instead of being buffered
+_PRESENCE_METHODS = {
+    'add', 'remove', 'sids', 'is_online', 'online_users', 'filter_online', 'mark_announced', 'heartbeat', 'reap',
+}
+
+
+def encode_frame(obj):
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def decode_frame(payload):
+    return json.loads(payload)
+
+
+def send_frame(sock, obj):
+    """
+    Send one length-prefixed JSON frame over a socket.
+    """
+    payload = encode_frame(obj)
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def recv_frame(sock):
+    """
+    Read one frame sent by `send_frame`; return None when the peer closed the connection.
+    """
+    header = _recv_exact(sock, _HEADER.size)
+    if header is None:
+        return None
+    size = _HEADER.unpack(header)[0]
+    if size > MAX_FRAME_SIZE:
+        raise ConnectionError(f'Message bus frame of {size} bytes exceeds the {MAX_FRAME_SIZE} bytes limit')
+    payload = _recv_exact(sock, size)
+    if payload is None:
+        return None
+    return decode_frame(payload)
+
+
+def _recv_exact(sock, size):
+    chunks = bytearray()
+    while len(chunks) < size:
+        chunk = sock.recv(size - len(chunks))
+        if not chunk:
+            return None
+        chunks += chunk
+    return bytes(chunks)
+
+
+def _parse_address(url):
+    parsed = urlparse(url)
+    return parsed.hostname or '127.0.0.1', parsed.port or 6380
+
+
+class LocalBusHub:
+    """
+    A tiny pub/sub and presence hub listening on a local TCP socket.
+    Each published frame is forwarded once to every subscriber of the channel.
+    """
+
+    def __init__(self, host='127.0.0.1', port=6380):
+        self.address = (host, port)
+        self.presence = MemoryPresenceRegistry()
+        self._subscribers = {}  # Map of channel names to {socket: send lock}
+        self._connections = set()
+        self._lock = threading.Lock()
+        self._server = None
+
+    def serve_forever(self):
+        hub = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                hub._handle_connection(self.request)
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._server = socketserver.ThreadingTCPServer(self.address, Handler)
+        self._server.daemon_threads = True
+        self.address = self._server.server_address
+        self._server.serve_forever()
+
+    def start(self):
+        """
+        Run the hub in a daemon thread and return once it accepts connections.
+        """
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        while self._server is None:
+            time.sleep(0.01)
+        return self
+
+    def shutdown(self):
+        """
+        Stop accepting connections and close the open ones, so peers reconnect to the next hub.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        with self._lock:
+            connections = list(self._connections)
+        for sock in connections:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _handle_connection(self, sock):
+        subscribed = None
+        with self._lock:
+            self._connections.add(sock)
+        try:
+            while True:
+                frame = recv_frame(sock)
+                if frame is None:
+                    break
+                op = frame.get('op')
+                if op == 'subscribe':
+                    subscribed = frame['channel']
+                    with self._lock:
+                        self._subscribers.setdefault(subscribed, {})[sock] = threading.Lock()
+                elif op == 'publish':
+                    self._publish(frame['channel'], frame['data'])
+                elif op == 'presence' and frame.get('method') in _PRESENCE_METHODS:
+                    result = getattr(self.presence, frame['method'])(*frame.get('args', ()))
+                    # Sets travel as lists
+                    send_frame(sock, sorted(result) if isinstance(result, (set, frozenset)) else result)
+        except (ConnectionError, ValueError) as e:
+            # A peer that sends an oversized or malformed frame is dropped
+            logging.getLogger(__name__).warning(f"Closing message bus connection: {e}")
+        finally:
+            with self._lock:
+                self._connections.discard(sock)
+                if subscribed is not None:
+                    self._subscribers.get(subscribed, {}).pop(sock, None)
+
+    def _publish(self, channel, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, {}).items())
+        for subscriber, send_lock in subscribers:
+            try:
+                with send_lock:
+                    send_frame(subscriber, data)
+            except OSError:
+                with self._lock:
+                    self._subscribers.get(channel, {}).pop(subscriber, None)
+
+
+class _LocalBusConnection:
+    """
+    A request connection to the hub, serialized by a lock.
+    """
+
+    def __init__(self, url):
+        self.address = _parse_address(url)
+        self._sock = None
+        self._lock = threading.Lock()
+
+    def send(self, frame, expect_reply=False):
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is not None and select.select([self._sock], [], [], 0)[0]:
+                        # The hub never writes unasked, so a readable socket was closed by it;
+                        # writing would still succeed and the frame would be lost
+                        self._sock.close()
+                        self._sock = None
+                    if self._sock is None:
+                        self._sock = socket.create_connection(self.address)
+                    send_frame(self._sock, frame)
+                    if not expect_reply:
+                        return None
+                    reply = recv_frame(self._sock)
+                    if reply is None:
+                        raise ConnectionError('Local message bus closed the connection')
+                    return reply
+                except OSError:
+                    self._sock = None
+                    if attempt:
+                        raise
+
+
+class LocalBusManager(PubSubManager):
+    """
+    Socket.IO client manager that shares emits through a `LocalBusHub`.
+    """
+    name = 'local'
+
+    def __init__(self, url='local://127.0.0.1:6380', channel='socketio', write_only=False, logger=None):
+        self.url = url
+        self._connection = _LocalBusConnection(url)
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+
+    def initialize(self):
+        super().initialize()
+        if self.server.async_mode == 'eventlet':
+            from eventlet.patcher import is_monkey_patched
+            if not is_monkey_patched('socket'):
+                raise RuntimeError('The local message bus requires a monkey patched socket library to work with eventlet')
+
+    def _publish(self, data):
+        self._connection.send({'op': 'publish', 'channel': self.channel, 'data': data})
+
+    def _listen(self):
+        try:
+            sock = socket.create_connection(_parse_address(self.url))
+        except OSError:
+            time.sleep(1)  # Hub not reachable yet; the manager thread retries
+            raise
+        with sock:
+            send_frame(sock, {'op': 'subscribe', 'channel': self.channel})
+            while True:
+                frame = recv_frame(sock)
+                if frame is None:
+                    raise ConnectionError('Local message bus closed the connection')
+                yield frame
+
+
+class LocalBusPresenceRegistry(PresenceRegistry):
+    """
+    Presence stored in the `LocalBusHub`, shared by every worker connected to it.
+    """
+
+    def __init__(self, url):
+        self._connection = _LocalBusConnection(url)
+
+    def _call(self, method, *args):
+        return self._connection.send({'op': 'presence', 'method': method, 'args': args}, expect_reply=True)
+
+    def add(self, username, sid, worker_id=None):
+        return self._call('add', username, sid, worker_id)
+
+    def remove(self, sid):
+        username, last = self._call('remove', sid)
+        return username, last
+
+    def sids(self, username):
+        return set(self._call('sids', username))
+
+    def is_online(self, username):
+        return self._call('is_online', username)
+
+    def online_users(self):
+        return set(self._call('online_users'))
+
+    def filter_online(self, usernames):
+        return set(self._call('filter_online', list(usernames)))
+
+    def mark_announced(self, username, online):
+        return self._call('mark_announced', username, online)
+
+    def heartbeat(self, worker_id, ttl):
+        return self._call('heartbeat', worker_id, ttl)
+
+    def reap(self):
+        return set(self._call('reap'))
+
+
+class _MemoryBus:
+    def __init__(self):
+        self.presence = MemoryPresenceRegistry()
+        self.subscribers = []
+        self.lock = threading.Lock()
+
+_memory_buses = {}
+_memory_buses_lock = threading.Lock()
+
+
+def _memory_bus(url):
+    with _memory_buses_lock:
+        return _memory_buses.setdefault(url, _MemoryBus())
+
+
+class MemoryBusManager(PubSubManager):
+    """
+    Socket.IO client manager connecting servers that live in the same process.
+    """
+    name = 'memory'
+
+    def __init__(self, url='memory://', channel='socketio', write_only=False, logger=None):
+        self.bus = _memory_bus(url)
+        self._queue = None
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+
+    def initialize(self):
+        # Use a queue that cooperates with the server's async mode (eventlet, threading...)
+        self._queue = self.server.eio.create_queue()
+        with self.bus.lock:
+            self.bus.subscribers.append(self._queue)
+        super().initialize()
+
+    def _publish(self, data):
+        with self.bus.lock:
+            subscribers = list(self.bus.subscribers)
+        # Encoded like the local hub's frames, so payloads that can't cross a real bus fail here too
+        payload = encode_frame(data)
+        for subscriber in subscribers:
+            subscriber.put(payload)
+
+    def _listen(self):
+        while True:
+            yield decode_frame(self._queue.get())
+
+
+def socketio_queue_options(url):
+    """
+    Build the `SocketIO` keyword arguments that select the message bus for `url`.
+    """
+    if not url:
+        return {}
+    scheme = urlparse(url).scheme
+    if scheme == 'local':
+        return {'client_manager': LocalBusManager(url)}
+    if scheme == 'memory':
+        return {'client_manager': MemoryBusManager(url)}
+    # redis, kafka, zmq and kombu URLs are understood by Flask-SocketIO itself
+    return {'message_queue': url}
+
+
+def create_presence_registry(url):
+    """
+    Build the presence registry matching the message bus `url`.
+    Without a bus, presence is local to the process.
+    """
+    scheme = urlparse(url).scheme if url else None
+    if scheme in ('redis', 'rediss'):
+        return RedisPresenceRegistry(url)
+    if scheme == 'local':
+        return LocalBusPresenceRegistry(url)
+    if scheme == 'memory':
+        return _memory_bus(url).presence
+    return MemoryPresenceRegistry()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the local Socket.IO message bus hub.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6380)
+    args = parser.parse_args()
+    print(f"Local message bus listening on {args.host}:{args.port}")
+    LocalBusHub(args.host, args.port).serve_forever()
@@ -0,0 +1,50 @@
+import base64
+import json
+from datetime import datetime
+
+
+class InvalidCursor(ValueError):
+    """
+    Raised when a client sends a cursor that cannot be decoded.
+    """
+
+
+def encode_cursor(*values):
+    """
+    Encode the sort key of a row into an opaque, URL-safe cursor string.
+    Datetimes are serialized as ISO strings and restored by `decode_cursor`.
+    """
+    payload = [
+        {"dt": value.isoformat()} if isinstance(value, datetime) else value
+        for value in values
+    ]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, size):
+    """
+    Decode a cursor produced by `encode_cursor` back into a tuple of `size` values.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(payload, list) or len(payload) != size:
+            raise InvalidCursor("Malformed cursor.")
+        return tuple(
+            datetime.fromisoformat(value["dt"]) if isinstance(value, dict) else value
+            for value in payload
+        )
+    except (ValueError, TypeError, KeyError) as e:
+        raise InvalidCursor(f"Invalid cursor: {e}")
+
+
+def parse_limit(value, default, maximum):
+    """
+    Parse the `limit` query parameter, clamping it to [1, maximum].
+    """
+    try:
+        limit = int(value) if value is not None else default
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, maximum))
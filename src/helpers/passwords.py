@@ -0,0 +1,92 @@
+"""
+Password hashing with argon2id, run off the event loop.
+Hashes are computed in a bounded pool of OS threads (argon2 releases the GIL while it works),
+so a burst of logins doesn't stall the other greenlets of the worker.
+Hashes made by the previous pbkdf2 scheme are still accepted and flagged for rehashing.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from argon2 import PasswordHasher as Argon2Hasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from werkzeug.security import check_password_hash
+
+
+class PasswordHasher:
+    def __init__(self, time_cost=3, memory_cost=65536, parallelism=4, workers=4):
+        self._argon2 = Argon2Hasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+        self.workers = workers
+        self._run = self._inline
+
+    def init_app(self, app, async_mode=None):
+        """
+        Configure the argon2 cost from the app and pick how work is offloaded for the server's async mode.
+        """
+        self._argon2 = Argon2Hasher(
+            time_cost=app.config.get('PASSWORD_HASH_TIME_COST', 3),
+            memory_cost=app.config.get('PASSWORD_HASH_MEMORY_COST', 65536),
+            parallelism=app.config.get('PASSWORD_HASH_PARALLELISM', 4),
+        )
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', self.workers)
+        if async_mode == 'eventlet':
+            from eventlet import tpool
+            from eventlet.semaphore import Semaphore
+            # The semaphore bounds how many hashes (and their memory) run at once
+            slots = Semaphore(self.workers)
+
+            def run(fn, *args):
+                with slots:
+                    return tpool.execute(fn, *args)
+        elif async_mode == 'gevent':
+            import gevent
+            from gevent.lock import BoundedSemaphore
+            slots = BoundedSemaphore(self.workers)
+
+            def run(fn, *args):
+                with slots:
+                    return gevent.get_hub().threadpool.apply(fn, args)
+        else:
+            executor = ThreadPoolExecutor(self.workers, thread_name_prefix='password-hash')
+
+            def run(fn, *args):
+                return executor.submit(fn, *args).result()
+        self._run = run
+        app.extensions['password_hasher'] = self
+
+    @staticmethod
+    def _inline(fn, *args):
+        return fn(*args)
+
+    def hash(self, password):
+        """
+        Hash a password with argon2id.
+        """
+        return self._run(self._argon2.hash, password)
+
+    def verify(self, password_hash, password):
+        """
+        Verify a password against an argon2 or legacy pbkdf2 hash.
+        """
+        if not password_hash:
+            return False
+        if password_hash.startswith('$argon2'):
+            return self._run(self._verify_argon2, password_hash, password)
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """
+        True for legacy hashes and for argon2 hashes made with other cost parameters.
+        """
+        if not password_hash.startswith('$argon2'):
+            return True
+        try:
+            return self._argon2.check_needs_rehash(password_hash)
+        except InvalidHashError:
+            return True
+
+    def _verify_argon2(self, password_hash, password):
+        try:
+            return self._argon2.verify(password_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,282 @@
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from src.helpers.session_manager import SessionManager
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class PresenceRegistry(ABC):
+    """
+    Tracks which users are online and through which socket session IDs.
+    Implementations may be process-local or shared by every worker.
+    Sessions added with a `worker_id` belong to that worker: once the worker stops sending heartbeats,
+    `reap` drops them, so the users of a crashed worker don't stay online forever.
+    """
+
+    @abstractmethod
+    def add(self, username, sid, worker_id=None):
+        """
+        Record a session ID of the user; return True if it is the user's first one on any worker.
+        """
+
+    @abstractmethod
+    def remove(self, sid):
+        """
+        Forget a session ID and return (username it belonged to or None, whether it was the user's last one).
+        """
+
+    @abstractmethod
+    def sids(self, username):
+        """
+        Return the session IDs of every connection the user currently has.
+        """
+
+    @abstractmethod
+    def is_online(self, username):
+        """
+        Whether the user has at least one connection on any worker.
+        """
+
+    @abstractmethod
+    def online_users(self):
+        """
+        Return the set of every online username.
+        """
+
+    @abstractmethod
+    def filter_online(self, usernames):
+        """
+        Return the set of `usernames` that are online, without reading the whole online set.
+        """
+
+    @abstractmethod
+    def mark_announced(self, username, online):
+        """
+        Record the state announced to clients for the user; return False if it was already announced,
+        so workers racing on the same transition send it once.
+        """
+
+    @abstractmethod
+    def heartbeat(self, worker_id, ttl):
+        """
+        Keep the worker's sessions for `ttl` more seconds; return False if the worker was unknown or had
+        already expired (its sessions may have been reaped).
+        """
+
+    @abstractmethod
+    def reap(self):
+        """
+        Drop the sessions of every worker whose heartbeat expired and return the usernames that went offline.
+        """
+
+
+class MemoryPresenceRegistry(PresenceRegistry):
+    """
+    Process-local presence, used when running a single worker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = SessionManager()
+        self._announced = set()  # Usernames last announced as online
+        self._sid_workers = {}  # Map of session IDs to the worker holding them
+        self._worker_sids = {}  # Map of worker IDs to their session IDs
+        self._heartbeats = {}  # Map of worker IDs to the monotonic time they expire at
+
+    def add(self, username, sid, worker_id=None):
+        with self._lock:
+            first = not self._sessions.is_online(username)
+            self._sessions.add_session(username, sid)
+            if worker_id is not None:
+                self._sid_workers[sid] = worker_id
+                self._worker_sids.setdefault(worker_id, set()).add(sid)
+            return first
+
+    def remove(self, sid):
+        with self._lock:
+            username = self._remove(sid)
+            return username, username is not None and not self._sessions.is_online(username)
+
+    def _remove(self, sid):
+        worker_id = self._sid_workers.pop(sid, None)
+        if worker_id is not None:
+            self._worker_sids.get(worker_id, set()).discard(sid)
+        return self._sessions.remove_session(sid)
+
+    def sids(self, username):
+        with self._lock:
+            return set(self._sessions.get_sids(username))
+
+    def is_online(self, username):
+        with self._lock:
+            return self._sessions.is_online(username)
+
+    def online_users(self):
+        with self._lock:
+            return set(self._sessions.online_users())
+
+    def filter_online(self, usernames):
+        with self._lock:
+            return {username for username in usernames if self._sessions.is_online(username)}
+
+    def mark_announced(self, username, online):
+        with self._lock:
+            if online == (username in self._announced):
+                return False
+            if online:
+                self._announced.add(username)
+            else:
+                self._announced.discard(username)
+            return True
+
+    def heartbeat(self, worker_id, ttl):
+        now = time.monotonic()
+        with self._lock:
+            alive = self._heartbeats.get(worker_id, now) > now
+            self._heartbeats[worker_id] = now + ttl
+            return alive
+
+    def reap(self):
+        now = time.monotonic()
+        offline = set()
+        with self._lock:
+            expired = [worker_id for worker_id, expires_at in self._heartbeats.items() if expires_at <= now]
+            for worker_id in expired:
+                del self._heartbeats[worker_id]
+                for sid in self._worker_sids.pop(worker_id, set()):
+                    self._sid_workers.pop(sid, None)
+                    username = self._sessions.remove_session(sid)
+                    if username is not None and not self._sessions.is_online(username):
+                        offline.add(username)
+        return offline
+
+
+class RedisPresenceRegistry(PresenceRegistry):
+    """
+    Presence shared through Redis, so every worker sees the same online users.
+    """
+
+    # Removes a session and drops the user from the online set atomically; returns {username, last}
+    REMOVE_SCRIPT = """
+    local worker = redis.call('HGET', KEYS[3], ARGV[1])
+    if worker then
+        redis.call('HDEL', KEYS[3], ARGV[1])
+        redis.call('SREM', ARGV[3] .. worker, ARGV[1])
+    end
+    local username = redis.call('HGET', KEYS[1], ARGV[1])
+    if not username then return false end
+    redis.call('HDEL', KEYS[1], ARGV[1])
+    local user_key = ARGV[2] .. username
+    redis.call('SREM', user_key, ARGV[1])
+    if redis.call('SCARD', user_key) == 0 then
+        return {username, redis.call('SREM', KEYS[2], username)}
+    end
+    return {username, 0}
+    """
+
+    # Removes every session of a worker whose heartbeat key expired; returns the usernames that went offline
+    REAP_SCRIPT = """
+    if redis.call('EXISTS', ARGV[4] .. ARGV[1]) == 1 then return {} end
+    local worker_key = ARGV[3] .. ARGV[1]
+    local offline = {}
+    for _, sid in ipairs(redis.call('SMEMBERS', worker_key)) do
+        local username = redis.call('HGET', KEYS[1], sid)
+        redis.call('HDEL', KEYS[1], sid)
+        redis.call('HDEL', KEYS[3], sid)
+        if username then
+            local user_key = ARGV[2] .. username
+            redis.call('SREM', user_key, sid)
+            if redis.call('SCARD', user_key) == 0 and redis.call('SREM', KEYS[2], username) == 1 then
+                table.insert(offline, username)
+            end
+        end
+    end
+    redis.call('DEL', worker_key)
+    redis.call('SREM', KEYS[4], ARGV[1])
+    return offline
+    """
+
+    def __init__(self, url, prefix='presence'):
+        if redis is None:
+            raise RuntimeError('Redis package is not installed (Run "pip install redis" in your virtualenv).')
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.sids_key = f"{prefix}:sids"  # Hash of session IDs to usernames
+        self.online_key = f"{prefix}:online"  # Set of online usernames
+        self.user_prefix = f"{prefix}:user:"  # One set of session IDs per user
+        self.announced_key = f"{prefix}:announced"  # Set of usernames last announced as online
+        self.sid_workers_key = f"{prefix}:sid_workers"  # Hash of session IDs to the worker holding them
+        self.worker_prefix = f"{prefix}:worker:"  # One set of session IDs per worker
+        self.alive_prefix = f"{prefix}:alive:"  # One key per worker, expiring unless heartbeats refresh it
+        self.workers_key = f"{prefix}:workers"  # Set of the worker IDs that sent a heartbeat
+        self._remove_script = self.redis.register_script(self.REMOVE_SCRIPT)
+        self._reap_script = self.redis.register_script(self.REAP_SCRIPT)
+
+    def add(self, username, sid, worker_id=None):
+        # MULTI/EXEC: the SADD to the online set only adds the user when no other session did
+        pipe = self.redis.pipeline()
+        pipe.hset(self.sids_key, sid, username)
+        pipe.sadd(self.user_prefix + username, sid)
+        pipe.sadd(self.online_key, username)
+        if worker_id is not None:
+            pipe.hset(self.sid_workers_key, sid, worker_id)
+            pipe.sadd(self.worker_prefix + worker_id, sid)
+        return bool(pipe.execute()[2])
+
+    def remove(self, sid):
+        result = self._remove_script(
+            keys=[self.sids_key, self.online_key, self.sid_workers_key],
+            args=[sid, self.user_prefix, self.worker_prefix],
+        )
+        if not result:
+            return None, False
+        return result[0], bool(result[1])
+
+    def sids(self, username):
+        return set(self.redis.smembers(self.user_prefix + username))
+
+    def is_online(self, username):
+        return bool(self.redis.sismember(self.online_key, username))
+
+    def online_users(self):
+        return set(self.redis.smembers(self.online_key))
+
+    def filter_online(self, usernames):
+        usernames = list(usernames)
+        if not usernames:
+            return set()
+        # SMISMEMBER (Redis 6.2+): one round trip for the whole batch
+        flags = self.redis.smismember(self.online_key, usernames)
+        return {username for username, flag in zip(usernames, flags) if flag}
+
+    def mark_announced(self, username, online):
+        if online:
+            return bool(self.redis.sadd(self.announced_key, username))
+        return bool(self.redis.srem(self.announced_key, username))
+
+    def heartbeat(self, worker_id, ttl):
+        pipe = self.redis.pipeline()
+        pipe.set(self.alive_prefix + worker_id, 1, ex=max(math.ceil(ttl), 1), get=True)
+        pipe.sadd(self.workers_key, worker_id)
+        return pipe.execute()[0] is not None
+
+    def reap(self):
+        workers = list(self.redis.smembers(self.workers_key))
+        if not workers:
+            return set()
+        pipe = self.redis.pipeline(transaction=False)
+        for worker_id in workers:
+            pipe.exists(self.alive_prefix + worker_id)
+        offline = set()
+        for worker_id, alive in zip(workers, pipe.execute()):
+            if not alive:
+                # The script checks the key again, in case the worker came back meanwhile
+                offline.update(self._reap_script(
+                    keys=[self.sids_key, self.online_key, self.sid_workers_key, self.workers_key],
+                    args=[worker_id, self.user_prefix, self.worker_prefix, self.alive_prefix],
+                ))
+        return offline
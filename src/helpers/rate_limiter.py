@@ -0,0 +1,86 @@
+import threading
+import time
+from src.helpers.metrics import registry
+
+RATE_LIMITED = registry.counter(
+    'chat_rate_limited_total', 'Socket events rejected by a rate limit, by limit', ('limit',))
+
+
+class TokenBucket:
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, tokens, updated):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class RateLimiter:
+    """
+    In-memory token-bucket limiter keyed by an arbitrary value (socket id, username, ...).
+    Each key may spend up to `burst` events at once and regains `rate` events per second.
+    Buckets are refilled lazily when they are checked, so every check is O(1).
+    Buckets that have refilled completely are evicted every `sweep_interval` seconds: a new bucket
+    starts full, so forgetting them changes nothing, while a key that just spent its burst keeps it spent.
+    """
+    def __init__(self, name, rate, burst, sweep_interval=60.0):
+        self.name = name
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.sweep_interval = sweep_interval
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._limited = RATE_LIMITED.labels(name)
+        self._swept_at = time.monotonic()
+
+    def consume(self, key, cost=1.0):
+        """
+        Take `cost` tokens from the key's bucket.
+        Returns 0 when the event is allowed, otherwise the seconds to wait before retrying.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._swept_at >= self.sweep_interval:
+                self._evict_full(now)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.burst, now)
+            else:
+                bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+                bucket.updated = now
+            if bucket.tokens >= cost:
+                bucket.tokens -= cost
+                return 0.0
+            missing = cost - bucket.tokens
+        self._limited.inc()
+        return missing / self.rate if self.rate > 0 else float('inf')
+
+    def refund(self, key, cost=1.0):
+        """
+        Give back tokens taken by `consume` for an event that was rejected by another limit.
+        """
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.tokens = min(self.burst, bucket.tokens + cost)
+
+    def _evict_full(self, now):
+        """
+        Drop the buckets that are full again (called with the lock held).
+        """
+        self._swept_at = now
+        idle = [
+            key for key, bucket in self._buckets.items()
+            if bucket.tokens + (now - bucket.updated) * self.rate >= self.burst
+        ]
+        for key in idle:
+            del self._buckets[key]
+
+    def discard(self, key):
+        """
+        Forget a key's bucket (e.g. when its socket disconnects).
+        """
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def __len__(self):
+        return len(self._buckets)
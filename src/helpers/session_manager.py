@@ -1,22 +1,55 @@
+from collections import namedtuple
+
+# Identity verified once at connect time and bound to the socket session
+SocketIdentity = namedtuple('SocketIdentity', ['username', 'user_id', 'expires_at', 'conversations'])
+
+
 class SessionManager:
     """
     A utility class to manage user sessions.
+    Keeps a two-way index so lookups in either direction are O(1),
+    and a user may hold several sessions at once (one per tab or device).
     """
     def __init__(self):
-        self.sessions = {}  # Map of user IDs to session IDs
+        self.sessions = {}  # Map of user IDs to sets of session IDs
+        self.users = {}  # Map of session IDs to user IDs
+        self.identities = {}  # Map of session IDs to their verified identity
 
-    def add_session(self, user_id, sid):
-        self.sessions[user_id] = sid
+    def add_session(self, user_id, sid, identity=None):
+        previous = self.users.get(sid)
+        if previous is not None and previous != user_id:
+            self.remove_session(sid)
+        self.users[sid] = user_id
+        self.sessions.setdefault(user_id, set()).add(sid)
+        if identity is not None:
+            self.identities[sid] = identity
 
     def remove_session(self, sid):
-        user_id = self.get_user_by_sid(sid)
-        if user_id:
-            del self.sessions[user_id]
-            return user_id
-        return None
+        user_id = self.users.pop(sid, None)
+        self.identities.pop(sid, None)
+        if user_id is None:
+            return None
+        sids = self.sessions.get(user_id)
+        if sids is not None:
+            sids.discard(sid)
+            if not sids:
+                del self.sessions[user_id]
+        return user_id
 
     def get_user_by_sid(self, sid):
-        for user_id, session_id in self.sessions.items():
-            if session_id == sid:
-                return user_id
-        return None
\ No newline at end of file
+        return self.users.get(sid)
+
+    def get_identity(self, sid):
+        return self.identities.get(sid)
+
+    def get_sids(self, user_id):
+        return self.sessions.get(user_id, set())
+
+    def is_online(self, user_id):
+        return user_id in self.sessions
+
+    def online_users(self):
+        return self.sessions.keys()
+
+    def __len__(self):
+        return len(self.users)
@@ -0,0 +1,105 @@
+"""
+A minimal local SMTP server that accepts every message and keeps it in memory.
+It stands in for a real mail server in local runs and benchmarks:
+
+    python -m src.helpers.smtp_sink --port 1025
+
+then point MAIL_SERVER=127.0.0.1 / MAIL_PORT=1025 at it.
+"""
+import argparse
+import socketserver
+import threading
+import time
+
+
+class SMTPSink:
+    def __init__(self, host='127.0.0.1', port=1025, verbose=False):
+        self.address = (host, port)
+        self.verbose = verbose
+        self.messages = []  # (sender, recipients, data) tuples
+        self.connections = 0  # Number of SMTP sessions opened, to check connection reuse
+        self._lock = threading.Lock()
+        self._server = None
+
+    def serve_forever(self):
+        sink = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                sink._handle_session(self.rfile, self.wfile)
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._server = socketserver.ThreadingTCPServer(self.address, Handler)
+        self._server.daemon_threads = True
+        self.address = self._server.server_address
+        self._server.serve_forever()
+
+    def start(self):
+        """
+        Run the sink in a daemon thread and return once it accepts connections.
+        """
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        while self._server is None:
+            time.sleep(0.01)
+        return self
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _handle_session(self, rfile, wfile):
+        def reply(line):
+            wfile.write(line.encode('ascii') + b'\r\n')
+            wfile.flush()
+
+        with self._lock:
+            self.connections += 1
+        reply('220 localhost SMTP sink ready')
+        sender, recipients = None, []
+        while True:
+            line = rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                reply('250-localhost')
+                reply('250 8BITMIME')
+            elif verb == 'HELO':
+                reply('250 localhost')
+            elif verb == 'MAIL':
+                sender, recipients = command.split(':', 1)[1].strip(), []
+                reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command.split(':', 1)[1].strip())
+                reply('250 OK')
+            elif verb == 'DATA':
+                reply('354 End data with <CR><LF>.<CR><LF>')
+                data = bytearray()
+                for data_line in rfile:
+                    if data_line in (b'.\r\n', b'.\n'):
+                        break
+                    data += data_line[1:] if data_line.startswith(b'..') else data_line
+                with self._lock:
+                    self.messages.append((sender, recipients, bytes(data)))
+                if self.verbose:
+                    print(f"Message from {sender} to {', '.join(recipients)} ({len(data)} bytes)")
+                reply('250 OK: queued')
+            elif verb in ('RSET', 'NOOP'):
+                sender, recipients = (None, []) if verb == 'RSET' else (sender, recipients)
+                reply('250 OK')
+            elif verb == 'QUIT':
+                reply('221 Bye')
+                return
+            else:
+                reply('502 Command not implemented')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a local SMTP sink.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1025)
+    args = parser.parse_args()
+    print(f"SMTP sink listening on {args.host}:{args.port}")
+    SMTPSink(args.host, args.port, verbose=True).serve_forever()
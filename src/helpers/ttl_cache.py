@@ -0,0 +1,55 @@
+import threading
+import time
+from collections import OrderedDict
+from src.helpers.metrics import registry
+
+CACHE_REQUESTS = registry.counter(
+    'chat_cache_requests_total', 'Cache lookups by cache and result (hit or miss)', ('cache', 'result'))
+
+
+class TTLCache:
+    """
+    A bounded LRU cache whose entries also expire after `ttl` seconds.
+    Hits and misses are counted in the shared metrics registry under `name`.
+    """
+    def __init__(self, name, maxsize=10000, ttl=60.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # Map of keys to (expires_at, value)
+        self._lock = threading.Lock()
+        self._hits = CACHE_REQUESTS.labels(name, 'hit')
+        self._misses = CACHE_REQUESTS.labels(name, 'miss')
+        registry.gauge('chat_cache_entries', 'Entries held by each cache', ('cache',)).labels(name).set_function(self.__len__)
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self._hits.inc()
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+        self._misses.inc()
+        return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[1] if entry is not None else None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,46 @@
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Table
+from sqlalchemy.orm import relationship
+from src.database import db
+from datetime import datetime, timezone
+
+# Association table between conversations and their members
+conversation_member = Table(
+    'conversation_member',
+    db.metadata,
+    Column('conversation_id', Integer, ForeignKey('conversation.id', ondelete='CASCADE'), primary_key=True),
+    Column('user_id', Integer, ForeignKey('user.id', ondelete='CASCADE'), primary_key=True, index=True),
+)
+
+class Conversation(db.Model):
+    id = Column(Integer, primary_key=True)
+    name = Column(String(120), nullable=True)  # Only used by group conversations
+    is_group = Column(Boolean, default=False, nullable=False)
+    # Sorted "<id>:<id>" pair for direct messages, so each pair has a single conversation
+    direct_key = Column(String(64), unique=True, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    members = relationship('User', secondary=conversation_member, lazy='selectin')
+
+    @staticmethod
+    def room(conversation_id):
+        """
+        Name of the Socket.IO room that carries a conversation's messages.
+        A `None` id is the public lobby that every connected user joins.
+        """
+        return f"conversation:{conversation_id}" if conversation_id is not None else "lobby"
+
+    @staticmethod
+    def make_direct_key(user_id, other_user_id):
+        low, high = sorted((user_id, other_user_id))
+        return f"{low}:{high}"
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "is_group": self.is_group,
+            "members": [member.username for member in self.members],
+        }
+
+    def __repr__(self):
+        return f'<Conversation {self.id}>'
@@ -0,0 +1,32 @@
+import uuid
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON
+from src.database import db
+from datetime import datetime, timezone
+
+class ImageJob(db.Model):
+    """
+    An avatar upload going through the image pipeline.
+    Status moves from `pending` to `processing` to `done` (or `failed`).
+    """
+    PENDING = "pending"
+    PROCESSING = "processing"
+    DONE = "done"
+    FAILED = "failed"
+
+    id = Column(String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    user_id = Column(Integer, ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    status = Column(String(16), nullable=False, default=PENDING)
+    # SHA-256 of the uploaded bytes; identical uploads reuse the variants of an earlier job
+    content_hash = Column(String(64), nullable=False, index=True)
+    variants = Column(JSON, nullable=True)  # {"<size>": "<object name>"}
+    error = Column(String(255), nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "variants": self.variants or {},
+            "error": self.error,
+        }
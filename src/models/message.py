@@ -4,10 +4,17 @@ from src.database import db
 class Message(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # NULL means the message was posted to the public lobby
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id', ondelete='CASCADE'), nullable=True)
     content = db.Column(db.String(500), nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
     user = db.relationship('User', backref=db.backref('messages', lazy=True))
 
+    # Composite index backing per-conversation keyset pagination over (timestamp, id)
+    __table_args__ = (
+        db.Index('ix_message_conversation_timestamp_id', 'conversation_id', 'timestamp', 'id'),
+    )
+
     def __repr__(self):
-        return f'<Message {self.id} from User {self.user_id}>'
\ No newline at end of file
+        return f'<Message {self.id} from User {self.user_id}>'
@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from src.database import db
+from datetime import datetime, timezone
+
+class MessageSegment(db.Model):
+    """
+    Manifest entry of an archived segment: the messages of one conversation within one time bucket,
+    stored as a compressed object in MinIO. Rows are ordered by (timestamp, id) like the message table,
+    and the first/last keys bound the segment so history reads know which objects to open.
+    """
+    id = Column(Integer, primary_key=True)
+    # NULL means the segment holds lobby messages
+    conversation_id = Column(Integer, ForeignKey('conversation.id', ondelete='CASCADE'), nullable=True)
+    bucket_start = Column(DateTime, nullable=False)
+    first_timestamp = Column(DateTime, nullable=False)
+    first_id = Column(Integer, nullable=False)
+    last_timestamp = Column(DateTime, nullable=False)
+    last_id = Column(Integer, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    object_name = Column(String(255), unique=True, nullable=False)
+    size = Column(Integer, nullable=False)  # Compressed bytes
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        # Finds the segments before or after a pagination cursor in a conversation
+        db.Index('ix_message_segment_conversation_last', 'conversation_id', 'last_timestamp', 'last_id'),
+    )
+
+    def __repr__(self):
+        return f'<MessageSegment {self.object_name} ({self.message_count} messages)>'
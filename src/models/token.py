@@ -12,5 +12,12 @@ class Token(db.Model):
 
     user = relationship('User', back_populates='tokens')
 
+    __table_args__ = (
+        # Per-user lookups of live tokens
+        db.Index('ix_token_user_id_expired_at', 'user_id', 'expired_at'),
+        # Lets the sweeper find expired rows without scanning the table
+        db.Index('ix_token_expired_at', 'expired_at'),
+    )
+
     def __repr__(self):
         return f'<Token {self.refresh_token}>'
\ No newline at end of file
@@ -1,17 +1,26 @@
 from sqlalchemy import Column, Integer, String, DateTime, Boolean
 from sqlalchemy.orm import relationship
-from werkzeug.security import generate_password_hash, check_password_hash
 from src.database import db
+from src.helpers.passwords import password_hasher
 from datetime import datetime, timezone
 
+def verify_password(password_hash, password):
+    """
+    Verify a password against a stored hash (usable with cached user projections).
+    """
+    return password_hasher.verify(password_hash, password)
+
 class User(db.Model):
     id = Column(Integer, primary_key=True)
     username = Column(String(80), unique=True, nullable=False)
     email = Column(String(120), unique=True, nullable=False)
     password_hash = Column(String(128), nullable=False)
     created_at = Column(DateTime, default=datetime.now(timezone.utc))
-    last_seen = Column(DateTime, default=datetime.now(timezone.utc), onupdate=datetime.now(timezone.utc))
+    # Last socket activity, written in batches by the presence tracker
+    last_seen = Column(DateTime, default=datetime.utcnow)
     is_active = Column(Boolean, default=True)
+    # Bumped by every update; the newest value validates cached user directory pages
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
      # New field for storing image URL
     image_url = Column(String(255), nullable=True)
@@ -19,18 +28,23 @@ class User(db.Model):
      # Relationship with Token
     tokens = relationship('Token', back_populates='user', cascade='all, delete-orphan')
 
+    __table_args__ = (
+        # Serves the `LIKE 'prefix%'` search of the user directory; the unique index can't
+        # be used for it on PostgreSQL unless the database uses the C collation
+        db.Index('ix_user_username_pattern', 'username', postgresql_ops={'username': 'varchar_pattern_ops'}),
+    )
+
     def set_password(self, password):
         """
-        Hash the password using a strong algorithm (e.g., pbkdf2:sha256).
-        Werkzeug automatically handles salting.
+        Hash the password with argon2id (salted, cost from the PASSWORD_HASH_* settings).
         """
-        self.password_hash = generate_password_hash(password, method="pbkdf2:sha256", salt_length=16)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
         """
         Verify the hashed password matches the provided password.
         """
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
 
     def deactivate(self):
         """
@@ -42,7 +56,7 @@ class User(db.Model):
         """
         Update the `last_seen` timestamp.
         """
-        self.last_seen = datetime.now(timezone.utc)
+        self.last_seen = datetime.utcnow()
         
     def to_dict(self):
         return {
@@ -1,62 +1,184 @@
-import os
-from flask import Flask, jsonify
+if __name__ == "__main__":
+    # Patch the standard library before anything imports it: under eventlet, the message bus and
+    # the presence registry need cooperative sockets (python -m src.server)
+    try:
+        import eventlet
+        eventlet.monkey_patch()
+    except ImportError:
+        pass
+
+from flask import Flask, Response, jsonify, request
 from flask_jwt_extended import JWTManager
 from flask_mail import Mail
 from src.config import get_config
 from src.controllers.message_controller import message_controller
 from src.controllers.user_controller import user_controller
 from src.controllers.auth_controller import auth_controller
+from src.controllers.conversation_controller import conversation_controller
 from src.database import DatabaseService, db
+from src.helpers.compression import init_compression
+from src.helpers.instrumentation import instrument_flask
+from src.helpers.logs import log_pipeline
+from src.helpers.metrics import registry
+from src.helpers.passwords import password_hasher
 from flask_cors import CORS
 from src.models.user import User
+from src.models.conversation import Conversation
+from src.models.image_job import ImageJob
+from src.models.message_segment import MessageSegment
+from src.services.email_queue import EmailQueue
+from src.services.bucket_service import BucketService
+from src.services.image_pipeline import ImagePipeline
+from src.services.message_archiver import MessageArchiver
 from src.services.socket_service import SocketService
+from src.services.token_sweeper import TokenSweeper
+from src.services.user_cache import user_cache
 
 
-app = Flask(__name__)
+def create_app(config=None):
+    """
+    Build the Flask app and its Socket.IO server.
+    Nothing here touches the network: the database schema is checked on the first request or socket
+    connection, SMTP is only contacted by the first email and MinIO by the first upload or URL.
+    `GET /ready` reports whether the dependencies actually answer.
+    """
+    app = Flask(__name__)
 
-# Load configuration from the Config class
-app.config.from_object(get_config())
+    # Load configuration from the Config class
+    app.config.from_object(config or get_config())
 
-# Initialize db with the app
-db_service = DatabaseService(app)
+    # Levels, sampling and the log queue are set before anything logs
+    log_pipeline.init_app(app)
 
-# Create the database tables if they don't exist
-try:
-    with app.app_context():
-        db.create_all()
-        print("Database tables created successfully!")
-except Exception as e:
-    print(f"Error creating database tables: {e}")
-    
+    # Initialize db with the app
+    db_service = DatabaseService(app)
+    user_cache.init_app(app)
 
-# Enable CORS for the auth controller only
-#CORS(auth_controller, resources={r"/*": {"origins": "http://localhost:3000"}})
-CORS(app, origins="*", supports_credentials=True)
+    # Enable CORS for the auth controller only
+    #CORS(auth_controller, resources={r"/*": {"origins": "http://localhost:3000"}})
+    CORS(app, origins="*", supports_credentials=True)
 
-socket_service = SocketService(app, db=db)
+    socket_service = SocketService(app, db=db)
+    socketio = socket_service.socketio
 
-# Use the socketio from socket_service
-socketio = socket_service.socketio
+    # Delete expired refresh tokens in the background (started by `start_background_tasks`)
+    if app.config.get("TOKEN_SWEEP_INTERVAL"):
+        app.extensions['token_sweeper'] = TokenSweeper(
+            app,
+            interval=app.config["TOKEN_SWEEP_INTERVAL"],
+            batch_size=app.config["TOKEN_SWEEP_BATCH_SIZE"],
+        )
 
-jwt = JWTManager(app)
+    # Move old messages to MinIO segments in the background (needs MinIO)
+    if app.config.get("MESSAGE_ARCHIVE_INTERVAL") and app.config.get("MINIO_ENDPOINT"):
+        app.extensions['message_archiver'] = MessageArchiver(app, db, interval=app.config["MESSAGE_ARCHIVE_INTERVAL"])
 
-mail = Mail(app)
+    # Hash passwords off the event loop of the server's async mode
+    password_hasher.init_app(app, async_mode=socketio.async_mode)
+
+    JWTManager(app)
+
+    Mail(app)
+
+    # Deliver emails from background workers instead of the request thread (started by the first email)
+    EmailQueue(app)
+
+    # Process avatar uploads off the request
+    ImagePipeline(app)
+
+    # Record the latency of every route in the metrics registry
+    instrument_flask(app)
+
+    # Compress large JSON responses (history pages, user directory)
+    init_compression(app)
+
+    # Register the auth_controller blueprint with the app
+    app.register_blueprint(auth_controller, url_prefix='/auth')
+    app.register_blueprint(user_controller, url_prefix='/user')
+    app.register_blueprint(message_controller, url_prefix='/message')
+    app.register_blueprint(conversation_controller, url_prefix='/conversation')
+
+    @app.before_request
+    def ensure_schema():
+        # Only the blueprints use the database; liveness, readiness and metrics stay cheap
+        if request.blueprint is not None:
+            db_service.ensure_schema(app)
+
+    @app.route("/")
+    def index():
+        return jsonify({
+            'message': 'Chat server is running!',
+            # Socket.IO clients pick their packet parser from this
+            'socketio_serializer': socket_service.serializer,
+        })
+
+    @app.route("/ready")
+    def ready():
+        """
+        Readiness: the database answers and its schema is in place. MinIO is reported when configured
+        but doesn't fail the check, since chatting works without it.
+        """
+        checks = {"database": db_service.check_connection(app)}
+        checks["schema"] = checks["database"] and db_service.ensure_schema(app)
+        if app.config.get("MINIO_ENDPOINT"):
+            checks["minio"] = BucketService().is_available()
+        is_ready = checks["database"] and checks["schema"]
+        return jsonify({"ready": is_ready, "checks": checks}), 200 if is_ready else 503
+
+    @app.route("/metrics")
+    def metrics():
+        """
+        Metrics of this worker in the Prometheus text format.
+        """
+        return Response(registry.exposition(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+    @app.route("/logging", methods=["GET", "PUT"])
+    def logging_settings():
+        """
+        Read or change the log levels and sample rates of this worker, e.g.
+        PUT {"levels": {"engineio": "INFO"}, "sample_rates": {"socket_events": 0.5}}.
+        Needs `Authorization: Bearer <LOG_ADMIN_TOKEN>`; the route doesn't exist without the setting.
+        """
+        token = app.config.get("LOG_ADMIN_TOKEN")
+        if not token:
+            return jsonify({"error": "Not found"}), 404
+        if request.headers.get("Authorization") != f"Bearer {token}":
+            return jsonify({"error": "Unauthorized"}), 401
+        if request.method == "PUT":
+            data = request.get_json(silent=True) or {}
+            try:
+                log_pipeline.configure(levels=data.get("levels"), sample_rates=data.get("sample_rates"))
+            except (TypeError, ValueError, AttributeError) as e:
+                return jsonify({"error": str(e)}), 400
+        return jsonify(log_pipeline.settings()), 200
+
+    @app.cli.command("init-db")
+    def init_db():
+        """Create the database schema ahead of the first request."""
+        if not db_service.ensure_schema(app):
+            raise SystemExit(1)
+        print("Database schema is ready.")
+
+    return app
 
-with app.app_context():
-    try:
-        connection = mail.connect()
-        print("SMTP connection successful!")
-    except Exception as e:
-        print(f"Failed to connect to SMTP server: {e}")
 
-# Register the auth_controller blueprint with the app
-app.register_blueprint(auth_controller, url_prefix='/auth')
-app.register_blueprint(user_controller, url_prefix='/user')
-app.register_blueprint(message_controller, url_prefix='/message')
+def start_background_tasks(app):
+    """
+    Start the periodic tasks of a serving worker: the message writer, the presence tracker,
+    the token sweeper and the archiver. `create_app` leaves them stopped, so the CLI, scripts
+    and tests that only build an app run none of them. Calling it again does nothing.
+    """
+    if app.extensions.get('background_tasks_started'):
+        return
+    app.extensions['background_tasks_started'] = True
+    socket_service = app.extensions['socket_service']
+    socket_service.start_background_tasks()
+    for name in ('token_sweeper', 'message_archiver'):
+        if name in app.extensions:
+            app.extensions[name].start(socket_service.socketio)
 
-@app.route("/")
-def index():
-    return jsonify({'message': 'Chat server is running!'})
 
 if __name__ == "__main__":
-    socketio.run(app, host="0.0.0.0", port=5000)
\ No newline at end of file
+    app = create_app()
+    start_background_tasks(app)
+    app.extensions['socket_service'].socketio.run(app, host="0.0.0.0", port=5000)
@@ -1,10 +1,12 @@
 from itsdangerous import URLSafeTimedSerializer
 from flask_jwt_extended import create_access_token
-from src.models.user import User
+from src.helpers.passwords import password_hasher
+from src.models.user import User, verify_password
 from src.models.token import Token
 from sqlalchemy.exc import SQLAlchemyError
 from src.services.email_service import EmailService
 from src.services.token_service import TokenService
+from src.services.user_cache import user_cache
 
 class AuthService:
     def __init__(self, db, app):
@@ -20,7 +22,7 @@ class AuthService:
         """
         Sends a password reset email to the user.
         """
-        user = User.query.filter_by(email=email).first()
+        user = user_cache.get_by_email(email)
         if not user:
             return False, "Email address not found."
 
@@ -89,13 +91,26 @@ class AuthService:
         """
         Handles user login by checking credentials and returning access and refresh tokens.
         """
-        user = User.query.filter_by(username=username).first()
-        if user and user.check_password(password):
+        # Credentials are read from the database, never from the user cache: other workers only
+        # drop their cached entry when it expires, so a cached hash may predate a password reset
+        user = (
+            self.db.session.query(User.id, User.username, User.password_hash, User.is_active)
+            .filter(User.username == username)
+            .first()
+        )
+        if user and verify_password(user.password_hash, password):
             print("Password is correct, generating tokens...")
 
-            # Mark the user as active
-            user.is_active = True
-            self.db.session.commit()
+            # Mark the user as active and upgrade legacy password hashes (only written when something changes)
+            changes = {}
+            if not user.is_active:
+                changes["is_active"] = True
+            if password_hasher.needs_rehash(user.password_hash):
+                changes["password_hash"] = password_hasher.hash(password)
+            if changes:
+                User.query.filter_by(id=user.id).update(changes)
+                self.db.session.commit()
+                user_cache.invalidate(user_id=user.id)
             
             # Ensure app context is available when creating JWT tokens
             with self.app.app_context():
@@ -114,6 +129,29 @@ class AuthService:
             return access_token, refresh_token
         return None, "Invalid username or password"
 
+    def refresh(self, refresh_token):
+        """
+        Exchange a refresh token for a new access token and a new refresh token.
+        The presented token is consumed, so replaying it fails. Deactivated users get no new tokens.
+        """
+        try:
+            user_id = TokenService.consume_refresh_token(refresh_token)
+            user = (
+                self.db.session.query(User.id, User.username, User.is_active).filter(User.id == user_id).first()
+                if user_id else None
+            )
+            if not user or not user.is_active:
+                return None, "Invalid or expired refresh token."
+
+            with self.app.app_context():
+                access_token = create_access_token(identity=user.username)
+            new_refresh_token = TokenService.generate_refresh_token(user)
+            TokenService.store_refresh_token(user, new_refresh_token)
+            return access_token, new_refresh_token
+        except SQLAlchemyError as e:
+            self.app.logger.error(f"Error during token refresh: {str(e)}")
+            return None, "An error occurred while refreshing the token."
+
     def logout(self, refresh_token):
         """
         Handles logout by deleting the provided refresh token from the database.
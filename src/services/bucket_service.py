@@ -1,73 +1,184 @@
-from datetime import timedelta
-from minio import Minio
-from minio.error import S3Error
+from datetime import datetime, timedelta, timezone
 import os
-from PIL import Image
+import threading
+import time
+import urllib3
 from io import BytesIO
-from werkzeug.utils import secure_filename
+from src.helpers.ttl_cache import TTLCache
 
 class BucketService:
-    def __init__(self):
+    """
+    Process-wide MinIO client.
+    `BucketService()` always returns the same instance: the client, its HTTP connection pool and
+    the bucket check are set up once. Presigned GET URLs are cached until shortly before they expire.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                instance = super().__new__(cls)
+                instance._setup()
+                cls._instance = instance
+        return cls._instance
+
+    def _setup(self):
+        self.endpoint = os.getenv("MINIO_ENDPOINT")
+        self.bucket_name = os.getenv("MINIO_BUCKET_NAME")
+        self.url_expiry = int(os.getenv("MINIO_PRESIGNED_EXPIRY", 3600))  # seconds a presigned URL is valid
+        # URLs are handed out until `MINIO_PRESIGNED_REFRESH` seconds before they expire, then signed again
+        refresh = int(os.getenv("MINIO_PRESIGNED_REFRESH", 300))
+        # URLs are signed as of the start of fixed windows, so every worker hands out the same URL
+        # during a window and responses embedding them only change when the window does
+        self.url_window = max(self.url_expiry - refresh, 1)
+        self._urls = TTLCache('presigned_url', maxsize=10000, ttl=self.url_window)
+        self._bucket_checked = False
+        if not self.endpoint:
+            # MinIO is optional for local runs; stored image URLs are then served as they are
+            self.client = None
+            return
+        # Imported here: the SDK is slow to import and only needed once a worker touches MinIO
+        from minio import Minio
         self.client = Minio(
-            endpoint=os.getenv("MINIO_ENDPOINT"),
+            endpoint=self.endpoint,
             access_key=os.getenv("MINIO_ROOT_USER"),
             secret_key=os.getenv("MINIO_ROOT_PASSWORD"),
-            secure=False  # Disable SSL for local development
+            secure=False,  # Disable SSL for local development
+            # A known region avoids the bucket location lookup before signing a URL
+            region=os.getenv("MINIO_REGION", "us-east-1"),
+            http_client=urllib3.PoolManager(
+                maxsize=int(os.getenv("MINIO_POOL_SIZE", 10)),
+                timeout=urllib3.Timeout(connect=5, read=30),
+                retries=urllib3.Retry(total=3, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]),
+            ),
         )
-        self.bucket_name = os.getenv("MINIO_BUCKET_NAME")
-        
-        # Ensure the bucket exists
+
+    def ensure_bucket(self):
+        """
+        Ensure the bucket exists; checked once per process, on the first upload.
+        """
+        if self._bucket_checked:
+            return
+        if self.client is None:
+            raise Exception("MinIO is not configured (MINIO_ENDPOINT is not set).")
+        from minio.error import S3Error
         try:
             if not self.client.bucket_exists(self.bucket_name):
                 self.client.make_bucket(self.bucket_name)
+            self._bucket_checked = True
         except S3Error as e:
             raise Exception(f"Error checking or creating bucket: {str(e)}")
 
-    def upload_image(self, file):
+    def is_available(self):
+        """
+        Whether MinIO answers and the bucket exists, for the readiness check.
+        """
+        if self.client is None:
+            return False
         try:
-            # Secure the filename
-            filename = secure_filename(file.filename)
+            return self.client.bucket_exists(self.bucket_name)
+        except Exception:
+            return False
 
-            # Open the image using Pillow
-            img = Image.open(file)
-            
-            # Resize the image if necessary (example: max 1024x1024)
-            max_size = (1024, 1024)
-            img.thumbnail(max_size)
+    def object_exists(self, object_name):
+        """
+        Check whether an object is already stored in the bucket.
+        """
+        self.ensure_bucket()
+        from minio.error import S3Error
+        try:
+            self.client.stat_object(self.bucket_name, object_name)
+            return True
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchObject"):
+                return False
+            raise
 
-            # Save the resized image to a BytesIO object
-            img_byte_array = BytesIO()
-            img_format = img.format if img.format else "PNG"  # Default to PNG if format is unknown
-            img.save(img_byte_array, format=img_format)
-            img_byte_array.seek(0)
+    def upload_bytes(self, object_name, data, content_type):
+        """
+        Upload an in-memory object to the bucket.
+        """
+        self.ensure_bucket()
+        self.client.put_object(
+            bucket_name=self.bucket_name,
+            object_name=object_name,
+            data=BytesIO(data),
+            length=len(data),
+            content_type=content_type,
+        )
+        self._urls.pop(object_name)
 
-            # Upload the resized image to MinIO
-            self.client.put_object(
-                bucket_name=self.bucket_name,
-                object_name=filename,
-                data=img_byte_array,
-                length=img_byte_array.getbuffer().nbytes,
-                content_type=f'image/{img_format.lower()}',
-            )
+    def open_object(self, object_name):
+        """
+        Open an object for streaming. The caller must `close()` and `release_conn()` the response.
+        """
+        if self.client is None:
+            raise Exception("MinIO is not configured (MINIO_ENDPOINT is not set).")
+        return self.client.get_object(self.bucket_name, object_name)
 
-            # Generate the pre-signed URL for private access to the uploaded image
-            expires_duration = timedelta(seconds=3600)
-            presigned_url = self.client.presigned_get_object(
-                bucket_name=self.bucket_name,
-                object_name=filename,
-                expires=expires_duration,  # URL valid for 1 hour
-            )
+    def list_prefixes(self, prefix):
+        """
+        Return the "directories" directly under `prefix`, each ending with a slash.
+        """
+        self.ensure_bucket()
+        return [obj.object_name for obj in self.client.list_objects(self.bucket_name, prefix=prefix) if obj.is_dir]
 
-            # Generate the URL for the uploaded image
-            public_url = f"http://{os.getenv('MINIO_ENDPOINT')}/{self.bucket_name}/{filename}"
-            
-            return {
-                "success": True,
-                "url": public_url,
-                "presigned_url": presigned_url,
-            }
+    def remove_prefix(self, prefix):
+        """
+        Delete every object whose name starts with `prefix` and return how many there were.
+        """
+        self.ensure_bucket()
+        from minio.deleteobjects import DeleteObject
+        names = [obj.object_name for obj in self.client.list_objects(self.bucket_name, prefix=prefix, recursive=True)]
+        errors = list(self.client.remove_objects(self.bucket_name, (DeleteObject(name) for name in names)))
+        if errors:
+            raise Exception(f"Error deleting {len(errors)} objects under {prefix}: {errors[0]}")
+        for name in names:
+            self._urls.pop(name)
+        return len(names)
 
-        except S3Error as e:
-            return {"success": False, "error": f"S3 Error: {str(e)}"}
-        except Exception as e:
-            return {"success": False, "error": f"Unexpected Error: {str(e)}"}
+    def presigned_url(self, object_name):
+        """
+        Return a presigned GET URL for the object, reusing the one cached for the current signing window.
+        Signing is done locally, so a cache miss doesn't call MinIO either.
+        """
+        window_start = self.url_window_start()
+        cached = self._urls.get(object_name)
+        if cached is not None and cached[0] == window_start:
+            return cached[1]
+        url = self.client.presigned_get_object(
+            bucket_name=self.bucket_name,
+            object_name=object_name,
+            expires=timedelta(seconds=self.url_expiry),
+            request_date=window_start,
+        )
+        self._urls.set(object_name, (window_start, url))
+        return url
+
+    def url_window_start(self):
+        """
+        Start of the current signing window; presigned URLs change only when it does.
+        None when MinIO is not configured (stored URLs are served unchanged).
+        """
+        if self.client is None:
+            return None
+        now = int(time.time())
+        return datetime.fromtimestamp(now - now % self.url_window, tz=timezone.utc)
+
+    def avatar_url(self, image_url):
+        """
+        Turn a stored `image_url` into a URL the client can load.
+        URLs of objects in our bucket are presigned; anything else is returned unchanged.
+        """
+        prefix = self.public_url("")
+        if not image_url or not self.endpoint or not image_url.startswith(prefix):
+            return image_url
+        return self.presigned_url(image_url[len(prefix):])
+
+    @staticmethod
+    def public_url(object_name):
+        """
+        Build the URL for an object of the bucket (no MinIO call needed).
+        """
+        return f"http://{os.getenv('MINIO_ENDPOINT')}/{os.getenv('MINIO_BUCKET_NAME')}/{object_name}"
@@ -0,0 +1,117 @@
+from sqlalchemy.exc import SQLAlchemyError
+from src.models.conversation import Conversation, conversation_member
+from src.models.user import User
+
+class ConversationService:
+    def __init__(self, db, app):
+        self.db = db
+        self.app = app
+
+    def get_conversations(self, user_id):
+        """
+        Retrieve the conversations the user is a member of.
+        """
+        conversations = (
+            Conversation.query
+            .join(conversation_member, conversation_member.c.conversation_id == Conversation.id)
+            .filter(conversation_member.c.user_id == user_id)
+            .order_by(Conversation.id.asc())
+            .all()
+        )
+        return [conversation.to_dict() for conversation in conversations]
+
+    def get_conversation_ids(self, user_id):
+        """
+        Retrieve only the ids of the user's conversations (used to join rooms on connect).
+        """
+        rows = (
+            self.db.session.query(conversation_member.c.conversation_id)
+            .filter(conversation_member.c.user_id == user_id)
+            .all()
+        )
+        return [conversation_id for (conversation_id,) in rows]
+
+    def get_member_ids(self, conversation_id):
+        """
+        Retrieve the user ids of a conversation's members.
+        """
+        rows = (
+            self.db.session.query(conversation_member.c.user_id)
+            .filter(conversation_member.c.conversation_id == conversation_id)
+            .all()
+        )
+        return [user_id for (user_id,) in rows]
+
+    def get_contact_usernames(self, user_id, limit):
+        """
+        Retrieve the usernames of up to `limit` users sharing a conversation with the user, in username order.
+        """
+        conversation_ids = (
+            self.db.session.query(conversation_member.c.conversation_id)
+            .filter(conversation_member.c.user_id == user_id)
+        )
+        rows = (
+            self.db.session.query(User.username)
+            .join(conversation_member, conversation_member.c.user_id == User.id)
+            .filter(conversation_member.c.conversation_id.in_(conversation_ids), User.id != user_id)
+            .distinct()
+            .order_by(User.username.asc())
+            .limit(limit)
+            .all()
+        )
+        return [username for (username,) in rows]
+
+    def is_member(self, conversation_id, user_id):
+        """
+        Check whether the user belongs to the conversation.
+        The public lobby (`None`) is open to every user.
+        """
+        if conversation_id is None:
+            return True
+        return self.db.session.query(
+            self.db.session.query(conversation_member)
+            .filter_by(conversation_id=conversation_id, user_id=user_id)
+            .exists()
+        ).scalar()
+
+    def create_direct(self, user_id, other_username):
+        """
+        Get or create the direct conversation between two users.
+        """
+        user = self.db.session.get(User, user_id)
+        other = User.query.filter_by(username=other_username).first()
+        if not other:
+            return None, "User not found."
+        if other.id == user.id:
+            return None, "Cannot start a conversation with yourself."
+
+        direct_key = Conversation.make_direct_key(user.id, other.id)
+        conversation = Conversation.query.filter_by(direct_key=direct_key).first()
+        if conversation:
+            return conversation, "Conversation already exists."
+        conversation = Conversation(is_group=False, direct_key=direct_key, members=[user, other])
+        return self._save(conversation)
+
+    def create_group(self, user_id, name, member_usernames):
+        """
+        Create a group conversation owned by the user with the given members.
+        """
+        if not name:
+            return None, "Group name is required."
+        user = self.db.session.get(User, user_id)
+        usernames = set(member_usernames or []) - {user.username}
+        members = User.query.filter(User.username.in_(usernames)).all() if usernames else []
+        if len(members) != len(usernames):
+            return None, "One or more members were not found."
+        conversation = Conversation(is_group=True, name=name, members=[user, *members])
+        return self._save(conversation)
+
+    def _save(self, conversation):
+        try:
+            self.db.session.add(conversation)
+            self.db.session.commit()
+            return conversation, "Conversation created successfully."
+        except SQLAlchemyError as e:
+            self.db.session.rollback()
+            self.app.logger.error(f"Error creating conversation: {str(e)}")
+            return None, "An error occurred while creating the conversation."
@@ -0,0 +1,130 @@
+import atexit
+import queue
+import threading
+import time
+from src.helpers.metrics import registry
+
+EMAILS = registry.counter('chat_emails_total', 'Emails handled by the delivery queue, by outcome', ('result',))
+SEND_SECONDS = registry.histogram('chat_email_send_seconds', 'Time spent handing one email to the SMTP server')
+
+_STOP = object()
+
+
+class EmailQueue:
+    """
+    Background delivery queue for outgoing email.
+    Each worker keeps its SMTP connection open across messages, closes it after
+    `idle_timeout` seconds without mail, and retries failed sends with exponential backoff.
+    With MAIL_ASYNC the workers start with the first email, so booting never waits on SMTP.
+    """
+    def __init__(self, app=None, workers=2, max_retries=3, backoff=1.0, idle_timeout=30.0):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self._queue = queue.Queue()
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self.autostart = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get('MAIL_QUEUE_WORKERS', self.workers)
+        self.max_retries = app.config.get('MAIL_MAX_RETRIES', self.max_retries)
+        self.backoff = app.config.get('MAIL_RETRY_BACKOFF', self.backoff)
+        self.idle_timeout = app.config.get('MAIL_IDLE_TIMEOUT', self.idle_timeout)
+        self.autostart = bool(app.config.get('MAIL_ASYNC'))
+        registry.gauge('chat_email_queue_depth', 'Emails waiting to be sent').set_function(self._queue.qsize)
+        app.extensions['email_queue'] = self
+
+    def start(self):
+        """
+        Start the worker pool. Emails still queued at exit are delivered before the process stops.
+        """
+        with self._start_lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"email-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        atexit.register(self.close)
+
+    def enqueue(self, msg):
+        """
+        Queue a flask_mail Message and return immediately.
+        Returns False when the queue is not running, so the caller sends the email itself.
+        """
+        if not self._threads:
+            if not self.autostart:
+                return False
+            self.start()
+        self._queue.put(msg)
+        EMAILS.labels('queued').inc()
+        return True
+
+    def close(self, timeout=10.0):
+        """
+        Deliver what is left in the queue, then stop the workers.
+        """
+        threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(_STOP)
+        for thread in threads:
+            thread.join(timeout)
+
+    def _work(self):
+        connection = None
+        try:
+            while True:
+                try:
+                    msg = self._queue.get(timeout=self.idle_timeout)
+                except queue.Empty:
+                    connection = self._close_connection(connection)
+                    continue
+                if msg is _STOP:
+                    break
+                connection = self._deliver(msg, connection)
+        finally:
+            self._close_connection(connection)
+
+    def _deliver(self, msg, connection):
+        for attempt in range(self.max_retries + 1):
+            try:
+                if connection is None:
+                    connection = self._open_connection()
+                start = time.perf_counter()
+                with self.app.app_context():
+                    connection.send(msg)
+                SEND_SECONDS.observe(time.perf_counter() - start)
+                EMAILS.labels('sent').inc()
+                return connection
+            except Exception as e:
+                # The connection may be broken; start from a fresh one on the next attempt
+                connection = self._close_connection(connection)
+                if attempt == self.max_retries:
+                    EMAILS.labels('failed').inc()
+                    self.app.logger.error(f"Failed to send email to {msg.recipients} after {attempt + 1} attempts: {e}")
+                    return None
+                EMAILS.labels('retried').inc()
+                delay = self.backoff * (2 ** attempt)
+                self.app.logger.warning(f"Email to {msg.recipients} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+        return connection
+
+    def _open_connection(self):
+        mail = self.app.extensions.get('mail')
+        if not mail:
+            raise RuntimeError("Mail extension is not initialized in the app.")
+        with self.app.app_context():
+            return mail.connect().__enter__()
+
+    def _close_connection(self, connection):
+        if connection is not None:
+            try:
+                connection.__exit__(None, None, None)
+            except Exception as e:
+                self.app.logger.warning(f"Error closing SMTP connection: {e}")
+        return None
@@ -16,10 +16,14 @@ class EmailService:
         :param recipients: List of recipient email addresses.
         :param body: Plain text body of the email.
         :param html: HTML content of the email (optional).
-        :return: True if email sent successfully, False otherwise.
+        :return: True if email was queued or sent successfully, False otherwise.
         """
         try:
             msg = Message(subject, recipients=recipients, body=body, html=html)
+            # Hand the message to the background queue when it is running, so the request doesn't wait on SMTP
+            email_queue = self.app.extensions.get('email_queue')
+            if email_queue and email_queue.enqueue(msg):
+                return True
             mail = self.app.extensions.get('mail')
             if not mail:
                 raise RuntimeError("Mail extension is not initialized in the app.")
@@ -0,0 +1,130 @@
+import atexit
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from src.database import db
+from src.helpers.image_processing import content_hash, render_variants
+from src.helpers.metrics import registry
+from src.models.image_job import ImageJob
+from src.models.user import User
+from src.services.bucket_service import BucketService
+
+IMAGE_JOBS = registry.counter('chat_image_jobs_total', 'Avatar uploads handled by the image pipeline, by outcome', ('result',))
+PROCESS_SECONDS = registry.histogram('chat_image_process_seconds', 'Time spent decoding and resizing one upload')
+
+
+class ImagePipeline:
+    """
+    Processes avatar uploads outside of the request.
+    Decoding and resizing run in a pool of worker processes; uploading the variants to MinIO
+    and updating `User.image_url` run in a small thread pool. Variants are stored under
+    `avatars/<sha256>/<size>.<ext>`, so an image that was already processed is never uploaded twice.
+    """
+    def __init__(self, app=None, workers=2, sizes=(64, 256, 1024), avatar_size=256):
+        self.workers = workers
+        self.sizes = tuple(sizes)
+        self.avatar_size = avatar_size
+        self._processes = None
+        self._threads = None
+        self._lock = threading.Lock()  # Guards creating and closing the pools
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get('IMAGE_WORKERS', self.workers)
+        self.sizes = tuple(app.config.get('IMAGE_SIZES', self.sizes))
+        self.avatar_size = app.config.get('IMAGE_AVATAR_SIZE', self.avatar_size)
+        app.extensions['image_pipeline'] = self
+
+    def submit(self, user_id, data):
+        """
+        Register an upload and return its job right away.
+        An image identical to an earlier successful upload reuses its variants without any processing.
+        """
+        digest = content_hash(data)
+        previous = (
+            ImageJob.query
+            .filter_by(content_hash=digest, status=ImageJob.DONE)
+            .order_by(ImageJob.created_at.desc())
+            .first()
+        )
+        if previous:
+            job = ImageJob(user_id=user_id, content_hash=digest, status=ImageJob.DONE, variants=previous.variants)
+            db.session.add(job)
+            self._set_avatar(user_id, previous.variants)
+            db.session.commit()
+            IMAGE_JOBS.labels('deduplicated').inc()
+            return job
+
+        job = ImageJob(user_id=user_id, content_hash=digest)
+        db.session.add(job)
+        db.session.commit()
+        self._start().submit(self._run, job.id, user_id, digest, data)
+        return job
+
+    def get_job(self, job_id, user_id):
+        """
+        Retrieve one of the user's jobs, so the client can poll its status.
+        """
+        return ImageJob.query.filter_by(id=job_id, user_id=user_id).first()
+
+    def close(self):
+        with self._lock:
+            threads, processes = self._threads, self._processes
+            self._threads = self._processes = None
+        if threads is not None:
+            threads.shutdown(wait=True)
+            processes.shutdown(wait=True)
+
+    def _start(self):
+        """
+        Create the pools on first use, so processes that never receive an upload don't pay for them,
+        and return the thread pool. Concurrent first uploads share the same pools.
+        """
+        with self._lock:
+            if self._threads is None:
+                self._processes = ProcessPoolExecutor(self.workers)
+                self._threads = ThreadPoolExecutor(self.workers, thread_name_prefix='image-pipeline')
+                atexit.register(self.close)
+            return self._threads
+
+    def _run(self, job_id, user_id, digest, data):
+        with self.app.app_context():
+            try:
+                self._update_job(job_id, status=ImageJob.PROCESSING)
+                start = time.perf_counter()
+                img_format, rendered = self._processes.submit(render_variants, data, self.sizes).result()
+                PROCESS_SECONDS.observe(time.perf_counter() - start)
+
+                bucket_service = BucketService()
+                extension = "jpg" if img_format == "JPEG" else img_format.lower()
+                variants = {}
+                for size, content in rendered.items():
+                    object_name = f"avatars/{digest}/{size}.{extension}"
+                    if not bucket_service.object_exists(object_name):
+                        bucket_service.upload_bytes(object_name, content, f"image/{img_format.lower()}")
+                    variants[str(size)] = object_name
+
+                self._set_avatar(user_id, variants)
+                self._update_job(job_id, status=ImageJob.DONE, variants=variants)
+                IMAGE_JOBS.labels('done').inc()
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.error(f"Error processing image job {job_id}: {str(e)}")
+                self._update_job(job_id, status=ImageJob.FAILED, error=str(e)[:255])
+                IMAGE_JOBS.labels('failed').inc()
+            finally:
+                db.session.remove()
+
+    def _update_job(self, job_id, **values):
+        db.session.query(ImageJob).filter_by(id=job_id).update(values)
+        db.session.commit()
+
+    def _set_avatar(self, user_id, variants):
+        """
+        Point the user's avatar at the variant served in profiles (committed by the caller).
+        """
+        object_name = variants.get(str(self.avatar_size)) or variants[max(variants, key=int)]
+        user = db.session.get(User, user_id)
+        user.image_url = BucketService.public_url(object_name)
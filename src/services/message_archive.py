@@ -0,0 +1,263 @@
+import gzip
+import json
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import tuple_
+from src.helpers.metrics import registry
+from src.helpers.ttl_cache import TTLCache
+from src.models.conversation import Conversation
+from src.models.message import Message
+from src.models.message_segment import MessageSegment
+from src.models.user import User
+from src.services.bucket_service import BucketService
+
+MESSAGES_ARCHIVED = registry.counter(
+    'chat_messages_archived_total', 'Messages moved from the message table to archive segments')
+SEGMENT_READ_SECONDS = registry.histogram(
+    'chat_message_segment_read_seconds', 'Time spent downloading and decoding one archive segment')
+SEGMENT_READ_FAILURES = registry.counter(
+    'chat_message_segment_read_failures_total', 'Archive segments that could not be read from MinIO')
+SEGMENTS_PURGED = registry.counter(
+    'chat_message_segments_purged_total', 'Archive objects deleted because their conversation was removed')
+
+# Same fields, in the same order, as the rows of the history query
+ArchivedMessage = namedtuple('ArchivedMessage', ['id', 'timestamp', 'content', 'username'])
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Objects of a conversation's segments live under messages/<scope>/
+SEGMENT_PREFIX = 'messages/'
+CONVERSATION_SCOPE = 'conversation-'
+
+
+class ArchiveUnavailable(Exception):
+    """
+    An archive segment the page needs could not be read from MinIO.
+    """
+
+
+class MessageArchive:
+    """
+    Cold tier of the message history.
+    Messages older than MESSAGE_ARCHIVE_AFTER_DAYS are moved, per conversation and time bucket of
+    MESSAGE_ARCHIVE_SEGMENT_HOURS, into gzipped JSON-lines objects in the MinIO bucket, listed in
+    the `message_segment` manifest. Segments are written oldest first, so in every conversation all
+    archived messages sort before all messages still in the table; history reads continue into the
+    segments once they run past the oldest row of the table.
+    Decoded segments are immutable and kept in a small LRU cache, since scrolling back reads them repeatedly.
+    """
+
+    def __init__(self, db, app):
+        self.db = db
+        self.app = app
+        self.after_days = app.config.get('MESSAGE_ARCHIVE_AFTER_DAYS', 90)
+        self.segment_span = timedelta(hours=app.config.get('MESSAGE_ARCHIVE_SEGMENT_HOURS', 24))
+        self.segment_max = app.config.get('MESSAGE_ARCHIVE_SEGMENT_MAX', 5000)
+        if 'message_segment_cache' not in app.extensions:
+            app.extensions['message_segment_cache'] = TTLCache(
+                'message_segment', maxsize=app.config.get('MESSAGE_ARCHIVE_CACHE_SIZE', 32), ttl=3600)
+        self._cache = app.extensions['message_segment_cache']
+
+    @staticmethod
+    def is_enabled(app):
+        """
+        Segments can only exist, and be read, when MinIO is configured.
+        """
+        return bool(app.config.get('MINIO_ENDPOINT'))
+
+    @staticmethod
+    def _scope(conversation_id):
+        return "lobby" if conversation_id is None else f"{CONVERSATION_SCOPE}{conversation_id}"
+
+    # Writing
+
+    def cutoff(self, now=None):
+        """
+        Messages before this time are archived. It is aligned on a bucket boundary so only full buckets are archived.
+        """
+        return self._bucket_start((now or datetime.utcnow()) - timedelta(days=self.after_days))
+
+    def _bucket_start(self, timestamp):
+        span = self.segment_span.total_seconds()
+        return _EPOCH + timedelta(seconds=(timestamp - _EPOCH).total_seconds() // span * span)
+
+    def archive_next(self, conversation_id, cutoff):
+        """
+        Move the oldest archivable messages of a conversation (at most one bucket and MESSAGE_ARCHIVE_SEGMENT_MAX
+        messages) into a new segment. The upload happens first, then the manifest row and the deletion commit
+        together; a crash in between leaves an orphan object that the next run overwrites.
+
+        :return: The number of messages archived (0 when nothing is left before `cutoff`).
+        """
+        in_conversation = (
+            Message.conversation_id.is_(None) if conversation_id is None else Message.conversation_id == conversation_id
+        )
+        oldest = (
+            self.db.session.query(Message.timestamp)
+            .filter(in_conversation, Message.timestamp < cutoff)
+            .order_by(Message.timestamp.asc(), Message.id.asc())
+            .first()
+        )
+        if oldest is None:
+            return 0
+        bucket_start = self._bucket_start(oldest.timestamp)
+        bucket_end = min(bucket_start + self.segment_span, cutoff)
+        rows = (
+            self.db.session.query(Message.id, Message.timestamp, Message.content, User.username)
+            .join(User, Message.user_id == User.id)
+            .filter(in_conversation, Message.timestamp >= bucket_start, Message.timestamp < bucket_end)
+            .order_by(Message.timestamp.asc(), Message.id.asc())
+            .limit(self.segment_max)
+            .all()
+        )
+        first, last = rows[0], rows[-1]
+        data = self.encode_segment(rows)
+        object_name = f"{SEGMENT_PREFIX}{self._scope(conversation_id)}/{bucket_start:%Y/%m/%d/%H%M}-{first.id}-{last.id}.jsonl.gz"
+        BucketService().upload_bytes(object_name, data, "application/gzip")
+
+        self.db.session.add(MessageSegment(
+            conversation_id=conversation_id,
+            bucket_start=bucket_start,
+            first_timestamp=first.timestamp,
+            first_id=first.id,
+            last_timestamp=last.timestamp,
+            last_id=last.id,
+            message_count=len(rows),
+            object_name=object_name,
+            size=len(data),
+        ))
+        (
+            self.db.session.query(Message)
+            .filter(
+                in_conversation,
+                Message.timestamp >= bucket_start,
+                tuple_(Message.timestamp, Message.id) <= tuple_(last.timestamp, last.id),
+            )
+            .delete(synchronize_session=False)
+        )
+        self.db.session.commit()
+        MESSAGES_ARCHIVED.inc(len(rows))
+        return len(rows)
+
+    def archive(self, now=None, pause=0.0, sleep=time.sleep):
+        """
+        Archive every message older than the cutoff, one segment per transaction.
+
+        :return: The number of messages archived.
+        """
+        cutoff = self.cutoff(now)
+        conversation_ids = [None] + [conversation_id for (conversation_id,) in self.db.session.query(Conversation.id)]
+        total = 0
+        for conversation_id in conversation_ids:
+            while True:
+                archived = self.archive_next(conversation_id, cutoff)
+                if not archived:
+                    break
+                total += archived
+                sleep(pause)
+        return total
+
+    def purge_deleted(self):
+        """
+        Delete the segments of conversations that no longer exist: their manifest rows (the foreign key
+        cascade does it on PostgreSQL, SQLite doesn't enforce it) and their objects in MinIO.
+
+        :return: The number of objects deleted.
+        """
+        conversations = self.db.session.query(Conversation.id)
+        (
+            self.db.session.query(MessageSegment)
+            .filter(MessageSegment.conversation_id.isnot(None), MessageSegment.conversation_id.notin_(conversations))
+            .delete(synchronize_session=False)
+        )
+        self.db.session.commit()
+        existing = {str(conversation_id) for (conversation_id,) in conversations}
+        bucket_service = BucketService()
+        removed = 0
+        for prefix in bucket_service.list_prefixes(SEGMENT_PREFIX):
+            scope = prefix[len(SEGMENT_PREFIX):].rstrip('/')
+            if scope.startswith(CONVERSATION_SCOPE) and scope[len(CONVERSATION_SCOPE):] not in existing:
+                removed += bucket_service.remove_prefix(prefix)
+        SEGMENTS_PURGED.inc(removed)
+        return removed
+
+    @staticmethod
+    def encode_segment(rows):
+        lines = (
+            json.dumps({"id": row.id, "timestamp": row.timestamp.isoformat(), "content": row.content, "username": row.username})
+            for row in rows
+        )
+        return gzip.compress("\n".join(lines).encode("utf-8"), compresslevel=9, mtime=0)
+
+    # Reading
+
+    def read_segment(self, segment):
+        """
+        Return the messages of a segment, oldest first, streaming and decompressing the object on a cache miss.
+
+        :raises ArchiveUnavailable: If the object can't be downloaded or decoded.
+        """
+        messages = self._cache.get(segment.object_name)
+        if messages is not None:
+            return messages
+        start = time.perf_counter()
+        try:
+            response = BucketService().open_object(segment.object_name)
+            try:
+                with gzip.GzipFile(fileobj=response) as stream:
+                    messages = [self._decode(line) for line in stream if line.strip()]
+            finally:
+                response.close()
+                response.release_conn()
+        except Exception as e:
+            SEGMENT_READ_FAILURES.inc()
+            raise ArchiveUnavailable(f"Error reading archive segment {segment.object_name}: {e}") from e
+        SEGMENT_READ_SECONDS.observe(time.perf_counter() - start)
+        self._cache.set(segment.object_name, messages)
+        return messages
+
+    @staticmethod
+    def _decode(line):
+        row = json.loads(line)
+        return ArchivedMessage(row["id"], datetime.fromisoformat(row["timestamp"]), row["content"], row["username"])
+
+    def _segments(self, conversation_id):
+        return self.db.session.query(MessageSegment).filter(
+            MessageSegment.conversation_id.is_(None) if conversation_id is None
+            else MessageSegment.conversation_id == conversation_id
+        )
+
+    def read_older(self, conversation_id, before=None, count=50):
+        """
+        Return up to `count` archived messages older than the `before` (timestamp, id) key, newest first.
+        """
+        query = self._segments(conversation_id)
+        if before is not None:
+            query = query.filter(tuple_(MessageSegment.first_timestamp, MessageSegment.first_id) < tuple_(*before))
+        messages = []
+        for segment in query.order_by(MessageSegment.last_timestamp.desc(), MessageSegment.last_id.desc()):
+            for message in reversed(self.read_segment(segment)):
+                if before is None or (message.timestamp, message.id) < tuple(before):
+                    messages.append(message)
+                    if len(messages) >= count:
+                        return messages
+        return messages
+
+    def read_newer(self, conversation_id, after, before=None, count=50):
+        """
+        Return up to `count` archived messages newer than the `after` key (and older than `before`), oldest first.
+        """
+        query = self._segments(conversation_id).filter(
+            tuple_(MessageSegment.last_timestamp, MessageSegment.last_id) > tuple_(*after))
+        if before is not None:
+            query = query.filter(tuple_(MessageSegment.first_timestamp, MessageSegment.first_id) < tuple_(*before))
+        messages = []
+        for segment in query.order_by(MessageSegment.last_timestamp.asc(), MessageSegment.last_id.asc()):
+            for message in self.read_segment(segment):
+                key = (message.timestamp, message.id)
+                if key > tuple(after) and (before is None or key < tuple(before)):
+                    messages.append(message)
+                    if len(messages) >= count:
+                        return messages
+        return messages
@@ -0,0 +1,70 @@
+import time
+from sqlalchemy import text
+from src.helpers.metrics import registry
+from src.services.message_archive import MessageArchive
+
+ARCHIVE_SECONDS = registry.histogram(
+    'chat_message_archive_seconds', 'Duration of one full archiving run')
+
+# Key of the PostgreSQL advisory lock that keeps workers from archiving the same rows twice
+ARCHIVE_LOCK_KEY = 7245001
+
+
+class MessageArchiver:
+    """
+    Background task that moves old messages to archive segments every `interval` seconds.
+    Each segment is its own short transaction, with a pause in between, so the hot table is never
+    locked for long. On PostgreSQL an advisory lock lets only one worker archive at a time.
+    """
+    def __init__(self, app, db, interval=3600, pause=0.1):
+        self.app = app
+        self.db = db
+        self.interval = interval
+        self.pause = pause
+        self._sleep = time.sleep
+
+    def start(self, socketio):
+        """
+        Run the archiver with the server's async mode.
+        """
+        self._sleep = socketio.sleep
+        socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            self._sleep(self.interval)
+            try:
+                self.run_once()
+            except Exception as e:
+                self.app.logger.error(f"Error archiving messages: {e}")
+
+    def run_once(self, now=None):
+        """
+        Archive every message past the configured age and return how many were moved.
+        The segments of deleted conversations are purged in the same run.
+        """
+        start = time.perf_counter()
+        with self.app.app_context():
+            archive = MessageArchive(self.db, self.app)
+            if self.db.engine.dialect.name != 'postgresql':
+                total = self._archive(archive, now)
+            else:
+                with self.db.engine.connect() as lock:
+                    if not lock.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": ARCHIVE_LOCK_KEY}).scalar():
+                        self.app.logger.info("Another worker is archiving messages")
+                        return 0
+                    try:
+                        total = self._archive(archive, now)
+                    finally:
+                        lock.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ARCHIVE_LOCK_KEY})
+        ARCHIVE_SECONDS.observe(time.perf_counter() - start)
+        if total:
+            self.app.logger.info(f"Archived {total} messages")
+        return total
+
+    def _archive(self, archive, now):
+        total = archive.archive(now, self.pause, self._sleep)
+        purged = archive.purge_deleted()
+        if purged:
+            self.app.logger.info(f"Deleted {purged} archive objects of removed conversations")
+        return total
@@ -1,34 +1,144 @@
+from datetime import timedelta
+from sqlalchemy import or_, tuple_
+from src.helpers.pagination import encode_cursor, decode_cursor
 from src.models.message import Message
 from src.models.user import User
+from src.services.message_archive import MessageArchive
 
 class MessageService:
+    DEFAULT_PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 200
+
     def __init__(self, db, app):
         self.db = db
         self.app = app
         with self.app.app_context():
             self.secret_key = self.app.config.get('SECRET_KEY')
-        
-    def get_messages(self):
+
+    def get_messages(self, conversation_id=None, before=None, after=None, limit=DEFAULT_PAGE_SIZE):
+        """
+        Retrieve one page of a conversation's messages using keyset pagination over (timestamp, id).
+        Pages that reach past the oldest message of the table continue into the archive segments
+        (when MinIO is configured).
+
+        :param conversation_id: Conversation to read; `None` reads the public lobby.
+        :param before: Cursor; only return messages older than it.
+        :param after: Cursor; only return messages newer than it.
+        :param limit: Maximum number of messages in the page.
+        :return: A dict with the messages (oldest first) and the cursors of the page edges.
+        :raises InvalidCursor: If `before` or `after` cannot be decoded.
+        :raises ArchiveUnavailable: If the page needs an archive segment MinIO can't serve.
+        """
+        before_key = decode_cursor(before, 2) if before is not None else None
+        after_key = decode_cursor(after, 2) if after is not None else None
+        sort_key = tuple_(Message.timestamp, Message.id)
+        # Perform a JOIN between Message and User tables using user_id
+        query = (
+            self.db.session.query(Message.id, Message.timestamp, Message.content, User.username)
+            .join(User, Message.user_id == User.id) # INNER JOIN
+            .filter(Message.conversation_id.is_(None) if conversation_id is None else Message.conversation_id == conversation_id)
+        )
+        if after is not None:
+            # Walk forward from the cursor, oldest first
+            query = query.filter(sort_key > tuple_(*after_key))
+            if before is not None:
+                query = query.filter(sort_key < tuple_(*before_key))
+            query = query.order_by(Message.timestamp.asc(), Message.id.asc())
+        else:
+            # Walk backward from the cursor (or the newest message), newest first
+            if before is not None:
+                query = query.filter(sort_key < tuple_(*before_key))
+            query = query.order_by(Message.timestamp.desc(), Message.id.desc())
+
+        # Fetch one extra row to know whether another page exists
+        rows = query.limit(limit + 1).all()
+        # Without MinIO there are no segments to read
+        archive = MessageArchive(self.db, self.app) if MessageArchive.is_enabled(self.app) else None
+        if archive is not None and after is not None:
+            # Archived messages all sort before the table's, so they come first when walking forward
+            archived = archive.read_newer(conversation_id, after_key, before_key, limit + 1)
+            if archived:
+                rows = (archived + rows)[:limit + 1]
+        elif archive is not None and len(rows) <= limit:
+            # The table ran out: continue into the archive
+            rows += archive.read_older(conversation_id, before_key, limit + 1 - len(rows))
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if after is None:
+            rows.reverse()
+
+        # Transform the query result into a list of dictionaries
+        messages_list = [
+            {
+                "id": message_id,
+                "username": username,
+                "message": content,
+                "timestamp": timestamp.isoformat(),
+                "conversation_id": conversation_id,
+            }
+            for message_id, timestamp, content, username in rows
+        ]
+        first, last = (rows[0], rows[-1]) if rows else (None, None)
+        return {
+            "messages": messages_list,
+            "before": encode_cursor(first.timestamp, first.id) if first else before,
+            "after": encode_cursor(last.timestamp, last.id) if last else after,
+            "has_more": has_more,
+        }
+
+    def get_latest_key(self, conversation_id=None):
+        """
+        Return the (timestamp, id) of the newest message of a conversation, or None if it is empty.
+        Messages are never edited, so this validates every cached page of the conversation;
+        it is a single lookup on the pagination index.
         """
-        Retrieve all messages
+        row = (
+            self.db.session.query(Message.timestamp, Message.id)
+            .filter(Message.conversation_id.is_(None) if conversation_id is None else Message.conversation_id == conversation_id)
+            .order_by(Message.timestamp.desc(), Message.id.desc())
+            .first()
+        )
+        return tuple(row) if row else None
+
+    def get_messages_since(self, last_message_id, conversation_ids, include_lobby=True, limit=500, overlap=30.0):
+        """
+        Retrieve the messages posted after `last_message_id` in the given conversations (and the lobby),
+        oldest first. Used to catch a reconnecting socket up.
+        Ids are not assigned in commit order (concurrent transactions, ids reserved in blocks by the
+        write-behind writers of other workers), so the range is taken on the (timestamp, id) key and
+        starts `overlap` seconds before the last seen message; clients drop the duplicates by id.
+
+        :param last_message_id: Id of the last message the client has seen.
+        :param conversation_ids: Conversations the client belongs to.
+        :param include_lobby: Also return messages of the public lobby.
+        :param limit: Maximum number of messages to return.
+        :param overlap: Seconds re-sent before the last seen message, covering late commits.
+        :return: A tuple (messages, has_more); `has_more` means the client missed more than `limit` messages,
+            or that its last message is unknown (archived or not written yet), so it must reload over REST.
         """
-        try:
-            # Perform a JOIN between Message and User tables using user_id
-            results = (
-                self.db.session.query(Message.content, User.username)
-                .join(User, Message.user_id == User.id) # INNER JOIN
-                .order_by(Message.timestamp.asc())
-                .all()
-            )
-            # Transform the query result into a list of dictionaries
-            messages_list = [
-                {"username": username, "message": content}
-                for content, username in results
-            ]
-            
-            # Return the list (no need for jsonify here in the service layer)
-            return messages_list
-        except Exception as e:
-            print(f"Error retrieving messages: {e}")
-            return []
-        
\ No newline at end of file
+        anchor = self.db.session.query(Message.timestamp).filter(Message.id == last_message_id).first()
+        if anchor is None:
+            return [], True
+        scope = Message.conversation_id.in_(list(conversation_ids))
+        if include_lobby:
+            scope = or_(Message.conversation_id.is_(None), scope)
+        rows = (
+            self.db.session.query(Message.id, Message.timestamp, Message.content, Message.conversation_id, User.username)
+            .join(User, Message.user_id == User.id)
+            .filter(Message.timestamp >= anchor.timestamp - timedelta(seconds=overlap), Message.id != last_message_id, scope)
+            .order_by(Message.timestamp.asc(), Message.id.asc())
+            .limit(limit + 1)
+            .all()
+        )
+        has_more = len(rows) > limit
+        messages_list = [
+            {
+                "id": message_id,
+                "username": username,
+                "message": content,
+                "timestamp": timestamp.isoformat(),
+                "conversation_id": conversation_id,
+            }
+            for message_id, timestamp, content, conversation_id, username in rows[:limit]
+        ]
+        return messages_list, has_more
@@ -0,0 +1,208 @@
+import atexit
+import json
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from sqlalchemy import func, insert, text
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from src.helpers.metrics import registry
+from src.models.message import Message
+
+FLUSH_SECONDS = registry.histogram(
+    'chat_message_flush_seconds', 'Time spent writing one batch of messages to the database')
+BATCH_SIZE = registry.histogram(
+    'chat_message_flush_batch_size', 'Number of messages written per batch',
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000))
+FLUSH_FAILURES = registry.counter(
+    'chat_message_flush_failures_total', 'Batches that failed to be written as a whole')
+DEAD_LETTERED = registry.counter(
+    'chat_messages_dead_lettered_total', 'Messages given up on after failing to be written, by reason', ('reason',))
+
+
+class MessageIdAllocator:
+    """
+    Hands out message ids ahead of the INSERT so messages can be broadcast before they are written.
+    On PostgreSQL ids are reserved from the table's sequence in blocks; on other databases
+    (e.g. SQLite for local runs) they continue from MAX(id), which is only safe with a single worker.
+    """
+    def __init__(self, db, block_size):
+        self.db = db
+        self.block_size = block_size
+        self._ids = deque()
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def next_id(self):
+        with self._lock:
+            if not self._ids:
+                self._ids.extend(self._reserve())
+            return self._ids.popleft()
+
+    def _reserve(self):
+        if self.db.engine.dialect.name == 'postgresql':
+            rows = self.db.session.execute(
+                text("SELECT nextval(pg_get_serial_sequence('message', 'id')) FROM generate_series(1, :n)"),
+                {"n": self.block_size},
+            )
+            return [row[0] for row in rows]
+        start = max(self._last, self.db.session.query(func.max(Message.id)).scalar() or 0)
+        self._last = start + self.block_size
+        return range(start + 1, self._last + 1)
+
+
+class MessageWriter:
+    """
+    Write-behind buffer for chat messages.
+    Messages are queued in memory and written with one multi-row INSERT per batch,
+    either when `batch_size` messages are pending or every `flush_interval` seconds.
+    When a batch fails, its rows are written one by one so a single bad row can't hold back the others.
+    Rows rejected by the database, or still failing after `max_retries` flushes (e.g. while it is down),
+    are logged in full to the `dead_letter` logger and dropped from the queue.
+    """
+    def __init__(self, app, db, batch_size=100, flush_interval=0.05, max_pending=10000, max_retries=20):
+        self.app = app
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.ids = MessageIdAllocator(db, batch_size)
+        self.dead_letter = app.logger.getChild('dead_letter')
+        self._pending = []
+        self._attempts = {}  # Map of message ids to failed writes, for rows re-queued at least once
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = None
+        self._closed = False
+        registry.gauge('chat_message_pending', 'Messages queued but not yet written').set_function(self.pending)
+
+    def start(self, socketio):
+        """
+        Start the background flusher using the server's async mode and make sure
+        pending messages are written when the process exits.
+        """
+        self._wake = socketio.server.eio.create_event()
+        socketio.start_background_task(self._run)
+        atexit.register(self.close)
+        # SIGTERM skips atexit by default; turn it into a normal exit so the last batch is flushed
+        if threading.current_thread() is threading.main_thread() and signal.getsignal(signal.SIGTERM) is signal.SIG_DFL:
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    def pending(self):
+        return len(self._pending)
+
+    def submit(self, user_id, conversation_id, content):
+        """
+        Queue a message and return its row (with id and timestamp) so it can be broadcast right away.
+        """
+        row = {
+            "id": self.ids.next_id(),
+            "user_id": user_id,
+            "conversation_id": conversation_id,
+            "content": content,
+            "timestamp": datetime.utcnow(),
+        }
+        with self._lock:
+            self._pending.append(row)
+            pending = len(self._pending)
+        if pending >= self.max_pending or self._wake is None:
+            # Backpressure: the database is not keeping up, write in the caller
+            self.flush()
+        elif pending >= self.batch_size:
+            self._wake.set()
+        return row
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                self.app.logger.error(f"Error in message flusher: {e}")
+
+    def flush(self):
+        """
+        Write every pending message. Rows of a failed batch are retried one by one.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            start = time.perf_counter()
+            with self.app.app_context():
+                try:
+                    self.db.session.execute(insert(Message), batch)
+                    self.db.session.commit()
+                except SQLAlchemyError as e:
+                    self.db.session.rollback()
+                    FLUSH_FAILURES.inc()
+                    self.app.logger.error(f"Error writing {len(batch)} messages: {e}")
+                    return self._write_rows(batch)
+            self._forget(batch)
+            FLUSH_SECONDS.observe(time.perf_counter() - start)
+            BATCH_SIZE.observe(len(batch))
+            return len(batch)
+
+    def _write_rows(self, batch):
+        """
+        Write the rows of a failed batch separately; return how many were written.
+        """
+        written = 0
+        retry = []
+        for index, row in enumerate(batch):
+            try:
+                self.db.session.execute(insert(Message), [row])
+                self.db.session.commit()
+                written += 1
+                self._forget([row])
+            except OperationalError as e:
+                # The database is unreachable: don't try the other rows now
+                self.db.session.rollback()
+                retry = batch[index:]
+                self.app.logger.error(f"Database unavailable, {len(retry)} messages re-queued: {e}")
+                break
+            except SQLAlchemyError as e:
+                # The row itself is rejected (constraint, data error) and would fail every time
+                self.db.session.rollback()
+                self._give_up(row, 'rejected', e)
+        requeued = []
+        for row in retry:
+            attempts = self._attempts.get(row['id'], 0) + 1
+            if attempts >= self.max_retries:
+                self._give_up(row, 'retries_exhausted', None)
+            else:
+                self._attempts[row['id']] = attempts
+                requeued.append(row)
+        if requeued:
+            with self._lock:
+                self._pending[:0] = requeued
+        return written
+
+    def _forget(self, rows):
+        if self._attempts:
+            for row in rows:
+                self._attempts.pop(row['id'], None)
+
+    def _give_up(self, row, reason, error):
+        self._attempts.pop(row['id'], None)
+        DEAD_LETTERED.labels(reason).inc()
+        self.dead_letter.error(
+            f"Message {row['id']} not written ({reason}: {error}): "
+            + json.dumps(dict(row, timestamp=row['timestamp'].isoformat()))
+        )
+
+    def close(self):
+        """
+        Stop the flusher and write whatever is still pending.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._wake is not None:
+            self._wake.set()
+        self.flush()
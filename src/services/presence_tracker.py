@@ -0,0 +1,167 @@
+import atexit
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import bindparam, update
+from sqlalchemy.exc import SQLAlchemyError
+from src.helpers.metrics import registry
+from src.models.conversation import Conversation
+from src.models.user import User
+
+LAST_SEEN_WRITTEN = registry.counter(
+    'chat_last_seen_written_total', 'User last_seen values written to the database')
+LAST_SEEN_FLUSH_SECONDS = registry.histogram(
+    'chat_last_seen_flush_seconds', 'Time spent writing one batch of last_seen values')
+PRESENCE_ANNOUNCED = registry.counter(
+    'chat_presence_announced_total', 'Online/offline transitions sent to clients, by state', ('state',))
+PRESENCE_SUPPRESSED = registry.counter(
+    'chat_presence_suppressed_total',
+    'Transitions dropped because the user flapped back within the debounce window or another worker announced it')
+
+
+class PresenceTracker:
+    """
+    Coalesces user activity in memory.
+    `last_seen` is kept per user and written every `flush_interval` seconds with one batched UPDATE,
+    so a busy user costs one row write per interval instead of one per event.
+    Online/offline transitions are announced once they have been stable for `debounce` seconds,
+    all of them in a single `presence` event to the lobby; a user who drops and reconnects within
+    the window (a network flap, a page reload) is not announced at all.
+    The state sent is read back from the shared `presence` registry, which also records what was
+    announced, so a flap across two workers is not announced by either and a transition seen by
+    several workers is announced once.
+    Every `heartbeat_interval` seconds the worker renews its sessions in the registry (they expire after
+    three missed heartbeats) and takes offline the users left behind by workers that stopped.
+    """
+    def __init__(self, app, db, presence, socketio=None, flush_interval=30.0, debounce=2.0,
+                 worker_id=None, heartbeat_interval=10.0, on_expired=None):
+        self.app = app
+        self.db = db
+        self.presence = presence
+        self.socketio = socketio
+        self.flush_interval = flush_interval
+        self.debounce = debounce
+        self.worker_id = worker_id
+        self.heartbeat_interval = heartbeat_interval
+        self.on_expired = on_expired  # Called when this worker's own sessions may have been reaped
+        self._beating = False
+        self._last_seen = {}  # Map of user ids to their latest activity (naive UTC)
+        self._transitions = {}  # Map of usernames to the time of their latest pending change
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        registry.gauge('chat_last_seen_pending', 'Users whose last_seen is not written yet').set_function(
+            lambda: len(self._last_seen))
+
+    def start(self, socketio):
+        """
+        Run the last_seen flusher, the presence announcer and the heartbeat with the server's async mode.
+        """
+        self.socketio = socketio
+        socketio.start_background_task(self._run, self.flush_interval, self.flush)
+        socketio.start_background_task(self._run, max(self.debounce / 2, 0.1), self.announce)
+        if self.worker_id is not None and self.heartbeat_interval > 0:
+            self.heartbeat()
+            socketio.start_background_task(self._run, self.heartbeat_interval, self.heartbeat)
+        atexit.register(self.flush)
+
+    def _run(self, interval, task):
+        while True:
+            self.socketio.sleep(interval)
+            try:
+                task()
+            except Exception as e:
+                self.app.logger.error(f"Error in presence tracker: {e}")
+
+    def touch(self, user_id):
+        """
+        Record activity of a user; only the latest value is kept until the next flush.
+        """
+        now = datetime.utcnow()
+        with self._lock:
+            self._last_seen[user_id] = now
+
+    def set_online(self, username, online):
+        """
+        Record a transition; each new one restarts the user's debounce window.
+        The registry is the source of truth, `online` only tells that something changed.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._transitions[username] = now
+
+    def announce(self):
+        """
+        Send the transitions that have been stable for `debounce` seconds in one `presence` event.
+        """
+        cutoff = time.monotonic() - self.debounce
+        with self._lock:
+            stable = [username for username, changed_at in self._transitions.items() if changed_at <= cutoff]
+            for username in stable:
+                del self._transitions[username]
+        changes = {True: [], False: []}
+        for username in stable:
+            state = self.presence.is_online(username)
+            if self.presence.mark_announced(username, state):
+                changes[state].append(username)
+            else:
+                PRESENCE_SUPPRESSED.inc()
+        if not changes[True] and not changes[False]:
+            return 0
+        PRESENCE_ANNOUNCED.labels('online').inc(len(changes[True]))
+        PRESENCE_ANNOUNCED.labels('offline').inc(len(changes[False]))
+        self.socketio.emit(
+            'presence',
+            {'online': sorted(changes[True]), 'offline': sorted(changes[False])},
+            to=Conversation.room(None),
+        )
+        return len(changes[True]) + len(changes[False])
+
+    def heartbeat(self):
+        """
+        Renew this worker's sessions and announce the users of expired workers as offline.
+        """
+        alive = self.presence.heartbeat(self.worker_id, self.heartbeat_interval * 3)
+        if not alive and self._beating and self.on_expired is not None:
+            # Missed heartbeats (a long pause): another worker may have reaped our sessions
+            self.app.logger.warning(f"Presence of worker {self.worker_id} expired, registering its sessions again")
+            self.on_expired()
+        self._beating = True
+        reaped = self.presence.reap()
+        for username in reaped:
+            self.set_online(username, False)
+        if reaped:
+            self.app.logger.info(f"Took {len(reaped)} users of stopped workers offline")
+        return len(reaped)
+
+    def flush(self):
+        """
+        Write every pending last_seen with one batched UPDATE. Values are put back if it fails.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._last_seen = self._last_seen, {}
+            if not pending:
+                return 0
+            start = time.perf_counter()
+            table = User.__table__
+            statement = (
+                update(table)
+                .where(table.c.id == bindparam('user_id'))
+                # updated_at is assigned to itself: activity must not invalidate cached directory pages
+                .values(last_seen=bindparam('seen_at'), updated_at=table.c.updated_at)
+            )
+            rows = [{'user_id': user_id, 'seen_at': seen_at} for user_id, seen_at in pending.items()]
+            with self.app.app_context():
+                try:
+                    self.db.session.execute(statement, rows)
+                    self.db.session.commit()
+                except SQLAlchemyError as e:
+                    self.db.session.rollback()
+                    with self._lock:
+                        for user_id, seen_at in pending.items():
+                            self._last_seen.setdefault(user_id, seen_at)
+                    self.app.logger.error(f"Error writing last_seen of {len(rows)} users: {e}")
+                    return 0
+            LAST_SEEN_FLUSH_SECONDS.observe(time.perf_counter() - start)
+            LAST_SEEN_WRITTEN.inc(len(rows))
+            return len(rows)
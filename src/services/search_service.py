@@ -0,0 +1,198 @@
+import re
+from datetime import datetime
+from sqlalchemy import DateTime, bindparam, text
+from src.helpers.pagination import InvalidCursor, encode_cursor, decode_cursor
+
+
+class SearchService:
+    """
+    Full-text search over message history.
+    On PostgreSQL messages carry a generated `search_vector` tsvector column with a GIN index,
+    so it is maintained by the database on every insert (including write-behind batches).
+    On SQLite (local runs) an external-content FTS5 table is kept in sync by triggers.
+    Results come best matches first (`relevance`) or newest first (`recent`, paged on (timestamp, id)
+    without ranking). `relevance` ranks the `rank_window` newest matches only, paged on (rank, id);
+    once they are exhausted the older matches follow newest first, so every match stays reachable.
+    Archived messages (see `MessageArchive`) are no longer in the table and can't be found.
+    """
+    DEFAULT_PAGE_SIZE = 20
+    MAX_PAGE_SIZE = 100
+    SORTS = ('relevance', 'recent')
+
+    def __init__(self, db, app):
+        self.db = db
+        self.app = app
+        self.language = app.config.get('SEARCH_LANGUAGE', 'english')
+        self.rank_window = app.config.get('SEARCH_RANK_WINDOW', 1000)
+        if not re.fullmatch(r"[a-z_]+", self.language):
+            raise ValueError(f"Invalid SEARCH_LANGUAGE: {self.language}")
+
+    def ensure_index(self):
+        """
+        Create the search column/index (PostgreSQL) or FTS table and triggers (SQLite) if missing.
+        Safe to run at every start; on an existing PostgreSQL table the first run rewrites it once.
+        """
+        dialect = self.db.engine.dialect.name
+        if dialect == 'postgresql':
+            statements = [
+                f"ALTER TABLE message ADD COLUMN IF NOT EXISTS search_vector tsvector "
+                f"GENERATED ALWAYS AS (to_tsvector('{self.language}', coalesce(content, ''))) STORED",
+                "CREATE INDEX IF NOT EXISTS ix_message_search_vector ON message USING GIN (search_vector)",
+            ]
+        elif dialect == 'sqlite':
+            statements = [
+                "CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5(content, content='message', content_rowid='id')",
+                "CREATE TRIGGER IF NOT EXISTS message_fts_insert AFTER INSERT ON message BEGIN "
+                "INSERT INTO message_fts(rowid, content) VALUES (new.id, new.content); END",
+                "CREATE TRIGGER IF NOT EXISTS message_fts_delete AFTER DELETE ON message BEGIN "
+                "INSERT INTO message_fts(message_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+                "CREATE TRIGGER IF NOT EXISTS message_fts_update AFTER UPDATE OF content ON message BEGIN "
+                "INSERT INTO message_fts(message_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+                "INSERT INTO message_fts(rowid, content) VALUES (new.id, new.content); END",
+            ]
+        else:
+            self.app.logger.warning(f"Message search is not supported on {dialect}")
+            return
+        with self.db.engine.begin() as connection:
+            created = dialect == 'sqlite' and not connection.execute(
+                text("SELECT 1 FROM sqlite_master WHERE name = 'message_fts'")).first()
+            for statement in statements:
+                connection.execute(text(statement))
+            if created:
+                # Index the messages written before the FTS table existed
+                connection.execute(text("INSERT INTO message_fts(message_fts) VALUES ('rebuild')"))
+
+    def search(self, query, conversation_ids, include_lobby=True, after=None, limit=DEFAULT_PAGE_SIZE, sort='relevance'):
+        """
+        Search the messages of the given conversations (and the lobby).
+
+        :param query: Search terms (web-search syntax on PostgreSQL, plain words on SQLite).
+        :param conversation_ids: Conversations to search; the caller must be allowed to read them.
+        :param include_lobby: Also search the public lobby.
+        :param after: Cursor returned by the previous page (of the same sort).
+        :param limit: Maximum number of results in the page.
+        :param sort: `relevance` (best matches first) or `recent` (newest first).
+        :return: A dict with the results and the cursor of the next page.
+        :raises InvalidCursor: If `after` cannot be decoded.
+        """
+        if sort not in self.SORTS:
+            raise ValueError(f"Invalid sort: {sort}")
+        if self.db.engine.dialect.name == 'postgresql':
+            query_param = query
+            match = "m.search_vector @@ websearch_to_tsquery(:language, :query)"
+            # Ranked outside the window query, so only the rows of the window are scored
+            ranked_column = ", m.search_vector"
+            # float8, so the rank written in the cursor compares equal to the one computed again
+            rank = "ts_rank_cd(h.search_vector, websearch_to_tsquery(:language, :query))::float8"
+            source = "message m"
+        else:
+            query_param = self._fts5_query(query)
+            if not query_param:
+                return {"results": [], "after": None, "has_more": False}
+            match = "message_fts MATCH :query"
+            ranked_column = ", -bm25(message_fts) AS rank"  # bm25 is lower for better matches
+            rank = "h.rank"
+            source = "message_fts JOIN message m ON m.id = message_fts.rowid"
+
+        scope = "m.conversation_id IN :conversation_ids"
+        if include_lobby:
+            scope = f"m.conversation_id IS NULL OR {scope}"
+        params = {
+            "language": self.language,
+            "query": query_param,
+            "conversation_ids": list(conversation_ids),
+            "limit": limit + 1,  # One extra row tells whether another page exists
+        }
+
+        ranked = sort == 'relevance'
+        if after is not None:
+            try:
+                values = decode_cursor(after, 3) if ranked else None
+            except InvalidCursor:
+                values = None
+            if values is not None:
+                params["after_key"], params["after_id"], params["top_id"] = values
+            else:
+                # Past the ranked window, relevance pages go on like `recent` ones
+                params["after_key"], params["after_id"] = decode_cursor(after, 2)
+                ranked = False
+            if isinstance(params["after_key"], datetime) == ranked:
+                raise InvalidCursor("Cursor of another sort order.")
+        elif ranked:
+            # Messages written after the first page stay out of the window, so its pages don't shift
+            params["top_id"] = self.db.session.execute(text("SELECT max(id) FROM message")).scalar() or 0
+
+        window = ""
+        if ranked:
+            # Only the newest matches are ranked, so the cost doesn't grow with the number of matches
+            params["window"] = self.rank_window
+            window = "AND m.id <= :top_id ORDER BY m.timestamp DESC, m.id DESC LIMIT :window"
+            sort_key = (rank, "h.id")
+        else:
+            ranked_column, rank = "", "0.0"
+            sort_key = ("h.timestamp", "h.id")
+        page_filter = ""
+        if after is not None:
+            page_filter = f"WHERE ({sort_key[0]} < :after_key OR ({sort_key[0]} = :after_key AND h.id < :after_id))"
+
+        statement = text(f"""
+            WITH hits AS (
+                SELECT m.id, m.user_id, m.timestamp, m.content, m.conversation_id{ranked_column}
+                FROM {source}
+                WHERE {match}
+                  AND ({scope})
+                {window}
+            )
+            SELECT h.id, h.timestamp, h.content, h.conversation_id, u.username, {rank} AS rank
+            FROM hits h JOIN "user" u ON u.id = h.user_id
+            {page_filter}
+            ORDER BY {sort_key[0]} DESC, h.id DESC
+            LIMIT :limit
+        """).bindparams(bindparam("conversation_ids", expanding=True)).columns(timestamp=DateTime)
+        if after is not None and not ranked:
+            statement = statement.bindparams(bindparam("after_key", type_=DateTime))
+
+        rows = self.db.session.execute(statement, params).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        cursor = None
+        if has_more:
+            last = rows[-1]
+            cursor = encode_cursor(last.rank, last.id, params["top_id"]) if ranked else encode_cursor(last.timestamp, last.id)
+        elif ranked:
+            # The window is exhausted: older matches follow, newest first, from its oldest message
+            edge = text(f"""
+                SELECT m.timestamp, m.id
+                FROM {source}
+                WHERE {match}
+                  AND ({scope})
+                  AND m.id <= :top_id
+                ORDER BY m.timestamp DESC, m.id DESC
+                LIMIT 2 OFFSET :edge
+            """).bindparams(bindparam("conversation_ids", expanding=True)).columns(timestamp=DateTime)
+            edge_rows = self.db.session.execute(edge, {**params, "edge": self.rank_window - 1}).all()
+            if len(edge_rows) == 2:
+                has_more = True
+                cursor = encode_cursor(edge_rows[0].timestamp, edge_rows[0].id)
+
+        results = [
+            {
+                "id": row.id,
+                "username": row.username,
+                "message": row.content,
+                "timestamp": row.timestamp.isoformat(),
+                "conversation_id": row.conversation_id,
+                "rank": row.rank,
+            }
+            for row in rows
+        ]
+        return {"results": results, "after": cursor, "has_more": has_more}
+
+    @staticmethod
+    def _fts5_query(query):
+        """
+        Turn free text into an FTS5 query matching every word, quoting each one
+        so user input can't inject FTS5 operators or cause syntax errors.
+        """
+        words = re.findall(r"\w+", query)
+        return " ".join(f'"{word}"' for word in words)
@@ -1,12 +1,30 @@
-from flask_socketio import SocketIO, emit, disconnect
+import logging
+import time
+import uuid
+from flask_socketio import SocketIO, emit, disconnect, join_room
 from flask_jwt_extended import decode_token
 from flask import request
+from src.helpers.session_manager import SessionManager, SocketIdentity
+from src.helpers.instrumentation import timed_event
+from src.helpers.logs import log_pipeline
+from src.helpers.metrics import registry
+from src.helpers.message_bus import create_presence_registry, socketio_queue_options
+from src.helpers.rate_limiter import RateLimiter
+from src.models.conversation import Conversation
 from src.models.message import Message
-from src.models.user import User
+from src.services.conversation_service import ConversationService
+from src.services.message_service import MessageService
+from src.services.message_writer import MessageWriter
+from src.services.presence_tracker import PresenceTracker
+from src.services.user_cache import user_cache
+
+# Length of the message.content column
+MAX_MESSAGE_LENGTH = Message.__table__.c.content.type.length
+
 
 class SocketService:
     def __init__(self, app=None, db=None):
-        self.user_sessions = {}  # Map of user IDs to session IDs
+        self.sessions = SessionManager()  # Local sockets of this worker, indexed both ways
         self.app = app
         self.db = db
         if app is not None:
@@ -16,98 +34,338 @@ class SocketService:
         """
         Initialize the SocketIO app with CORS and other settings.
         """
-        self.socketio = SocketIO(app,logger=True, engineio_logger=True, cors_allowed_origins=["http://localhost:3000"])
-        self.socketio.on_event('connect', self.handle_connect)
-        self.socketio.on_event('disconnect', self.handle_disconnect)
-        self.socketio.on_event('send_message', self.handle_send_message)
+        queue_url = app.config.get('SOCKETIO_MESSAGE_QUEUE')
+        # Presence is shared by every worker attached to the same message bus
+        self.presence = create_presence_registry(app.config.get('PRESENCE_URL') or queue_url)
+        # Owner of this worker's sessions in the registry; they expire if the worker stops heartbeating
+        self.worker_id = uuid.uuid4().hex
+        self.serializer = app.config.get('SOCKETIO_SERIALIZER') or 'json'
+        # Per-event logs go to their own logger so they can be sampled (LOG_SAMPLE_RATES socket_events)
+        self.logger = log_pipeline.events_logger(app)
+        self.socketio = SocketIO(
+            app,
+            # Loggers rather than True, so their levels come from LOG_LEVELS instead of being forced to INFO
+            logger=logging.getLogger('socketio.server'),
+            engineio_logger=logging.getLogger('engineio.server'),
+            cors_allowed_origins=["http://localhost:3000"],
+            serializer=self._serializer(self.serializer),
+            **socketio_queue_options(queue_url),
+        )
+        self.message_writer = None
+        if app.config.get('MESSAGE_WRITE_BEHIND'):
+            self.message_writer = MessageWriter(
+                app,
+                self.db,
+                batch_size=app.config.get('MESSAGE_BATCH_SIZE', 100),
+                flush_interval=app.config.get('MESSAGE_FLUSH_INTERVAL', 0.05),
+                max_pending=app.config.get('MESSAGE_MAX_PENDING', 10000),
+                max_retries=app.config.get('MESSAGE_MAX_RETRIES', 20),
+            )
+        # Activity and online/offline changes, coalesced before they reach the database and the clients
+        self.presence_tracker = PresenceTracker(
+            app,
+            self.db,
+            self.presence,
+            flush_interval=app.config.get('LAST_SEEN_FLUSH_INTERVAL', 30),
+            debounce=app.config.get('PRESENCE_DEBOUNCE', 2),
+            worker_id=self.worker_id,
+            heartbeat_interval=app.config.get('PRESENCE_HEARTBEAT_INTERVAL', 10),
+            on_expired=self.restore_presence,
+        )
+        # Token buckets for send_message, per socket and per user (shared by, and outliving, the user's sockets)
+        self.sid_limiter = self._limiter(app, 'sid', 'SOCKET_RATE_LIMIT_SID')
+        self.user_limiter = self._limiter(app, 'user', 'SOCKET_RATE_LIMIT_USER')
+        self.presence_snapshot_max = app.config.get('PRESENCE_SNAPSHOT_MAX', 500)
+        self.sync_max_messages = app.config.get('SYNC_MAX_MESSAGES', 500)
+        self.sync_overlap = app.config.get('SYNC_OVERLAP_SECONDS', 30)
+        self.socketio.on_event('connect', timed_event('connect', self.handle_connect))
+        self.socketio.on_event('disconnect', timed_event('disconnect', self.handle_disconnect))
+        self.socketio.on_event('send_message', timed_event('send_message', self.handle_send_message))
+        registry.gauge('chat_socket_connections', 'Sockets connected to this worker').set_function(self.sessions.__len__)
+        registry.gauge('chat_socket_users', 'Distinct users connected to this worker').set_function(
+            lambda: len(self.sessions.sessions))
+        app.extensions['socket_service'] = self
+
+    def start_background_tasks(self):
+        """
+        Start the message writer's flusher and the presence tracker's announcer and last_seen flusher.
+        Until then, write-behind messages are written inline.
+        """
+        if self.message_writer is not None:
+            self.message_writer.start(self.socketio)
+        self.presence_tracker.start(self.socketio)
+
+    def restore_presence(self):
+        """
+        Register the sockets connected to this worker again, after its heartbeat had expired.
+        """
+        for username, sids in list(self.sessions.sessions.items()):
+            for sid in list(sids):
+                if self.presence.add(username, sid, self.worker_id):
+                    self.presence_tracker.set_online(username, True)
+
+    @staticmethod
+    def _serializer(name):
+        """
+        Map SOCKETIO_SERIALIZER to python-socketio's serializer option.
+        The format applies to every socket of the server, so clients must use the matching parser;
+        they can read it from the `socketio_serializer` field of `GET /`.
+        """
+        if name == 'json':
+            return 'default'
+        if name == 'msgpack':
+            try:
+                import msgpack  # noqa: F401
+            except ImportError:
+                raise RuntimeError('msgpack package is not installed (Run "pip install msgpack" in your virtualenv).')
+            return 'msgpack'
+        raise ValueError(f"Invalid SOCKETIO_SERIALIZER: {name}")
+
+    @staticmethod
+    def _limiter(app, name, prefix):
+        """
+        Build a rate limiter from the <prefix>_RATE / <prefix>_BURST settings (a rate of 0 disables it).
+        """
+        rate = app.config.get(f'{prefix}_RATE')
+        if not rate:
+            return None
+        return RateLimiter(name, rate, app.config.get(f'{prefix}_BURST') or rate)
+
+    def join_conversation(self, conversation_id, usernames):
+        """
+        Add the connected sockets of the given users to a conversation room.
+        Used when a conversation is created while its members are online.
+        Sockets held by other workers are reached through the message bus.
+        """
+        room = Conversation.room(conversation_id)
+        for username in usernames:
+            for sid in self.presence.sids(username):
+                self.socketio.server.enter_room(sid, room, namespace='/')
+                identity = self.sessions.get_identity(sid)
+                if identity is not None:
+                    identity.conversations.add(conversation_id)
 
     def validate_token(self, token):
         """
         Validate the JWT token provided by the client and return the decoded token.
-        This function will ensure the app context is pushed for token decoding.
+        Socket.IO handlers already run inside the app context needed by decode_token.
         """
         try:
-            # convert the token to bytes before decoding
-            token = token.encode('utf-8')
-            # Explicitly push the app context before calling decode_token
-            with self.app.app_context():
-                decoded = decode_token(token)
-                self.app.logger.info(f"Decoded token: {decoded}")  # Log the decoded token to debug
-                return decoded  # Return the entire decoded token for further inspection
+            decoded = decode_token(token)
+            self.logger.debug(f"Token verified for {decoded.get('sub')}")
+            return decoded
         except Exception as e:
-            self.app.logger.error(f"Invalid token: {e}")
+            self.logger.error(f"Invalid token: {e}")
             return None
 
-    def handle_connect(self, token):
+    @staticmethod
+    def last_message_id(auth):
+        """
+        Return the id of the last message a reconnecting client has seen, from the query string
+        or the auth payload, or None when it is missing or not a positive integer.
+        """
+        value = request.args.get('last_message_id')
+        if value is None and isinstance(auth, dict):
+            value = auth.get('last_message_id')
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            return None
+        return value if value > 0 else None
+
+    def sync_missed_messages(self, identity, last_message_id):
+        """
+        Send a reconnecting socket the messages it missed in one `sync_messages` event.
+        Past SYNC_MAX_MESSAGES, or when its last message can't be found, the client is told to reload
+        over REST with `resync_required`. The batch re-sends SYNC_OVERLAP_SECONDS of messages before the
+        last one seen, which also covers messages still buffered by the write-behind writer of other workers.
+        """
+        if self.message_writer is not None:
+            # Messages already broadcast by this worker may still be waiting for the flusher
+            self.message_writer.flush()
+        message_service = MessageService(self.db, self.app)
+        messages, has_more = message_service.get_messages_since(
+            last_message_id, identity.conversations, limit=self.sync_max_messages, overlap=self.sync_overlap)
+        if has_more:
+            emit('resync_required', {
+                'message': 'Too many messages were missed, reload the conversations.',
+                'last_message_id': last_message_id,
+            })
+            return
+        emit('sync_messages', {
+            'messages': messages,
+            'last_message_id': messages[-1]['id'] if messages else last_message_id,
+        })
+
+    def handle_connect(self, auth=None):
         """
         Handle client connection and validate JWT token.
         The token should be passed explicitly from the client.
+        The verified identity is bound to the session so later events skip token checks.
+        A client reconnecting with `last_message_id` is caught up with the messages it missed.
         """
+        # Socket.IO requests bypass Flask's before_request hooks, so the schema check happens here too
+        self.app.extensions['database'].ensure_schema(self.app)
         token = request.args.get('token')
-        decoded_token = self.validate_token(token)
+        decoded_token = self.validate_token(token) if token else None
         
         if decoded_token:
             user_id = decoded_token.get('sub') 
-            if user_id:
-                with self.app.app_context():
-                    self.user_sessions[user_id] = request.sid
-                    self.app.logger.info(f"User {user_id} connected with session ID {request.sid}")
-                    emit('server_message', {'message': 'Welcome to the chat server!'})
+            user = user_cache.get_by_username(user_id)
+            if user:
+                conversation_service = ConversationService(self.db, self.app)
+                conversation_ids = conversation_service.get_conversation_ids(user.id)
+                identity = SocketIdentity(
+                    username=user.username,
+                    user_id=user.id,
+                    expires_at=decoded_token.get('exp'),
+                    conversations=set(conversation_ids),
+                )
+                self.sessions.add_session(user_id, request.sid, identity)
+                self.presence_tracker.touch(user.id)
+                if self.presence.add(user_id, request.sid, self.worker_id):
+                    # First connection of the user on any worker
+                    self.presence_tracker.set_online(user_id, True)
+                # Join the lobby and the rooms of every conversation the user belongs to
+                join_room(Conversation.room(None))
+                for conversation_id in conversation_ids:
+                    join_room(Conversation.room(conversation_id))
+                self.logger.info(f"User {user_id} connected with session ID {request.sid}")
+                emit('server_message', {'message': 'Welcome to the chat server!'})
+                # Which of the user's contacts are online now, checked in one batch so the cost doesn't grow
+                # with the number of online users; the lobby's `presence` deltas keep it current from here on
+                contacts = conversation_service.get_contact_usernames(user.id, self.presence_snapshot_max)
+                online = self.presence.filter_online(contacts)
+                online.add(user.username)
+                emit('presence', {'online': sorted(online), 'offline': [], 'snapshot': True})
+                # Rooms are joined first so nothing falls between the catch-up and live messages;
+                # a message may arrive both ways, clients drop duplicates by id
+                last_message_id = self.last_message_id(auth)
+                if last_message_id is not None:
+                    self.sync_missed_messages(identity, last_message_id)
             else:
-                self.app.logger.warning('User ID not found in token')
+                self.logger.warning('User from token not found')
                 disconnect()
         else:
-            self.app.logger.warning('Unauthorized connection attempt')
+            self.logger.warning('Unauthorized connection attempt')
             disconnect()
     
     def handle_disconnect(self):
         """
         Handle client disconnection.
         """
-        user_id = None
-        for uid, sid in self.user_sessions.items():
-            with self.app.app_context():
-                if sid == request.sid:
-                    user_id = uid
-                    break
+        identity = self.sessions.get_identity(request.sid)
+        user_id = self.sessions.remove_session(request.sid)
+        _, last = self.presence.remove(request.sid)
+        if identity is not None:
+            self.presence_tracker.touch(identity.user_id)
+        if user_id and last:
+            # That was the user's last connection on any worker
+            self.presence_tracker.set_online(user_id, False)
+        # The user's bucket outlives its sockets, so reconnecting doesn't buy a new burst;
+        # the limiter evicts it once it has refilled
+        if self.sid_limiter is not None:
+            self.sid_limiter.discard(request.sid)
         if user_id:
-            del self.user_sessions[user_id]
-            self.app.logger.info(f"User {user_id} disconnected")
+            self.logger.info(f"User {user_id} disconnected")
+
+    def authenticated_identity(self):
+        """
+        Return the identity bound to the current socket, or None if it is unknown or its token expired.
+        """
+        identity = self.sessions.get_identity(request.sid)
+        if identity is None:
+            self.logger.warning('Unauthorized attempt to send a message')
+            return None
+        if identity.expires_at is not None and time.time() >= identity.expires_at:
+            self.logger.warning(f'Token expired for user {identity.username}')
+            emit('token_expired', {'message': 'Your session has expired, please reconnect.'})
+            return None
+        return identity
+
+    def check_rate_limit(self, identity):
+        """
+        Spend one token from the socket's and the user's buckets.
+        When either is empty, tell the client how long to wait instead of disconnecting it;
+        tokens already taken for the rejected event are given back.
+        """
+        spent = []
+        for limit, limiter, key in (('sid', self.sid_limiter, request.sid), ('user', self.user_limiter, identity.user_id)):
+            if limiter is None:
+                continue
+            retry_after = limiter.consume(key)
+            if not retry_after:
+                spent.append((limiter, key))
+            else:
+                for spent_limiter, spent_key in spent:
+                    spent_limiter.refund(spent_key)
+                emit('rate_limited', {
+                    'message': 'You are sending messages too fast.',
+                    'limit': limit,
+                    'retry_after': round(retry_after, 3),
+                })
+                return False
+        return True
+
+    def can_post(self, identity, conversation_id):
+        """
+        Check membership from the conversations cached on the session, falling back to the database
+        for conversations joined after connecting (e.g. created on another worker).
+        """
+        if conversation_id is None or conversation_id in identity.conversations:
+            return True
+        conversation_service = ConversationService(self.db, self.app)
+        if conversation_service.is_member(conversation_id, identity.user_id):
+            identity.conversations.add(conversation_id)
+            return True
+        return False
 
-   
     def handle_send_message(self, data):
-        username = data.get('username')  # Retrieve the username
         content = data.get('message')  # Retrieve the message content
-        token = request.args.get('token')
-        if not token or not username or not content:
-            self.app.logger.warning('Invalid data received: Missing username or content')
+        conversation_id = data.get('conversation_id')  # None targets the public lobby
+        if not content:
+            self.logger.warning('Invalid data received: Missing content')
             disconnect()
             return
+        if not isinstance(content, str) or len(content) > MAX_MESSAGE_LENGTH:
+            # Checked before queueing: the column would reject it after the message was broadcast
+            emit('error', {'message': f'Messages are limited to {MAX_MESSAGE_LENGTH} characters'})
+            return
 
-        decoded_token = self.validate_token(token)
-        if decoded_token:
-            user_id = decoded_token.get('sub')
-            if user_id:
-                # Save and broadcast the message
-                try:
-                    user = User.query.filter_by(username=user_id).first()
-                    if not user:
-                        self.app.logger.warning('User not found')
-                        disconnect()
-                        return
-                    
-                    new_message = Message(user_id=user.id, content=content)
-                    self.db.session.add(new_message)
-                    self.db.session.commit()
-                    emit('receive_message', {'username': user.username, 'message': content}, broadcast=True)
-                except Exception as e:
-                    self.app.logger.error(f"Error saving message to database: {e}")
-            else:
-                self.app.logger.warning('Unauthorized attempt to send a message')
-                disconnect()
-        else:
-            self.app.logger.warning('Invalid or expired token')
+        identity = self.authenticated_identity()
+        if not identity:
             disconnect()
+            return
+        if not self.check_rate_limit(identity):
+            return
+        self.presence_tracker.touch(identity.user_id)
+
+        # Save and broadcast the message
+        try:
+            if not self.can_post(identity, conversation_id):
+                self.logger.warning(f'User {identity.username} is not a member of conversation {conversation_id}')
+                emit('error', {'message': 'Conversation not found'})
+                return
+
+            if self.message_writer is not None:
+                # Write-behind: queue the row and broadcast without waiting for the database
+                row = self.message_writer.submit(identity.user_id, conversation_id, content)
+                message_id, timestamp = row['id'], row['timestamp']
+            else:
+                new_message = Message(user_id=identity.user_id, conversation_id=conversation_id, content=content)
+                self.db.session.add(new_message)
+                self.db.session.commit()
+                message_id, timestamp = new_message.id, new_message.timestamp
+            # Deliver only to the sockets subscribed to the conversation room
+            emit('receive_message', {
+                'id': message_id,
+                'username': identity.username,
+                'message': content,
+                'timestamp': timestamp.isoformat(),
+                'conversation_id': conversation_id,
+            }, to=Conversation.room(conversation_id))
+        except Exception as e:
+            self.logger.error(f"Error saving message to database: {e}")
 
    
     def run(self, host='0.0.0.0', port=5000):
@@ -1,5 +1,7 @@
+from flask import current_app
 from src.database import db 
 from datetime import datetime, timedelta
+from sqlalchemy import delete, select
 from src.models.token import Token
 import uuid
 
@@ -46,6 +48,47 @@ class TokenService:
             return True
         return False
 
+    @staticmethod
+    def consume_refresh_token(refresh_token):
+        """
+        Atomically delete a valid refresh token and return its user id, so each token can be used once.
+        Returns None if the token is unknown, expired or was already used (e.g. by a concurrent request).
+        """
+        try:
+            user_id = db.session.execute(
+                delete(Token)
+                .where(Token.refresh_token == refresh_token, Token.expired_at > datetime.now())
+                .returning(Token.user_id)
+            ).scalar()
+            db.session.commit()
+            return user_id
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error consuming refresh token: {str(e)}")
+            raise
+
+    @staticmethod
+    def purge_expired(batch_size=1000):
+        """
+        Delete one batch of expired refresh tokens and return how many rows were removed.
+        Small batches keep each transaction (and its row locks) short; on PostgreSQL rows
+        already locked by another worker's sweep are skipped.
+        """
+        expired = (
+            select(Token.id)
+            .where(Token.expired_at <= datetime.now())
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        try:
+            result = db.session.execute(delete(Token).where(Token.id.in_(expired)))
+            db.session.commit()
+            return result.rowcount
+        except Exception:
+            db.session.rollback()
+            raise
+
     @staticmethod
     def revoke_refresh_token(refresh_token):
         """
@@ -0,0 +1,54 @@
+import time
+from src.helpers.metrics import registry
+from src.services.token_service import TokenService
+
+TOKENS_SWEPT = registry.counter('chat_tokens_swept_total', 'Expired refresh tokens deleted by the sweeper')
+SWEEP_SECONDS = registry.histogram('chat_token_sweep_seconds', 'Duration of one full sweep of expired refresh tokens')
+
+
+class TokenSweeper:
+    """
+    Background task that deletes expired refresh tokens every `interval` seconds.
+    Rows are removed in batches of `batch_size`, each in its own short transaction,
+    with a pause between batches so the sweep never holds locks or the event loop for long.
+    """
+    def __init__(self, app, interval=3600, batch_size=1000, pause=0.1):
+        self.app = app
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self._sleep = time.sleep
+
+    def start(self, socketio):
+        """
+        Run the sweeper with the server's async mode.
+        """
+        self._sleep = socketio.sleep
+        socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            self._sleep(self.interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                self.app.logger.error(f"Error sweeping expired tokens: {e}")
+
+    def sweep(self):
+        """
+        Delete every expired token, batch by batch, and return how many were removed.
+        """
+        start = time.perf_counter()
+        total = 0
+        with self.app.app_context():
+            while True:
+                deleted = TokenService.purge_expired(self.batch_size)
+                total += deleted
+                TOKENS_SWEPT.inc(deleted)
+                if deleted < self.batch_size:
+                    break
+                self._sleep(self.pause)
+        SWEEP_SECONDS.observe(time.perf_counter() - start)
+        if total:
+            self.app.logger.info(f"Deleted {total} expired refresh tokens")
+        return total
@@ -0,0 +1,100 @@
+from collections import namedtuple
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from src.database import db
+from src.helpers.ttl_cache import TTLCache
+from src.models.user import User
+
+# Read-only projection of the columns the hot paths need
+UserRecord = namedtuple('UserRecord', ['id', 'username', 'email', 'image_url', 'password_hash', 'is_active', 'updated_at'])
+
+_COLUMNS = (User.id, User.username, User.email, User.image_url, User.password_hash, User.is_active, User.updated_at)
+
+
+class UserCache:
+    """
+    Process-wide cache of user projections, addressable by username, id or email.
+    Entries are dropped whenever a user row is updated or deleted through the ORM,
+    and otherwise expire after USER_CACHE_TTL seconds (the bound on staleness across workers).
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._cache = TTLCache('user')
+        return cls._instance
+
+    def init_app(self, app):
+        """Size the cache from the app configuration."""
+        self._cache = TTLCache(
+            'user',
+            maxsize=app.config.get('USER_CACHE_SIZE', 10000),
+            ttl=app.config.get('USER_CACHE_TTL', 60.0),
+        )
+        app.extensions['user_cache'] = self
+
+    def get_by_username(self, username):
+        return self._get('username', username, User.username == username)
+
+    def get_by_id(self, user_id):
+        return self._get('id', user_id, User.id == user_id)
+
+    def get_by_email(self, email):
+        return self._get('email', email, User.email == email)
+
+    def _get(self, field, value, criterion):
+        if value is None:
+            return None
+        record = self._cache.get((field, value))
+        if record is not None:
+            return record
+        row = db.session.query(*_COLUMNS).filter(criterion).first()
+        if row is None:
+            return None
+        record = UserRecord(*row)
+        self._cache.set(('username', record.username), record)
+        self._cache.set(('id', record.id), record)
+        self._cache.set(('email', record.email), record)
+        return record
+
+    def invalidate(self, user_id=None, username=None, email=None):
+        """
+        Drop every entry of a user. Any one of its keys is enough.
+        """
+        keys = [('id', user_id), ('username', username), ('email', email)]
+        for key in keys:
+            record = self._cache.pop(key) if key[1] is not None else None
+            if record is not None:
+                self._cache.pop(('id', record.id))
+                self._cache.pop(('username', record.username))
+                self._cache.pop(('email', record.email))
+
+    def clear(self):
+        self._cache.clear()
+
+
+user_cache = UserCache()
+
+
+def _invalidate_user(mapper, connection, target):
+    # Old values matter too: a renamed user must not stay reachable under the old name
+    history = inspect(target).attrs
+    user_cache.invalidate(user_id=target.id, username=target.username, email=target.email)
+    for attr in ('username', 'email'):
+        for old_value in getattr(history, attr).history.deleted or ():
+            user_cache.invalidate(**{attr: old_value})
+    # Invalidate again once committed, so a concurrent read cannot re-cache the pre-commit row
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault('invalidated_users', set()).add(target.id)
+
+
+event.listen(User, 'after_update', _invalidate_user)
+event.listen(User, 'after_delete', _invalidate_user)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_users(session):
+    for user_id in session.info.pop('invalidated_users', ()):
+        user_cache.invalidate(user_id=user_id)
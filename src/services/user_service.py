@@ -1,33 +1,119 @@
 from src.models.user import User
+from sqlalchemy import func
 from sqlalchemy.exc import SQLAlchemyError
+from src.helpers.pagination import encode_cursor, decode_cursor
 from src.services.bucket_service import BucketService
 
 class UserService:
+    DEFAULT_PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 200
+    ONLINE_SCAN_BATCH = 200  # Users checked against the presence registry per round trip
+    ONLINE_SCAN_ROWS = 2000  # Users scanned per request by the online filter
+
     def __init__(self, db, app):
         self.db = db
         self.app = app
         with self.app.app_context():
             self.secret_key = self.app.config.get('SECRET_KEY')
         
-    def get_users(self, current_user):
+    def get_users(self, current_user, search=None, presence=None, after=None, limit=DEFAULT_PAGE_SIZE):
         """
-        Retrieve all users except the currently connected user.
+        Retrieve one page of the user directory (everyone but the current user), ordered by username.
+        With `presence`, the directory is scanned in batches checked against the registry, at most
+        ONLINE_SCAN_ROWS users per request: a page may then hold fewer users than `limit` (even none)
+        while `has_more` is true.
+
+        :param current_user: Username of the caller, excluded from the results.
+        :param search: Optional username prefix.
+        :param presence: When given, a presence registry: only online users are returned.
+        :param after: Cursor; only return users after it.
+        :param limit: Maximum number of users in the page.
+        :return: A dict with the users and the cursor of the next page.
+        :raises InvalidCursor: If `after` cannot be decoded.
         """
-        try:
-            # Retrieve all users except the one matching the current user's username
-            users = User.query.filter(User.username != current_user).all()
-            # Return the list of users
-            return [user.to_dict() for user in users]
-        except Exception as e:
-            print(f"Error retrieving users: {e}")
-            return []
+        # Select only the columns the directory shows instead of hydrating User entities
+        query = (
+            self.db.session.query(User.id, User.username, User.image_url)
+            .filter(User.username != current_user, User.is_active.is_(True))
+        )
+        if search:
+            # Prefix match, served by the username pattern index on PostgreSQL
+            query = query.filter(User.username.startswith(search, autoescape=True))
+        if after is not None:
+            (last_username,) = decode_cursor(after, 1)
+            query = query.filter(User.username > last_username)
+
+        # Fetch one extra row to know whether another page exists
+        scanned_to = None
+        if presence is None:
+            rows = query.order_by(User.username.asc()).limit(limit + 1).all()
+        else:
+            rows, scanned_to = self._scan_online(query, presence, limit + 1)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if has_more:
+            next_username = rows[-1].username
+        else:
+            # The scan stopped before the end of the directory: resume after the last user checked
+            next_username, has_more = scanned_to, scanned_to is not None
+
+        bucket_service = BucketService()
+        users = [
+            {"id": user_id, "username": username, "image_url": bucket_service.avatar_url(image_url)}
+            for user_id, username, image_url in rows
+        ]
+        return {
+            "users": users,
+            "after": encode_cursor(next_username) if has_more else None,
+            "has_more": has_more,
+        }
+
+    def _scan_online(self, query, presence, wanted):
+        """
+        Return up to `wanted` online rows of `query` in username order, and the last username checked
+        when the scan budget ran out first (None once the directory is exhausted).
+        """
+        rows, scanned, last_username = [], 0, None
+        while len(rows) < wanted:
+            if scanned >= self.ONLINE_SCAN_ROWS:
+                return rows, last_username
+            batch_query = query if last_username is None else query.filter(User.username > last_username)
+            batch = batch_query.order_by(User.username.asc()).limit(self.ONLINE_SCAN_BATCH).all()
+            if not batch:
+                return rows, None
+            scanned += len(batch)
+            last_username = batch[-1].username
+            online = presence.filter_online([row.username for row in batch])
+            rows.extend(row for row in batch if row.username in online)
+            if len(batch) < self.ONLINE_SCAN_BATCH:
+                return rows, None
+        return rows, None
         
+    def get_directory_version(self):
+        """
+        Return the newest `updated_at` of any user: a user directory page can only change when it does
+        (signups, profile updates and deactivations all bump it). One lookup on its index.
+        """
+        return self.db.session.query(func.max(User.updated_at)).scalar()
+
+    def get_profile_version(self, username):
+        """
+        Return the (id, updated_at) of the user, or None if it doesn't exist.
+        Read from the database: the user cache of this worker may predate an update made on another one.
+        """
+        row = self.db.session.query(User.id, User.updated_at).filter(User.username == username).first()
+        return tuple(row) if row else None
+
     def get_profile(self, username):
         """
-        Retrieve the profile of the specified user.
+        Retrieve the profile of the specified user, from the database like its version.
         """
         try:
-            user = User.query.filter_by(username=username).first()
+            user = (
+                self.db.session.query(User.username, User.email, User.image_url)
+                .filter(User.username == username)
+                .first()
+            )
             if not user:
                 return None, "User not found."
             
@@ -35,7 +121,7 @@ class UserService:
             profile = {
                 "username": user.username,
                 "email": user.email,
-                "image_url": user.image_url
+                "image_url": BucketService().avatar_url(user.image_url)
             }
             return profile, "Profile retrieved successfully."
         except Exception as e:
@@ -45,36 +131,41 @@ class UserService:
     
     def update_profile(self, username, data, file=None):
         """
-        Updates the user's profile details, including uploading a profile picture.
+        Updates the user's profile details. A new profile picture is handed to the image pipeline,
+        which updates `image_url` once the variants are uploaded; its job is returned for polling.
+        The upload is checked before anything changes, and the details are committed with its job.
         """
         try:
+            # Read at most one byte past the limit instead of the whole upload
+            content = None
+            if file:
+                max_bytes = self.app.config.get("IMAGE_MAX_BYTES")
+                content = file.read(max_bytes + 1)
+                if not content:
+                    return False, "The uploaded file is empty.", None
+                if len(content) > max_bytes:
+                    return False, "The uploaded file is too large.", None
+
             user = User.query.filter_by(username=username).first()
             if not user:
-                return False, "User not found."
+                return False, "User not found.", None
             
             # Update user details
             if "email" in data:
                 user.email = data["email"]
-                
-            # Initialize BucketService instance
-            bucket_service = BucketService()
-
-            # Upload the profile picture if provided
-            if file:
-                upload_result = bucket_service.upload_image(file)
-                print(f"upload_result {upload_result}")
-                if not upload_result["success"]:
-                    return False, upload_result["error"]
-                # Save the uploaded image URL to the user's profile
-                user.image_url = upload_result["url"]
 
-            # Commit the updates to the database
-            self.db.session.commit()
-            return True, "Profile updated successfully."
+            # Queue the profile picture if provided; the pipeline commits the details with the job
+            image_job = None
+            if content:
+                image_job = self.app.extensions['image_pipeline'].submit(user.id, content)
+            else:
+                self.db.session.commit()
+            return True, "Profile updated successfully.", image_job
         except SQLAlchemyError as e:
             self.db.session.rollback()  # Rollback in case of a database error
             self.app.logger.error(f"Error in update_profile: {str(e)}")
-            return False, "An error occurred while updating the profile."
+            return False, "An error occurred while updating the profile.", None
         except Exception as e:
+            self.db.session.rollback()
             self.app.logger.error(f"Error in update_profile: {str(e)}")
-            return False, "An unexpected error occurred."
+            return False, "An unexpected error occurred.", None
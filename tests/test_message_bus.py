@@ -0,0 +1,187 @@
+import socket
+import time
+
+import pytest
+import socketio
+
+from src.helpers.message_bus import (
+    MAX_FRAME_SIZE,
+    LocalBusHub,
+    LocalBusManager,
+    LocalBusPresenceRegistry,
+    _HEADER,
+    recv_frame,
+    send_frame,
+)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('Timed out waiting for the message bus')
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def hub():
+    hub = LocalBusHub(port=0).start()
+    yield hub
+    hub.shutdown()
+
+
+def hub_url(hub):
+    return f'local://127.0.0.1:{hub.address[1]}'
+
+
+def subscriber_count(hub, channel='socketio'):
+    with hub._lock:
+        return len(hub._subscribers.get(channel, {}))
+
+
+def make_server(url, received):
+    """
+    A Socket.IO server on the local bus that records the emits it receives from other servers.
+    """
+    manager = LocalBusManager(url)
+    server = socketio.Server(client_manager=manager, async_mode='threading')
+    manager._handle_emit = received.append
+    server.manager_initialized = True
+    manager.initialize()
+    return server
+
+
+def test_frame_round_trip():
+    left, right = socket.socketpair()
+    with left, right:
+        frames = [{'op': 'publish', 'data': {'text': 'héllo ✓', 'ids': [1, 2]}}, [None, True], 'x' * 70000]
+        for frame in frames:
+            send_frame(left, frame)
+        assert [recv_frame(right) for _ in frames] == frames
+        left.close()
+        assert recv_frame(right) is None
+
+
+def test_frame_rejects_non_json_payloads():
+    left, right = socket.socketpair()
+    with left, right:
+        with pytest.raises(TypeError):
+            send_frame(left, {'data': object()})
+
+
+def test_oversized_frame_is_refused_before_reading_it():
+    left, right = socket.socketpair()
+    with left, right:
+        left.sendall(_HEADER.pack(MAX_FRAME_SIZE + 1))
+        with pytest.raises(ConnectionError):
+            recv_frame(right)
+
+
+def test_hub_drops_peers_sending_malformed_frames(hub):
+    with socket.create_connection(hub.address) as sock:
+        sock.sendall(_HEADER.pack(5) + b'\x80\x04N.x')
+        sock.settimeout(5)
+        assert sock.recv(1) == b''
+
+
+def test_hub_fans_out_to_every_subscriber(hub):
+    url = hub_url(hub)
+    first, second = [], []
+    sender = make_server(url, [])
+    make_server(url, first)
+    make_server(url, second)
+    wait_for(lambda: subscriber_count(hub) == 3)
+
+    sender.emit('presence', {'online': ['ann'], 'offline': []}, to='lobby')
+
+    wait_for(lambda: first and second)
+    for received in (first, second):
+        assert len(received) == 1
+        assert received[0]['event'] == 'presence'
+        assert received[0]['data'] == {'online': ['ann'], 'offline': []}
+        assert received[0]['room'] == 'lobby'
+
+
+def test_hub_only_delivers_to_the_channel(hub):
+    with socket.create_connection(hub.address) as other:
+        send_frame(other, {'op': 'subscribe', 'channel': 'other'})
+        received = []
+        sender = make_server(hub_url(hub), [])
+        make_server(hub_url(hub), received)
+        wait_for(lambda: subscriber_count(hub) == 2 and subscriber_count(hub, 'other') == 1)
+
+        sender.emit('ping', {})
+
+        wait_for(lambda: received)
+        other.settimeout(0.2)
+        with pytest.raises(socket.timeout):
+            other.recv(1)
+
+
+def test_workers_reconnect_after_a_hub_restart():
+    hub = LocalBusHub(port=0).start()
+    port = hub.address[1]
+    url = hub_url(hub)
+    received = []
+    sender = make_server(url, [])
+    make_server(url, received)
+    presence = LocalBusPresenceRegistry(url)
+    assert presence.add('ann', 'sid-1') is True
+    wait_for(lambda: subscriber_count(hub) == 2)
+
+    hub.shutdown()
+    hub = LocalBusHub(port=port).start()
+    try:
+        wait_for(lambda: subscriber_count(hub) == 2)
+        sender.emit('message', {'content': 'after restart'})
+        wait_for(lambda: received)
+        assert received[0]['data'] == {'content': 'after restart'}
+        # The new hub starts with an empty registry
+        assert presence.is_online('ann') is False
+    finally:
+        hub.shutdown()
+
+
+def test_request_connection_recovers_from_a_dropped_socket(hub):
+    presence = LocalBusPresenceRegistry(hub_url(hub))
+    presence.add('ann', 'sid-1')
+    with hub._lock:
+        connections = list(hub._connections)
+    for sock in connections:
+        sock.shutdown(socket.SHUT_RDWR)
+    wait_for(lambda: not hub._connections)
+    assert presence.is_online('ann') is True
+
+
+def test_presence_is_shared_through_the_hub(hub):
+    first = LocalBusPresenceRegistry(hub_url(hub))
+    second = LocalBusPresenceRegistry(hub_url(hub))
+
+    assert first.add('ann', 'sid-1', 'worker-1') is True
+    assert second.add('ann', 'sid-2', 'worker-2') is False
+    assert second.sids('ann') == {'sid-1', 'sid-2'}
+    assert first.filter_online(['ann', 'bob']) == {'ann'}
+    assert first.mark_announced('ann', True) is True
+    assert second.mark_announced('ann', True) is False
+    assert first.remove('sid-1') == ('ann', False)
+    assert second.remove('sid-2') == ('ann', True)
+    assert first.online_users() == set()
+
+
+def test_sessions_of_a_stopped_worker_are_reaped(hub):
+    stopped = LocalBusPresenceRegistry(hub_url(hub))
+    alive = LocalBusPresenceRegistry(hub_url(hub))
+    assert stopped.heartbeat('worker-1', 0.1) is False
+    assert alive.heartbeat('worker-2', 60) is False
+    assert alive.heartbeat('worker-2', 60) is True
+    stopped.add('ann', 'sid-1', 'worker-1')
+    stopped.add('bob', 'sid-2', 'worker-1')
+    alive.add('bob', 'sid-3', 'worker-2')
+
+    assert alive.reap() == set()
+    time.sleep(0.2)
+
+    assert alive.reap() == {'ann'}
+    assert alive.online_users() == {'bob'}
+    assert alive.sids('bob') == {'sid-3'}
+    assert stopped.heartbeat('worker-1', 60) is False